@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Registers the SQLite connection setup and opens the live database after a reload
+        from . import sqlite
+        # Registers the id reservation of activities saved into SQLite partitions
+        from . import partitions  # noqa: F401
+
+        sqlite.use_live_database()
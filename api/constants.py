@@ -37,3 +37,43 @@ PATTERN_CHOICES = [
     ('Multiple', 'Multiple'),
 ]
 
+
+# Scopes of the precomputed duration sketches
+SKETCH_SCOPE_CASE = 'case'
+SKETCH_SCOPE_VARIANT = 'variant'
+SKETCH_SCOPE_ACTIVITY = 'activity'
+
+SKETCH_SCOPE_CHOICES = [
+    (SKETCH_SCOPE_CASE, 'Case throughput time'),
+    (SKETCH_SCOPE_VARIANT, 'Variant throughput time'),
+    (SKETCH_SCOPE_ACTIVITY, 'Activity waiting time'),
+]
+
+
+# Kinds of background jobs (see api.jobs)
+JOB_KIND_INGEST = 'ingest'
+JOB_KIND_ROLLUPS = 'rollups'
+JOB_KIND_EVENT_STORE = 'event_store'
+JOB_KIND_CACHE_WARMUP = 'cache_warmup'
+
+JOB_KIND_CHOICES = [
+    (JOB_KIND_INGEST, 'Load an activity file and recompute everything'),
+    (JOB_KIND_ROLLUPS, 'Recompute TPT, variants and sketches'),
+    (JOB_KIND_EVENT_STORE, 'Rebuild the event store'),
+    (JOB_KIND_CACHE_WARMUP, 'Warm up the page cache and endpoints'),
+]
+
+# States of a background job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+JOB_STATUS_CHOICES = [
+    (JOB_QUEUED, 'Queued'),
+    (JOB_RUNNING, 'Running'),
+    (JOB_SUCCEEDED, 'Succeeded'),
+    (JOB_FAILED, 'Failed'),
+    (JOB_CANCELLED, 'Cancelled'),
+]
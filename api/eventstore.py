@@ -0,0 +1,368 @@
+"""
+Read-only columnar event store for the process-mining analytics.
+
+At ingest time the activities are encoded once into NumPy arrays sorted by case
+and timestamp:
+    - case_codes (int32): index of the case in `cases`
+    - activity_codes (int32): index of the activity name in `activities`
+    - timestamps (int64): nanoseconds since the epoch (UTC)
+    - tpt (float64): seconds until the next activity of the same case (0 for the last)
+    - case_offsets (int64): start of each case in the arrays, plus the total length
+
+Each build is written to its own folder of `.npy` files and published by
+atomically replacing `current.json`. Readers open the arrays with
+`mmap_mode='r'`, so every gunicorn worker maps the same read-only pages of the
+page cache instead of holding its own copy, and a rebuild never changes files
+that a worker has already mapped.
+
+The variant, directly-follows, bottleneck and KPI computations are vectorized
+passes over the arrays. The store is optional: build it with
+`python manage.py build_event_store` (or `create_data --event-store`).
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import metrics
+
+ARRAYS = ('case_codes', 'activity_codes', 'timestamps', 'tpt', 'case_offsets')
+
+CURRENT_FILE = 'current.json'
+
+NANOSECONDS = 10 ** 9
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_lock = threading.Lock()
+_cache = {}
+
+
+class EventStoreUnavailable(Exception):
+    """Raised when the event store has not been built."""
+
+
+def store_dir(directory=None):
+    return Path(directory or settings.EVENT_STORE_DIR)
+
+
+class EventStore:
+    """
+    Memory-mapped arrays of one event store build.
+
+    Attributes:
+        cases (list): Case id of each case code.
+        activities (list): Activity name of each activity code.
+        case_codes, activity_codes, timestamps, tpt, case_offsets (numpy.ndarray):
+            The arrays described in the module docstring.
+        meta (dict): Build id, creation time and sizes.
+        results (dict): Analytics already computed on this build (see variants).
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        path = Path(path)
+        self.results = {}
+        with open(path / 'meta.json', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.cases = self.meta.pop('cases')
+        self.activities = self.meta.pop('activities')
+        for name in ARRAYS:
+            setattr(self, name, np.load(path / f'{name}.npy', mmap_mode=mmap_mode))
+
+    @property
+    def num_events(self):
+        return len(self.case_codes)
+
+    @property
+    def num_cases(self):
+        return len(self.case_offsets) - 1
+
+    def case_durations(self):
+        """Throughput time of each case in seconds (last minus first timestamp)."""
+        if not self.num_cases:
+            return np.zeros(0)
+        starts = self.case_offsets[:-1]
+        ends = self.case_offsets[1:] - 1
+        return (self.timestamps[ends] - self.timestamps[starts]) / NANOSECONDS
+
+    def case_lengths(self):
+        return np.diff(self.case_offsets)
+
+
+def encode_activities(df):
+    """
+    Encode activities into the event store arrays.
+
+    Args:
+        df (pandas.DataFrame): Activities with case_id, timestamp and name columns
+            (timestamps as datetimes, naive or timezone-aware).
+
+    Returns:
+        tuple: (arrays, cases, activities) where `arrays` maps the names in
+        ARRAYS to NumPy arrays and `cases`/`activities` decode the codes.
+    """
+    timestamps = pd.to_datetime(df['timestamp'])
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    timestamps = timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    case_codes, cases = pd.factorize(df['case_id'].astype(str), sort=True)
+    activity_codes, activities = pd.factorize(df['name'].astype(str), sort=True)
+
+    order = np.lexsort((timestamps, case_codes))
+    case_codes = case_codes[order].astype(np.int32)
+    activity_codes = activity_codes[order].astype(np.int32)
+    timestamps = timestamps[order]
+
+    # Waiting time until the next activity of the same case, as in create_data.add_TPT
+    tpt = np.zeros(len(timestamps))
+    same_case = case_codes[1:] == case_codes[:-1]
+    tpt[:-1][same_case] = np.diff(timestamps)[same_case] / NANOSECONDS
+
+    case_offsets = np.searchsorted(case_codes, np.arange(len(cases) + 1)).astype(np.int64)
+    arrays = {
+        'case_codes': case_codes,
+        'activity_codes': activity_codes,
+        'timestamps': timestamps,
+        'tpt': tpt,
+        'case_offsets': case_offsets,
+    }
+    return arrays, list(cases), list(activities)
+
+
+def activities_frame():
+    """Read the activities of the database into a DataFrame (case_id, timestamp, name)."""
+    from .models import Activity
+
+    rows = Activity.objects.order_by('id').values_list('case', 'timestamp', 'name')
+    return pd.DataFrame.from_records(
+        rows.iterator(chunk_size=10000), columns=['case_id', 'timestamp', 'name']
+    )
+
+
+def build_event_store(df=None, directory=None, keep=2):
+    """
+    Build a new event store and publish it atomically.
+
+    Args:
+        df (pandas.DataFrame): Activities to encode (default: the Activity table).
+        directory (str): Event store folder (default: settings.EVENT_STORE_DIR).
+        keep (int): Builds kept on disk, including the new one; older ones are removed.
+
+    Returns:
+        dict: The metadata of the new build (without the code tables).
+    """
+    root = store_dir(directory)
+    if df is None:
+        df = activities_frame()
+    arrays, cases, activities = encode_activities(df)
+
+    build_id = time.strftime('%Y%m%d%H%M%S') + f'-{os.getpid()}'
+    build_dir = root / build_id
+    build_dir.mkdir(parents=True, exist_ok=False)
+    for name, array in arrays.items():
+        np.save(build_dir / f'{name}.npy', array)
+    meta = {
+        'build': build_id,
+        'created': time.time(),
+        'events': len(arrays['case_codes']),
+        'num_cases': len(cases),
+        'num_activities': len(activities),
+    }
+    with open(build_dir / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump({**meta, 'cases': cases, 'activities': activities}, f)
+
+    pointer = root / f'{CURRENT_FILE}.tmp'
+    with open(pointer, 'w', encoding='utf-8') as f:
+        json.dump({'build': build_id}, f)
+    os.replace(pointer, root / CURRENT_FILE)
+
+    builds = sorted(p for p in root.iterdir() if p.is_dir())
+    for old in builds[:-keep] if keep else []:
+        if old.name != build_id:
+            # Workers that still map an old build keep their pages until they reload
+            shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+def load_event_store(directory=None):
+    """
+    Return the current event store, memory-mapped and cached per process.
+
+    The cache is refreshed when `current.json` points to a new build, so a
+    rebuild is picked up without restarting the workers.
+
+    Raises:
+        EventStoreUnavailable: If no event store has been built.
+    """
+    root = store_dir(directory)
+    try:
+        with open(root / CURRENT_FILE, encoding='utf-8') as f:
+            build_id = json.load(f)['build']
+    except (OSError, ValueError, KeyError):
+        raise EventStoreUnavailable(
+            "The event store has not been built. Run 'python manage.py build_event_store'."
+        )
+    key = str(root)
+    with _lock:
+        store = _cache.get(key)
+        if store is None or store.meta['build'] != build_id:
+            metrics.count(('cache', 'event_store', 'miss'))
+            store = EventStore(root / build_id)
+            _cache[key] = store
+        else:
+            metrics.count(('cache', 'event_store', 'hit'))
+    return store
+
+
+def variants(store):
+    """
+    Group the cases by their sequence of activities.
+
+    Cases are grouped by length first; the cases of one length form a dense
+    matrix whose distinct rows are the variants of that length. A build never
+    changes, so the result is computed once per build and kept on the store
+    (shared, do not modify it).
+
+    Returns:
+        list: Dicts with the 'activities', 'cases', 'number_cases', 'percentage'
+        and 'avg_time' (seconds) of each variant, most frequent first.
+    """
+    result = store.results.get('variants')
+    if result is None:
+        result = store.results['variants'] = _variants(store)
+        metrics.count(('cache', 'event_store_variants', 'miss'))
+    else:
+        metrics.count(('cache', 'event_store_variants', 'hit'))
+    return result
+
+
+def _variants(store):
+    if not store.num_cases:
+        return []
+    lengths = store.case_lengths()
+    starts = store.case_offsets[:-1]
+    durations = store.case_durations()
+    result = []
+    for length in np.unique(lengths):
+        case_codes = np.flatnonzero(lengths == length)
+        positions = starts[case_codes][:, None] + np.arange(length)
+        sequences = np.asarray(store.activity_codes[positions])
+        unique, inverse, counts = np.unique(sequences, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        total_time = np.bincount(inverse, weights=durations[case_codes])
+        members = np.argsort(inverse, kind='stable')
+        boundaries = np.cumsum(counts)[:-1]
+        for sequence, count, time_sum, group in zip(unique, counts, total_time, np.split(case_codes[members], boundaries)):
+            result.append({
+                'activities': [store.activities[code] for code in sequence],
+                'cases': [store.cases[code] for code in group],
+                'number_cases': int(count),
+                'percentage': count / store.num_cases * 100,
+                'avg_time': time_sum / count,
+            })
+    result.sort(key=lambda variant: -variant['number_cases'])
+    return result
+
+
+def directly_follows(store):
+    """
+    Count the directly-follows relations between activities within the cases.
+
+    Returns:
+        dict: 'nodes' (activity, number of events) and 'edges' (source, target,
+        frequency and mean seconds between the two activities), by frequency.
+    """
+    num_activities = len(store.activities)
+    codes = np.asarray(store.activity_codes)
+    same_case = store.case_codes[1:] == store.case_codes[:-1]
+    pairs = codes[:-1][same_case].astype(np.int64) * num_activities + codes[1:][same_case]
+    waits = np.asarray(store.tpt[:-1])[same_case]
+    keys, inverse, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+    mean_waits = np.bincount(inverse.ravel(), weights=waits, minlength=len(keys)) / np.maximum(counts, 1)
+    order = np.argsort(-counts, kind='stable')
+    node_counts = np.bincount(codes, minlength=num_activities)
+    return {
+        'nodes': [
+            {'activity': name, 'frequency': int(count)}
+            for name, count in zip(store.activities, node_counts)
+        ],
+        'edges': [
+            {
+                'source': store.activities[keys[i] // num_activities],
+                'target': store.activities[keys[i] % num_activities],
+                'frequency': int(counts[i]),
+                'avg_seconds': float(mean_waits[i]),
+            }
+            for i in order
+        ],
+    }
+
+
+def bottlenecks(store, limit=None):
+    """
+    Waiting time after each activity (its `tpt`), slowest activities first.
+
+    The last activity of a case has no waiting time and is left out.
+
+    Returns:
+        list: Dicts with the 'activity', the mean waiting time in days
+        ('tat_days'), the median in days, the number of events and the number
+        of distinct 'cases'.
+    """
+    num_activities = len(store.activities)
+    not_last = np.ones(store.num_events, dtype=bool)
+    not_last[store.case_offsets[1:] - 1] = False
+    codes = np.asarray(store.activity_codes)[not_last]
+    waits = np.asarray(store.tpt)[not_last]
+    events = np.bincount(codes, minlength=num_activities)
+    means = np.bincount(codes, weights=waits, minlength=num_activities) / np.maximum(events, 1)
+
+    # Medians: sort by (activity, wait) and take the middle of each activity's run
+    medians = np.zeros(num_activities)
+    if len(waits):
+        sorted_waits = waits[np.lexsort((waits, codes))]
+        starts = np.concatenate(([0], np.cumsum(events)[:-1]))
+        last = len(sorted_waits) - 1
+        low = sorted_waits[np.minimum(starts + (events - 1) // 2, last)]
+        high = sorted_waits[np.minimum(starts + events // 2, last)]
+        medians = (low + high) / 2
+
+    case_activity = np.unique(np.asarray(store.case_codes).astype(np.int64) * num_activities + store.activity_codes)
+    cases = np.bincount(case_activity % num_activities, minlength=num_activities)
+
+    result = [
+        {
+            'activity': store.activities[code],
+            'tat_days': means[code] / SECONDS_PER_DAY,
+            'median_tat_days': medians[code] / SECONDS_PER_DAY,
+            'events': int(events[code]),
+            'cases': int(cases[code]),
+        }
+        for code in np.argsort(-means, kind='stable') if events[code]
+    ]
+    return result[:limit] if limit else result
+
+
+def kpis(store):
+    """
+    Overview KPIs of the event log.
+
+    Returns:
+        dict: Number of cases, of activities (events) and of distinct activity
+        names, average number of activities per case and the mean and median
+        throughput time of the cases in days.
+    """
+    durations = store.case_durations()
+    return {
+        'number_of_cases': store.num_cases,
+        'number_of_activities': store.num_events,
+        'number_of_activity_types': len(store.activities),
+        'average_number_of_activities': store.num_events / store.num_cases if store.num_cases else 0,
+        'tat_days': float(durations.mean()) / SECONDS_PER_DAY if len(durations) else 0,
+        'median_tat_days': float(np.median(durations)) / SECONDS_PER_DAY if len(durations) else 0,
+    }
@@ -0,0 +1,383 @@
+"""
+Background jobs queued in the database and run by local worker processes
+(`python manage.py run_jobs`), so heavy recomputations never run inside a
+request thread and no external broker is needed.
+
+A job is a row of the `Job` model. Workers claim the oldest queued job with a
+conditional UPDATE (only one worker can move it from queued to running), run the
+handler registered for its kind and store its result or error. While a job runs,
+a heartbeat thread refreshes `heartbeat_at`; running jobs whose heartbeat is
+stale (their worker died) are requeued, up to MAX_ATTEMPTS starts.
+
+Handlers receive a JobContext as first argument and the job params as keyword
+arguments. They report progress with `context.progress(percent, message)`, which
+also raises JobCancelled once the job was cancelled through the API.
+"""
+import inspect
+import threading
+import time
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Exists, F
+from django.utils import timezone
+
+from .constants import (
+    JOB_KIND_INGEST, JOB_KIND_ROLLUPS, JOB_KIND_EVENT_STORE, JOB_KIND_CACHE_WARMUP,
+    JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED,
+)
+from .metrics import StageTimer
+from .models import Activity, Job, Variant
+from .sqlite import refresh_connections, shadow_database
+
+# Starts of a job before a stale job is failed instead of requeued
+MAX_ATTEMPTS = 3
+
+# Seconds between heartbeats of a running job, and without one before it is stale
+HEARTBEAT_SECONDS = 15
+STALE_SECONDS = 120
+
+# Endpoints requested by the cache warmup job when no paths are given
+DEFAULT_WARMUP_PATHS = ('/v1/metadata/', '/v1/variant/?page_size=100', '/v1/event-store/kpis/')
+
+# Jobs that rewrite the activity data or its rollups run one at a time
+EXCLUSIVE_KINDS = (JOB_KIND_INGEST, JOB_KIND_ROLLUPS, JOB_KIND_EVENT_STORE)
+
+JOB_HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it was cancelled."""
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler of a job kind."""
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+class JobContext:
+    """Progress reporting for a running job."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, percent, message=''):
+        """
+        Store the progress of the job.
+
+        Raises:
+            JobCancelled: If the job was cancelled meanwhile.
+        """
+        updated = Job.objects.filter(id=self.job.id, status=JOB_RUNNING).update(
+            progress=percent, message=message[:255], heartbeat_at=timezone.now()
+        )
+        if not updated:
+            raise JobCancelled(f"Job {self.job.id} was cancelled")
+
+
+def validate_params(kind, params):
+    """
+    Check that a job kind exists and that its handler accepts the params.
+    The file of an ingest job is resolved here, so a bad path is refused on submit.
+
+    Raises:
+        ValueError: If the kind is unknown, the params do not match the handler
+            or the file of an ingest job is outside the data folder or missing.
+    """
+    if not isinstance(kind, str) or kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}. Choose from {sorted(JOB_HANDLERS)}.")
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object.")
+    try:
+        inspect.signature(JOB_HANDLERS[kind]).bind(None, **params)
+    except TypeError as e:
+        raise ValueError(f"Invalid params for {kind}: {e}")
+    if kind == JOB_KIND_INGEST:
+        if not isinstance(params['file'], str):
+            raise ValueError("file must be a string.")
+        try:
+            data_path(params['file'])
+        except FileNotFoundError as e:
+            raise ValueError(str(e))
+
+
+def submit_job(kind, params=None):
+    """
+    Queue a job.
+
+    Returns:
+        Job: The queued job.
+
+    Raises:
+        ValueError: If the kind or the params are invalid.
+    """
+    params = params or {}
+    validate_params(kind, params)
+    return Job.objects.create(kind=kind, params=params)
+
+
+def cancel_job(job):
+    """
+    Cancel a queued or running job; a running job stops at its next progress report.
+
+    Returns:
+        bool: False if the job had already finished.
+    """
+    return bool(Job.objects.filter(id=job.id, status__in=[JOB_QUEUED, JOB_RUNNING]).update(
+        status=JOB_CANCELLED, finished_at=timezone.now()
+    ))
+
+
+def claim_job(worker):
+    """
+    Move the oldest queued job to running for `worker`.
+
+    While a job of EXCLUSIVE_KINDS runs, only the other kinds are claimed; the
+    check is part of the claiming UPDATE, so two workers cannot both start one.
+
+    Returns:
+        Job: The claimed job, or None if no job can be claimed.
+    """
+    exclusive_running = Exists(Job.objects.filter(status=JOB_RUNNING, kind__in=EXCLUSIVE_KINDS))
+    while True:
+        queued = Job.objects.filter(status=JOB_QUEUED)
+        if Job.objects.filter(status=JOB_RUNNING, kind__in=EXCLUSIVE_KINDS).exists():
+            queued = queued.exclude(kind__in=EXCLUSIVE_KINDS)
+        job = queued.order_by('created_at', 'id').values('id', 'kind').first()
+        if job is None:
+            return None
+        candidate = Job.objects.filter(id=job['id'], status=JOB_QUEUED)
+        if job['kind'] in EXCLUSIVE_KINDS:
+            candidate = candidate.filter(~exclusive_running)
+        now = timezone.now()
+        claimed = candidate.update(
+            status=JOB_RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            progress=0, message='', attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job['id'])
+        # Another worker claimed it (or an exclusive job) first
+
+
+def requeue_stale_jobs(stale_seconds=STALE_SECONDS):
+    """
+    Requeue running jobs whose worker stopped sending heartbeats.
+
+    Returns:
+        int: The number of jobs requeued or failed.
+    """
+    stale = Job.objects.filter(
+        status=JOB_RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_seconds)
+    )
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=JOB_FAILED, error='The worker running the job stopped responding.', finished_at=timezone.now()
+    )
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(status=JOB_QUEUED, worker='')
+    return failed + requeued
+
+
+def _heartbeat(job_id, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        Job.objects.filter(id=job_id, status=JOB_RUNNING).update(heartbeat_at=timezone.now())
+    connection.close()
+
+
+def run_job(job):
+    """
+    Run a claimed job and store its outcome.
+
+    Returns:
+        str: The final status of the job.
+    """
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.id, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result = JOB_HANDLERS[job.kind](JobContext(job), **job.params)
+        finished = {'status': JOB_SUCCEEDED, 'progress': 100, 'result': result}
+    except JobCancelled:
+        return JOB_CANCELLED
+    except Exception:
+        finished = {'status': JOB_FAILED, 'error': traceback.format_exc()}
+    finally:
+        stop.set()
+        heartbeat.join()
+    updated = Job.objects.filter(id=job.id, status=JOB_RUNNING).update(finished_at=timezone.now(), **finished)
+    return finished['status'] if updated else JOB_CANCELLED
+
+
+def work(worker, burst=False, poll_interval=2.0, stale_seconds=STALE_SECONDS, stop=None):
+    """
+    Claim and run jobs until stopped.
+
+    Args:
+        worker (str): Name stored on the jobs this worker runs.
+        burst (bool): Return once the queue is empty.
+        poll_interval (float): Seconds to wait when the queue is empty.
+        stale_seconds (int): Heartbeat age after which running jobs are requeued.
+        stop (threading.Event): Set to stop after the current job.
+
+    Returns:
+        int: The number of jobs run.
+    """
+    done = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        refresh_connections()
+        requeue_stale_jobs(stale_seconds)
+        job = claim_job(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        done += 1
+    return done
+
+
+def data_path(file):
+    """Resolve a file given to a job, which must be inside the data folder."""
+    data_dir = (Path(settings.BASE_DIR) / 'api' / 'data').resolve()
+    path = (data_dir / file).resolve()
+    if data_dir not in path.parents:
+        raise ValueError(f"The file must be inside {data_dir}")
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    return path
+
+
+def _create_data_command():
+    from .management.commands.create_data import Command
+
+    return Command()
+
+
+def _recompute(context, command, start, event_store, timer=None):
+    """
+    Recompute TPT, variants, sketches (and the event store) reporting progress from `start`.
+    The rows and duration of each stage are returned under 'stages' (see api.metrics).
+    """
+    timer = timer or StageTimer()
+    activities = Activity.objects.count()
+    span = 100 - start
+    context.progress(start, 'Adding TPT')
+    started = time.perf_counter()
+    command.add_TPT()
+    timer.record('tpt', activities, started)
+    context.progress(start + span * 0.3, 'Creating variants')
+    started = time.perf_counter()
+    Variant.objects.all().delete()
+    command.create_variants()
+    timer.record('variants', activities, started)
+    context.progress(start + span * 0.55, 'Creating duration sketches')
+    started = time.perf_counter()
+    command.create_sketches()
+    timer.record('sketches', activities, started)
+    result = {'activities': activities, 'variants': Variant.objects.count()}
+    if event_store:
+        from .eventstore import build_event_store
+
+        context.progress(start + span * 0.85, 'Building event store')
+        started = time.perf_counter()
+        result['event_store'] = build_event_store()['build']
+        timer.record('event_store', activities, started)
+    result['stages'] = timer.stages
+    return result
+
+
+@job_handler(JOB_KIND_INGEST)
+def ingest_job(context, file, replace=False, event_store=True):
+    """
+    Load an activity file (relative to api/data) like `create_data`, then recompute
+    TPT, variants, sketches and optionally the event store. On SQLite this runs
+    on a shadow copy of the database that replaces it at the end (api.sqlite).
+
+    Args:
+        file (str): CSV or Parquet file with name, timestamp and case_id columns.
+        replace (bool): Delete the existing activities first. Otherwise the file is
+            appended: its rows are added to the stored ones (a row present in both is
+            stored twice), a case already stored keeps its case_index and new cases are
+            indexed after the stored ones, and the rollups are recomputed over all rows.
+        event_store (bool): Rebuild the event store at the end.
+    """
+    path = data_path(file)
+    command = _create_data_command()
+    timer = StageTimer()
+    with shadow_database():
+        if replace:
+            context.progress(0, 'Deleting existing activities')
+            Activity.objects.all().delete()
+        context.progress(1, f'Loading {path.name}')
+        started = time.perf_counter()
+        rows = command.load_activities(str(path))
+        timer.record('load', rows, started)
+        return _recompute(context, command, 40, event_store, timer)
+
+
+@job_handler(JOB_KIND_ROLLUPS)
+def rollups_job(context, event_store=True):
+    """Recompute TPT, variants and sketches (and the event store) from the activities."""
+    with shadow_database():
+        return _recompute(context, _create_data_command(), 0, event_store)
+
+
+@job_handler(JOB_KIND_EVENT_STORE)
+def event_store_job(context):
+    """Rebuild the memory-mapped event store from the activities."""
+    from .eventstore import build_event_store
+
+    context.progress(0, 'Building event store')
+    return build_event_store()
+
+
+@job_handler(JOB_KIND_CACHE_WARMUP)
+def cache_warmup_job(context, paths=None):
+    """
+    Read the SQLite database and the event store files into the OS page cache,
+    which the web workers share, then request the given endpoints once.
+
+    Args:
+        paths (list): GET paths to request (default DEFAULT_WARMUP_PATHS).
+
+    Returns:
+        dict: Bytes read and the status and time of each endpoint.
+    """
+    from django.test import Client
+
+    files = []
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        files.append(Path(database['NAME']))
+    current = Path(settings.EVENT_STORE_DIR) / 'current.json'
+    if current.exists():
+        from .eventstore import load_event_store
+
+        store = load_event_store()
+        files.extend((Path(settings.EVENT_STORE_DIR) / store.meta['build']).glob('*.npy'))
+
+    bytes_read = 0
+    for file in files:
+        context.progress(0, f'Reading {file.name}')
+        with open(file, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                bytes_read += len(chunk)
+
+    endpoints = {}
+    client = Client()
+    paths = list(paths or DEFAULT_WARMUP_PATHS)
+    for i, path in enumerate(paths):
+        context.progress(50 + 50 * i / len(paths), f'Requesting {path}')
+        started = time.perf_counter()
+        response = client.get(path, secure=True)
+        endpoints[path] = {
+            'status': response.status_code,
+            'time_ms': (time.perf_counter() - started) * 1000,
+        }
+    return {'bytes_read': bytes_read, 'endpoints': endpoints}
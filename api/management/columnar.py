@@ -0,0 +1,152 @@
+"""
+Typed columnar storage (Parquet) for the activity data.
+
+CSV loses types on every round-trip: case ids come back as floats ('9473.0'),
+timestamps as strings that each step parses again. Inside the pipeline the
+activities are kept typed (string case_id, parsed timestamp, categorical
+activity name) and stored as Parquet; CSV is only read from the raw exports and
+written for tools that need it.
+
+Parquet needs pyarrow; without it frames are stored as pickles, which keep the
+dtypes too but are not portable.
+"""
+import importlib.util
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Format of the timestamps in the MySella and ticket exports, e.g. '28-JAN-25 05.32.51.416000 PM'
+TIMESTAMP_FORMAT = '%d-%b-%y %I.%M.%S.%f %p'
+
+# dtypes of the activity columns
+ACTIVITY_DTYPES = {
+    'name': 'category',
+    'timestamp': 'datetime64',
+    'case_id': 'string',
+}
+
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+FRAME_SUFFIX = '.parquet' if PARQUET_AVAILABLE else '.pkl'
+
+
+def normalize_case_ids(case_ids):
+    """Case ids as strings, without the '.0' left by float round-trips."""
+    return case_ids.astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+
+
+def to_typed_activities(df):
+    """
+    Convert activities read as text to their typed representation.
+
+    Timestamps that do not match TIMESTAMP_FORMAT become NaT, so the cleaning
+    step drops them like any other missing value.
+
+    Args:
+        df (pandas.DataFrame): Activities with name, timestamp and case_id columns.
+
+    Returns:
+        pandas.DataFrame: The activities with ACTIVITY_DTYPES.
+    """
+    typed = pd.DataFrame(index=df.index)
+    typed['name'] = df['name'].astype('string').str.strip().astype('category')
+    timestamps = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps.astype('string').str.strip(), format=TIMESTAMP_FORMAT, errors='coerce')
+    typed['timestamp'] = timestamps
+    typed['case_id'] = normalize_case_ids(df['case_id'])
+    return typed
+
+
+def to_text_activities(df):
+    """
+    Format typed activities back to the text of the exports (for CSV output).
+
+    Returns:
+        pandas.DataFrame: name, timestamp and case_id as strings.
+    """
+    text = df.copy()
+    text['name'] = text['name'].astype('string')
+    text['timestamp'] = text['timestamp'].dt.strftime(TIMESTAMP_FORMAT).str.upper()
+    text['case_id'] = text['case_id'].astype('string')
+    return text
+
+
+def write_frame(df, path):
+    """Write a DataFrame, keeping its dtypes (Parquet, or pickle without pyarrow)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == '.parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_pickle(path)
+
+
+def read_frame(path, columns=None):
+    """Read a DataFrame written by write_frame; Parquet files can read only some columns."""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path, columns=columns)
+    df = pd.read_pickle(path)
+    return df[columns] if columns else df
+
+
+def read_activities(path):
+    """
+    Read activities from a CSV file (typed on read) or a Parquet/pickle file.
+
+    Returns:
+        pandas.DataFrame: The activities with ACTIVITY_DTYPES.
+    """
+    path = Path(path)
+    if path.suffix == '.csv':
+        return to_typed_activities(pd.read_csv(path, dtype=str))
+    return to_typed_activities(read_frame(path))
+
+
+def write_activities(df, path):
+    """Write typed activities to CSV (as the export text) or to Parquet/pickle."""
+    path = Path(path)
+    if path.suffix == '.csv':
+        path.parent.mkdir(parents=True, exist_ok=True)
+        to_text_activities(df).to_csv(path, index=False)
+    else:
+        write_frame(df, path)
+
+
+def benchmark_formats(csv_file, output_file, repeat=3):
+    """
+    Compare an activity CSV with its typed columnar copy.
+
+    Args:
+        csv_file (str): Activity CSV file (name, timestamp, case_id).
+        output_file (str): Path of the Parquet (or pickle) copy to write.
+        repeat (int): Timed runs of each operation (the best is kept).
+
+    Returns:
+        dict: Best seconds of each operation and the file sizes in bytes.
+    """
+    def best_of(fn):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
+
+    csv_copy = Path(output_file).with_suffix('.benchmark.csv')
+    csv_read, df = best_of(lambda: read_activities(csv_file))
+    csv_write, _ = best_of(lambda: write_activities(df, csv_copy))
+    columnar_write, _ = best_of(lambda: write_activities(df, output_file))
+    columnar_read, _ = best_of(lambda: read_activities(output_file))
+    results = {
+        'rows': len(df),
+        'csv_read_seconds': csv_read,
+        'csv_write_seconds': csv_write,
+        'columnar_read_seconds': columnar_read,
+        'columnar_write_seconds': columnar_write,
+        'csv_bytes': Path(csv_file).stat().st_size,
+        'columnar_bytes': Path(output_file).stat().st_size,
+    }
+    csv_copy.unlink()
+    return results
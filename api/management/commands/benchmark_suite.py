@@ -0,0 +1,326 @@
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from api import urls as api_urls
+from api.constants import JOB_KIND_INGEST, JOB_SUCCEEDED
+from api.eventstore import build_event_store
+from api.management.commands.create_data import Command as CreateDataCommand
+from api.management.synthetic import generate_activities
+from api.metrics import StageTimer
+from api.models import Activity, Job, Variant
+
+# Request of each URL name of api/urls.py; the default is a GET without parameters.
+# '{case}', '{month}' and '{job}' are replaced by a case id, the first day of the
+# last month of the loaded activities and the id of a finished job.
+ENDPOINT_REQUESTS = {
+    'activity-list': {'params': {'page_size': 100}},
+    'variant-list': {'params': {'page_size': 100}},
+    'case-list': {'params': {'id': '{case}'}},
+    'case-count': {'params': {'start_date': '{month}'}},
+    'throughput-percentiles': {'params': {'start_date': '{month}'}},
+    'activity-export': {'params': {'start_date': '{month}'}},
+    'query': {'method': 'post', 'body': {
+        'source': 'activity',
+        'group_by': ['month'],
+        'aggregates': [{'fn': 'count', 'as': 'activities'}],
+        'order_by': ['month'],
+    }},
+    'batch': {'method': 'post', 'body': {
+        'filters': {'start_date': '{month}'},
+        'widgets': [
+            {'id': 'cases', 'widget': 'case-explorer'},
+            {'id': 'count', 'widget': 'case-count'},
+            {'id': 'p90', 'widget': 'throughput-percentiles', 'params': {'q': 90}},
+        ],
+    }},
+    'job-detail': {'kwargs': {'job_id': '{job}'}},
+    'job-result': {'kwargs': {'job_id': '{job}'}},
+    # The job has finished, so cancelling it changes nothing (409)
+    'job-cancel': {'method': 'post', 'kwargs': {'job_id': '{job}'}},
+}
+
+
+def git_commit():
+    """The checked out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fill(value, values):
+    if isinstance(value, str):
+        return value.format(**values)
+    if isinstance(value, dict):
+        return {key: _fill(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, values) for item in value]
+    return value
+
+
+def endpoint_requests(values, names=None):
+    """
+    The request of each URL name of api/urls.py (ENDPOINT_REQUESTS).
+
+    Returns:
+        dict: {name: (method, path, params, body)}
+    """
+    requests = {}
+    for pattern in api_urls.urlpatterns:
+        if not pattern.name or (names and pattern.name not in names):
+            continue
+        spec = _fill(ENDPOINT_REQUESTS.get(pattern.name, {}), values)
+        path = reverse(pattern.name, kwargs=spec.get('kwargs'))
+        requests[pattern.name] = (spec.get('method', 'get'), path, spec.get('params', {}), spec.get('body'))
+    return requests
+
+
+def request_once(client, method, path, params, body):
+    """Send one request and read its whole body (also of streaming responses)."""
+    started = time.perf_counter()
+    if method == 'post':
+        response = client.post(path, body, content_type='application/json', secure=True)
+    else:
+        response = client.get(path, params, secure=True)
+    size = (sum(len(chunk) for chunk in response.streaming_content) if response.streaming
+            else len(response.content))
+    elapsed = time.perf_counter() - started
+    return response, size, elapsed
+
+
+def benchmark_endpoints(requests, repeat):
+    """
+    Time each request `repeat` times after a first (cold) call.
+
+    Returns:
+        dict: Status, response size, SQL queries (PerformanceMiddleware) and
+        cold, median and best milliseconds per URL name.
+    """
+    client = Client(raise_request_exception=False)
+    results = {}
+    for name, (method, path, params, body) in requests.items():
+        response, size, cold = request_once(client, method, path, params, body)
+        timings = [request_once(client, method, path, params, body)[2] for _ in range(repeat)]
+        results[name] = {
+            'method': method.upper(),
+            'path': path,
+            'status': response.status_code,
+            'bytes': size,
+            'queries': getattr(response.wsgi_request, '_db_queries', None),
+            'cold_ms': cold * 1000,
+            'median_ms': statistics.median(timings) * 1000,
+            'best_ms': min(timings) * 1000,
+        }
+    return results
+
+
+def find_regressions(results, baseline, threshold, min_ms):
+    """
+    Stages and endpoints that got slower than in `baseline`.
+
+    A stage (seconds) or an endpoint (median ms) regresses when it is more than
+    `threshold` (a fraction) and more than `min_ms` slower, so that the noise of
+    fast endpoints is not flagged.
+
+    Returns:
+        list: (kind, name, baseline ms, current ms) tuples.
+    """
+    regressions = []
+    measures = [
+        ('stage', {name: stage['seconds'] * 1000 for name, stage in results['stages'].items()},
+         {name: stage['seconds'] * 1000 for name, stage in baseline.get('stages', {}).items()}),
+        ('endpoint', {name: endpoint['median_ms'] for name, endpoint in results['endpoints'].items()},
+         {name: endpoint['median_ms'] for name, endpoint in baseline.get('endpoints', {}).items()}),
+    ]
+    for kind, current, previous in measures:
+        for name, ms in current.items():
+            if name not in previous:
+                continue
+            if ms > previous[name] * (1 + threshold) and ms - previous[name] > min_ms:
+                regressions.append((kind, name, previous[name], ms))
+    return regressions
+
+
+class Command(BaseCommand):
+    """
+    Django management command benchmarking the ingestion stages and every endpoint
+    of api/urls.py on a synthetic MySella-like activity log (api.management.synthetic).
+    It runs offline on a scratch test database and a scratch event store, never on
+    the real data. Save the results of a commit with --output and compare a later
+    run with --compare to flag regressions.
+    """
+    help = 'Benchmark ingestion stages and API endpoints on a synthetic activity log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000,
+                            help='Activities of the synthetic log (10k to 10M)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic log')
+        parser.add_argument('--file', help='Benchmark this activity file (CSV or Parquet) instead of a synthetic log')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed calls of each endpoint after a cold call')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='URL name of api/urls.py to benchmark (repeatable); default all')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Slowdown (fraction) over --compare flagged as a regression')
+        parser.add_argument('--min-ms', type=float, default=2.0,
+                            help='Smallest slowdown in milliseconds flagged as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when a regression is flagged')
+
+    def handle(self, *args, **options):
+        if options['file'] and not Path(options['file']).exists():
+            raise CommandError(f"File not found: {options['file']}")
+        if options['events'] < 1:
+            raise CommandError('--events must be positive')
+        unknown = set(options['endpoints'] or ()) - {pattern.name for pattern in api_urls.urlpatterns}
+        if unknown:
+            raise CommandError(f"Unknown URL names: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            results = {
+                'commit': git_commit(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'vendor': connection.vendor,
+            }
+            if options['file']:
+                file = options['file']
+                results['log'] = {'file': Path(file).name}
+            else:
+                file = str(tmp / 'activities.csv')
+                self.stdout.write(f"Generating {options['events']:,} synthetic activities")
+                started = time.perf_counter()
+                results['log'] = generate_activities(file, options['events'], seed=options['seed'])
+                results['log'].update(seed=options['seed'], generate_seconds=time.perf_counter() - started)
+
+            if connection.vendor == 'sqlite':
+                # A file, not the default in-memory test database, shared by the mirrored aliases
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = str(tmp / 'benchmark.sqlite3')
+            setup_test_environment(debug=False)
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                with override_settings(EVENT_STORE_DIR=tmp / 'event_store'):
+                    results.update(self.run_benchmark(file, options))
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+        regressions = find_regressions(results, baseline, options['threshold'], options['min_ms']) if baseline else []
+        self.report(results, baseline, regressions)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} regressions over {options['compare']}")
+
+    def run_benchmark(self, file, options):
+        """Load the log stage by stage like the ingest job (api.jobs), then time the endpoints."""
+        loader = CreateDataCommand()
+        timer = StageTimer()
+        stages = (
+            ('load', lambda: loader.load_activities(file)),
+            ('tpt', loader.add_TPT),
+            ('variants', loader.create_variants),
+            ('sketches', loader.create_sketches),
+            ('event_store', build_event_store),
+        )
+        rows = None
+        for stage, run in stages:
+            self.stdout.write(f"Stage {stage}")
+            started = time.perf_counter()
+            loaded = run()
+            if rows is None:
+                rows = loaded
+            timer.record(stage, rows, started)
+        ingest = {'activities': rows, 'variants': Variant.objects.count(), 'stages': timer.stages}
+
+        last = Activity.objects.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        job = Job.objects.create(kind=JOB_KIND_INGEST, status=JOB_SUCCEEDED, progress=100, result=ingest)
+        values = {
+            'case': Activity.objects.values_list('case', flat=True).first(),
+            'month': f'{last:%Y-%m}-01',
+            'job': job.id,
+        }
+        requests = endpoint_requests(values, options['endpoints'])
+        self.stdout.write(f"Timing {len(requests)} endpoints")
+        # Keep the per-request logs of PerformanceMiddleware and 4xx warnings out of the report
+        logging.disable(logging.WARNING)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                endpoints = benchmark_endpoints(requests, options['repeat'])
+        finally:
+            logging.disable(logging.NOTSET)
+        return {'activities': rows, 'variants': ingest['variants'], 'stages': timer.stages, 'endpoints': endpoints}
+
+    def report(self, results, baseline=None, regressions=()):
+        log = results['log']
+        shape = f", {log['cases']:,} cases, {log['activities']} activity names" if 'cases' in log else ''
+        self.stdout.write(
+            f"{results['vendor']} at {results['commit'] or 'unknown commit'}: {results['activities']:,} activities"
+            f"{shape}, {results['variants']:,} variants"
+        )
+        flagged = {(kind, name) for kind, name, _, _ in regressions}
+        base_label = f"{baseline['commit'] or 'baseline'} ms" if baseline else ''
+
+        header = f"{'stage':14}{'rows/s':>12}{'seconds':>10}"
+        if baseline:
+            header += f"{base_label:>16}"
+        self.stdout.write(header)
+        for stage, values in results['stages'].items():
+            line = f"{stage:14}{values['rows'] / max(values['seconds'], 1e-9):>12,.0f}{values['seconds']:>10.2f}"
+            if baseline and stage in baseline.get('stages', {}):
+                line += f"{baseline['stages'][stage]['seconds'] * 1000:>16.1f}"
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if ('stage', stage) in flagged else line)
+
+        header = f"{'endpoint':34}{'status':>7}{'queries':>8}{'cold ms':>10}{'median ms':>11}{'best ms':>9}"
+        if baseline:
+            header += f"{base_label:>16}"
+        self.stdout.write(header)
+        for name, values in results['endpoints'].items():
+            queries = '' if values['queries'] is None else values['queries']
+            line = (f"{name:34}{values['status']:>7}{queries:>8}{values['cold_ms']:>10.1f}"
+                    f"{values['median_ms']:>11.1f}{values['best_ms']:>9.1f}")
+            if baseline and name in baseline.get('endpoints', {}):
+                line += f"{baseline['endpoints'][name]['median_ms']:>16.1f}"
+            if ('endpoint', name) in flagged:
+                line = self.style.ERROR(line + '  REGRESSION')
+            elif values['status'] >= 400:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
+
+        if baseline:
+            if baseline.get('activities') != results['activities']:
+                self.stdout.write(self.style.WARNING(
+                    f"The baseline loaded {baseline.get('activities')} activities; timings are not comparable"
+                ))
+            if regressions:
+                self.stdout.write(self.style.ERROR(f"{len(regressions)} regressions over {base_label[:-3]}"))
+            else:
+                self.stdout.write(self.style.SUCCESS('No regressions'))
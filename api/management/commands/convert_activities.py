@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.columnar import PARQUET_AVAILABLE, benchmark_formats, read_activities, write_activities
+
+
+class Command(BaseCommand):
+    """
+    Django management command converting an activity file between CSV and the
+    typed columnar format (string case_id, parsed timestamp, categorical name).
+    """
+    help = 'Convert an activity file between CSV and Parquet, optionally benchmarking both formats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Activity file (.csv or .parquet)')
+        parser.add_argument('output', nargs='?',
+                            help='Output file; defaults to the input with the other extension')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Compare read/write time and size of the CSV and its Parquet copy')
+
+    def handle(self, *args, **options):
+        input_path = Path(options['input'])
+        if not input_path.exists():
+            raise CommandError(f"File not found: {input_path}")
+        if not PARQUET_AVAILABLE:
+            raise CommandError("Parquet needs pyarrow: pip install pyarrow")
+        output = options['output'] or input_path.with_suffix('.parquet' if input_path.suffix == '.csv' else '.csv')
+
+        if options['benchmark']:
+            if input_path.suffix != '.csv':
+                raise CommandError("The benchmark starts from a CSV file")
+            results = benchmark_formats(input_path, output)
+            self.stdout.write(f"Benchmark on {input_path.name} ({results['rows']} rows, best of 3):")
+            self.stdout.write(f"{'':8}{'Read (s)':>10}{'Write (s)':>11}{'Size (MB)':>11}")
+            for label, prefix in (('CSV', 'csv'), ('Parquet', 'columnar')):
+                self.stdout.write(
+                    f"{label:8}{results[f'{prefix}_read_seconds']:>10.3f}"
+                    f"{results[f'{prefix}_write_seconds']:>11.3f}"
+                    f"{results[f'{prefix}_bytes'] / (1024 * 1024):>11.2f}"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Parquet copy written to {output}"))
+            return
+
+        df = read_activities(input_path)
+        write_activities(df, output)
+        self.stdout.write(self.style.SUCCESS(f"Converted {len(df)} activities to {output}"))
+        self.stdout.write(f"dtypes: {dict(df.dtypes.astype(str))}")
@@ -1,51 +1,165 @@
 import csv
-from django.core.management.base import BaseCommand
-from api.models import Activity, Variant
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Activity, Variant, DurationSketch, CardinalitySketch
+from api.sketches import QuantileSketch, HyperLogLog
+from api.eventstore import build_event_store
+from api.sampling import sample_rank
+from api.sqlite import shadow_database
+from api import partitions
+from api.management.columnar import TIMESTAMP_FORMAT, read_activities
+from api.constants import SKETCH_SCOPE_CASE, SKETCH_SCOPE_VARIANT, SKETCH_SCOPE_ACTIVITY
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
 import os
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
 from collections import defaultdict
 import random
 from datetime import timedelta
 import json
+import ast
+from contextlib import nullcontext
 from django.utils import timezone
 
 
 
+# Activity fields written by load_activities, in COPY column order
+ACTIVITY_COPY_FIELDS = ('case', 'timestamp', 'name', 'tpt', 'case_index', 'sample_rank')
+
+
 class Command(BaseCommand):
     """
     Django management command to add data to the database from a CSV file.
     """
     help = 'Add data to the database from CSV file'
 
-    cases = []
+    def case_indexer(self, using=DEFAULT_DB_ALIAS):
+        """
+        Returns a function giving the case_index of a case id: the index its activities
+        already have in the database, or a new index above the largest one.
+        Appending a file or reloading a month keeps the indexes of the stored cases,
+        so add_TPT (grouped by case_index) never mixes the activities of two cases.
+        Args:
+            using (str): Database alias the activities are read from.
+        """
+        case_indexes = {
+            case_id: int(index)
+            for case_id, index in Activity.objects.using(using).values_list('case', 'case_index').distinct()
+        }
+        next_index = max(case_indexes.values(), default=-1) + 1
 
-    def get_case_index(self, case_id):
-        if case_id not in self.cases:
-            self.cases.append(case_id)
-        return self.cases.index(case_id)
+        def get_case_index(case_id):
+            nonlocal next_index
+            if case_id not in case_indexes:
+                case_indexes[case_id] = next_index
+                next_index += 1
+            return case_indexes[case_id]
 
-    def create_activities(self, csv_file):
+        return get_case_index
+
+    def read_activity_rows(self, csv_file):
         """
-        Reads a CSV file and creates Activity objects in the database.
+        Yields (case_id, timestamp, name) for each activity of a file.
         Args:
-            csv_file (str): Path to the CSV file containing activity data.
+            csv_file (str): Path to a CSV file, or to a typed Parquet file written
+                by the preprocessing pipeline (timestamps already parsed).
         """
+        if not csv_file.endswith('.csv'):
+            df = read_activities(csv_file)
+            for case_id, timestamp, name in zip(df['case_id'], df['timestamp'], df['name']):
+                yield case_id, timestamp.to_pydatetime(), name
+            return
         with open(csv_file, 'r') as file:
             reader = csv.DictReader(file)
             for row in reader:
                 # Convert timestamp string to datetime object
-                timestamp = datetime.strptime(row['timestamp'], '%d-%b-%y %I.%M.%S.%f %p')
-                print(f"Processing activity for case {row['case_id']} at {timestamp}")
-                # Create Activity object
-                activity = Activity(
-                    case=row['case_id'],
-                    timestamp=timestamp,
-                    name=row['name'],
-                    tpt=float(0),
-                    case_index=self.get_case_index(row['case_id'])
-                )
-                activity.save()
+                timestamp = datetime.strptime(row['timestamp'], TIMESTAMP_FORMAT)
+                yield row['case_id'], timestamp, row['name']
+
+    def create_activities(self, csv_file):
+        """
+        Reads a CSV file and creates Activity objects in the database.
+        Args:
+            csv_file (str): Path to the CSV file containing activity data.
+        """
+        get_case_index = self.case_indexer(router.db_for_write(Activity) or DEFAULT_DB_ALIAS)
+        for case_id, timestamp, name in self.read_activity_rows(csv_file):
+            print(f"Processing activity for case {case_id} at {timestamp}")
+            # Create Activity object
+            activity = Activity(
+                case=case_id,
+                timestamp=timestamp,
+                name=name,
+                tpt=float(0),
+                case_index=get_case_index(case_id),
+                sample_rank=sample_rank(case_id)
+            )
+            activity.save()
+
+    def activity_records(self, csv_file, get_case_index):
+        """
+        Yields the column values of the Activity rows of a file, in ACTIVITY_COPY_FIELDS order.
+        Naive timestamps are taken as UTC (TIME_ZONE); the sample rank is computed once per case.
+        Args:
+            csv_file (str): Path to the CSV (or Parquet) file containing activity data.
+            get_case_index (callable): Case index of a case id (see case_indexer).
+        """
+        ranks = {}
+        for case_id, timestamp, name in self.read_activity_rows(csv_file):
+            if case_id not in ranks:
+                ranks[case_id] = sample_rank(case_id)
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+            yield case_id, timestamp, name, 0.0, str(get_case_index(case_id)), ranks[case_id]
+
+    def load_activities(self, csv_file, batch_size=5000, month=None):
+        """
+        Loads the activities of a file in bulk, in one transaction: with COPY FROM
+        STDIN on PostgreSQL (psycopg 3), with batched bulk_create on other databases.
+        Same rows as create_activities, without one INSERT per activity.
+        When Activity is partitioned by month (api.partitions), the missing partitions
+        are created first, and on SQLite the rows are written to their partitions directly.
+        Cases already in the database keep their case_index (case_indexer).
+        Args:
+            csv_file (str): Path to the CSV (or Parquet) file containing activity data.
+            batch_size (int): Rows per INSERT when COPY is not available.
+            month (date): Only reload this month: its existing activities (partition)
+                are removed and only the activities of the file in that month are loaded.
+        Returns:
+            int: The number of activities loaded.
+        """
+        # The shadow copy during a reload (api.sqlite.shadow_database)
+        alias = router.db_for_write(Activity) or DEFAULT_DB_ALIAS
+        # Read before the month's partition is truncated, so its cases keep their indexes
+        records = self.activity_records(csv_file, self.case_indexer(alias))
+        if month:
+            records = (record for record in records if partitions.month_of(record[1]) == month)
+        rows = 0
+        connection = connections[alias]
+        partitioned = partitions.is_partitioned(alias)
+        if partitioned:
+            records = list(records)
+        with transaction.atomic(using=alias):
+            if month:
+                partitions.truncate_partition(month, alias)
+            if partitioned:
+                partitions.ensure_partitions({record[1] for record in records}, alias)
+                if connection.vendor == 'sqlite':
+                    return partitions.insert_rows(records, ACTIVITY_COPY_FIELDS, alias)
+            with connection.cursor() as cursor:
+                raw_cursor = cursor.cursor
+                if connection.vendor == 'postgresql' and hasattr(raw_cursor, 'copy'):
+                    quote = connection.ops.quote_name
+                    columns = ', '.join(quote(Activity._meta.get_field(field).column) for field in ACTIVITY_COPY_FIELDS)
+                    with raw_cursor.copy(f"COPY {quote(Activity._meta.db_table)} ({columns}) FROM STDIN") as copy:
+                        for record in records:
+                            copy.write_row(record)
+                            rows += 1
+                    return rows
+            while batch := list(islice(records, batch_size)):
+                Activity.objects.bulk_create([Activity(**dict(zip(ACTIVITY_COPY_FIELDS, record))) for record in batch])
+                rows += len(batch)
+        return rows
 
     def create_variants(self, *args, **kwargs):
         """
@@ -166,6 +280,84 @@ class Command(BaseCommand):
                 Activity.objects.filter(id=current_id).update(tpt=time_diff)
    
 
+    def create_sketches(self):
+        """
+        Builds mergeable sketches per monthly time bucket in a single pass over the activities.
+        Three families of quantile sketches are stored in the `DurationSketch` model:
+            - case: throughput time of each case, bucketed by the month the case started.
+            - variant: the same throughput times, keyed by the id of the case's variant.
+            - activity: waiting time (`tpt`) of each activity except the last of its case,
+              keyed by activity name and bucketed by the month of the activity timestamp.
+        HyperLogLog sketches of the distinct cases per month, overall and per activity name,
+        are stored in the `CardinalitySketch` model.
+        Date-range queries merge the bucket sketches instead of sorting or counting raw rows.
+        Note:
+            - Must run after `add_TPT` and `create_variants`, since it reads `tpt` and the
+              case lists stored in `Variant`.
+        """
+        DurationSketch.objects.all().delete()
+        CardinalitySketch.objects.all().delete()
+
+        variant_per_case = {}
+        for variant_id, cases in Variant.objects.values_list('id', 'cases'):
+            for case_id in ast.literal_eval(cases):
+                variant_per_case[case_id] = str(variant_id)
+
+        sketches = defaultdict(QuantileSketch)
+        distinct_cases = defaultdict(HyperLogLog)
+
+        def add_case(case_id, first, last):
+            bucket = first.date().replace(day=1)
+            throughput = (last - first).total_seconds()
+            sketches[(SKETCH_SCOPE_CASE, '', bucket)].add(throughput)
+            if case_id in variant_per_case:
+                sketches[(SKETCH_SCOPE_VARIANT, variant_per_case[case_id], bucket)].add(throughput)
+
+        current_case, first, last = None, None, None
+        # (name, bucket, tpt) of the previous activity of the current case
+        previous = None
+        activities = Activity.objects.order_by('case', 'timestamp').values_list(
+            'case', 'name', 'timestamp', 'tpt'
+        )
+        for case_id, name, timestamp, tpt in activities.iterator(chunk_size=10000):
+            bucket = timestamp.date().replace(day=1)
+            distinct_cases[('', bucket)].add(case_id)
+            distinct_cases[(name, bucket)].add(case_id)
+            if case_id != current_case:
+                if current_case is not None:
+                    add_case(current_case, first, last)
+                current_case, first = case_id, timestamp
+                previous = None
+            if previous is not None:
+                # Only activities followed by another one have a waiting time; the last
+                # activity of a case keeps tpt=0 and would pull the percentiles to zero
+                sketches[(SKETCH_SCOPE_ACTIVITY, previous[0], previous[1])].add(previous[2])
+            previous = (name, bucket, tpt)
+            last = timestamp
+        if current_case is not None:
+            add_case(current_case, first, last)
+
+        DurationSketch.objects.bulk_create(
+            [
+                DurationSketch(
+                    scope=scope,
+                    key=key,
+                    bucket=bucket,
+                    count=sketch.count,
+                    sketch=sketch.to_json(),
+                )
+                for (scope, key, bucket), sketch in sketches.items()
+            ],
+            batch_size=1000,
+        )
+        CardinalitySketch.objects.bulk_create(
+            [
+                CardinalitySketch(key=key, bucket=bucket, sketch=sketch.to_bytes())
+                for (key, bucket), sketch in distinct_cases.items()
+            ],
+            batch_size=1000,
+        )
+
     def get_case_activity_time(self):
         """
         Retrieves and organizes activity data grouped by case ID.
@@ -234,19 +426,77 @@ class Command(BaseCommand):
         return mean_time_per_activity_json
     
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join(settings.BASE_DIR, 'api', 'data', 'merged_activities_data_sample_10pct.csv'),
+            help='CSV (or Parquet) file with name, timestamp and case_id columns',
+        )
+        parser.add_argument(
+            '--row-by-row',
+            action='store_true',
+            help='Save the activities one by one (slow) instead of loading them in bulk',
+        )
+        parser.add_argument(
+            '--event-store',
+            action='store_true',
+            help='Also rebuild the memory-mapped event store (api.eventstore) from the database',
+        )
+        parser.add_argument(
+            '--month',
+            help='Reload one month (YYYY-MM): replace its activities with those of the file in that month',
+        )
+        parser.add_argument(
+            '--shadow',
+            action='store_true',
+            help='Load into a copy of the SQLite database and swap it in at the end, '
+                 'so the API keeps reading the previous data meanwhile',
+        )
+
     def handle(self, *args, **kwargs):
         """
         Handle the command to add data to the database from the CSV file.
         """
-       
-        self.create_activities(os.path.join(settings.BASE_DIR, 'api', 'data', 'merged_activities_data_sample_10pct.csv'))
-        self.stdout.write(self.style.SUCCESS('Activities added'))
+        if kwargs['month']:
+            if kwargs['row_by_row']:
+                raise CommandError('--month requires the bulk loader (without --row-by-row)')
+            try:
+                kwargs['month'] = partitions.parse_month(kwargs['month'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        with shadow_database() if kwargs['shadow'] else nullcontext() as shadow:
+            if shadow:
+                self.stdout.write(self.style.SUCCESS(f'Loading into {shadow.name}'))
+            self.add_data(**kwargs)
+        if shadow:
+            self.stdout.write(self.style.SUCCESS(f'{shadow.name} is now the live database'))
+
+    def add_data(self, **kwargs):
+        """
+        Load the activities of the file, then add TPT, variants, sketches (and the event store).
+        """
+        if kwargs['row_by_row']:
+            self.create_activities(kwargs['file'])
+            self.stdout.write(self.style.SUCCESS('Activities added'))
+        else:
+            rows = self.load_activities(kwargs['file'], month=kwargs['month'])
+            self.stdout.write(self.style.SUCCESS(f'{rows} activities loaded'))
         self.stdout.write(self.style.SUCCESS('Adding TPT'))
         self.add_TPT()
 
         self.stdout.write(self.style.SUCCESS('Creating variants'))
+        # Rebuilt from all the activities, also when only one month was reloaded
+        Variant.objects.all().delete()
         self.create_variants()
 
+        self.stdout.write(self.style.SUCCESS('Creating duration sketches'))
+        self.create_sketches()
+
+        if kwargs['event_store']:
+            self.stdout.write(self.style.SUCCESS('Building event store'))
+            meta = build_event_store()
+            self.stdout.write(self.style.SUCCESS(f"Event store {meta['build']}: {meta['events']} events"))
+
         #self.stdout.write(self.style.SUCCESS('Data added successfully'))
 
        # self.get_mean_time_per_activity(self.get_case_activity_time())
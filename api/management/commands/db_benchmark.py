@@ -0,0 +1,155 @@
+import contextlib
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Avg, Count
+
+from api import partitions
+from api.management.commands.create_data import Command as CreateDataCommand
+from api.models import Activity
+from api.views.views import case_summaries
+
+
+def timed(fn, repeat):
+    """Median and best seconds of `repeat` calls of fn."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {'median_ms': statistics.median(timings) * 1000, 'best_ms': min(timings) * 1000}
+
+
+def benchmark_queries(repeat):
+    """Time the queries behind the main dashboard endpoints on the loaded activities."""
+    ordered = Activity.objects.order_by('timestamp').values_list('timestamp', flat=True)
+    first, last = ordered.first(), ordered.last()
+    middle = first + (last - first) / 2
+    name = Activity.objects.values_list('name', flat=True).first()
+    queries = {
+        'count': lambda: Activity.objects.count(),
+        'distinct_cases': lambda: Activity.objects.values('case').distinct().count(),
+        'filter_name_date': lambda: Activity.objects.filter(name=name, timestamp__gte=middle).count(),
+        'per_activity_stats': lambda: list(
+            Activity.objects.values('name').annotate(n=Count('id'), avg_tpt=Avg('tpt')).order_by()
+        ),
+        'page_of_100': lambda: list(Activity.objects.order_by('timestamp')[:100]),
+        'case_explorer_scan': lambda: sum(1 for _ in case_summaries(
+            Activity.objects.order_by('case', 'timestamp').values_list('case', 'name', 'timestamp')
+            .iterator(chunk_size=10000)
+        )),
+    }
+    return {label: timed(fn, repeat) for label, fn in queries.items()}
+
+
+class Command(BaseCommand):
+    """
+    Django management command benchmarking the configured database backend: bulk load
+    time (COPY on PostgreSQL, bulk_create on SQLite) and the latency of typical
+    dashboard queries. It runs on a scratch test database, never on the real data.
+    Run it once per backend (DB_ENGINE=sqlite / postgresql) and compare the results.
+    """
+    help = 'Benchmark activity loading and query latency of the configured database on a scratch database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(Path(settings.BASE_DIR) / 'api' / 'data' / 'activities.csv'),
+                            help='Activity file (CSV or Parquet) to load')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each query')
+        parser.add_argument('--row-by-row', action='store_true',
+                            help='Also time the row-by-row loading of create_activities (slow)')
+        parser.add_argument('--partitioned', action='store_true',
+                            help='Partition the activities by month (api.partitions) before timing the queries')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of another backend to compare with')
+
+    def handle(self, *args, **options):
+        if not Path(options['file']).exists():
+            raise CommandError(f"File not found: {options['file']}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                # A file, not the default in-memory test database, to compare like with like
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(tmp) / 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+            try:
+                results = self.run_benchmark(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+        self.report(results, baseline)
+
+    def run_benchmark(self, options):
+        results = {
+            'vendor': connection.vendor,
+            'server_version': str(
+                connection.pg_version if connection.vendor == 'postgresql' else connection.Database.sqlite_version
+            ),
+            'python': platform.python_version(),
+            'file': Path(options['file']).name,
+            'load': {},
+        }
+        loader = CreateDataCommand()
+        started = time.perf_counter()
+        rows = loader.load_activities(options['file'])
+        results['rows'] = rows
+        results['load']['bulk_seconds'] = time.perf_counter() - started
+        results['load']['method'] = 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+
+        if options['row_by_row']:
+            Activity.objects.all().delete()
+            started = time.perf_counter()
+            # create_activities prints one line per activity
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                loader.create_activities(options['file'])
+            results['load']['row_by_row_seconds'] = time.perf_counter() - started
+
+        if options['partitioned']:
+            started = time.perf_counter()
+            results['partitions'] = len(partitions.enable_partitioning())
+            results['load']['partition_seconds'] = time.perf_counter() - started
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(Activity._meta.db_table)}')
+        results['queries'] = benchmark_queries(options['repeat'])
+        return results
+
+    def report(self, results, baseline=None):
+        partitioned = f", {results['partitions']} monthly partitions" if 'partitions' in results else ''
+        self.stdout.write(
+            f"{results['vendor']} {results['server_version']}: {results['rows']} activities from {results['file']}"
+            f"{partitioned}"
+        )
+        load = results['load']
+        line = f"load ({load['method']}): {load['bulk_seconds']:.2f}s = {results['rows'] / load['bulk_seconds']:,.0f} rows/s"
+        if 'row_by_row_seconds' in load:
+            line += f", row by row: {load['row_by_row_seconds']:.2f}s"
+        if baseline:
+            line += f" ({baseline['vendor']}: {baseline['load']['bulk_seconds']:.2f}s)"
+        self.stdout.write(line)
+
+        header = f"{'query':22}{'median ms':>12}{'best ms':>10}"
+        if baseline:
+            header += f"{baseline['vendor'] + ' ms':>16}{'ratio':>8}"
+        self.stdout.write(header)
+        for label, timing in results['queries'].items():
+            line = f"{label:22}{timing['median_ms']:>12.2f}{timing['best_ms']:>10.2f}"
+            if baseline and label in baseline['queries']:
+                other = baseline['queries'][label]['median_ms']
+                line += f"{other:>16.2f}{other / timing['median_ms']:>8.2f}x"
+            self.stdout.write(line)
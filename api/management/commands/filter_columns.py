@@ -2,7 +2,56 @@ import pandas as pd
 import sys
 from pathlib import Path
 
-def filter_csv_columns(input_file, output_file, columns_to_keep):
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, stream_filter_columns
+
+def filter_csv_columns_streaming(input_file, output_file, columns_to_keep, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming version of filter_csv_columns: reads only the header up front, resolves
+    the kept columns (including aliases such as 'CASE ID' for 'CASE_ID') and copies
+    them chunk by chunk, so memory stays constant whatever the size of the file.
+    
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        columns_to_keep (list): List of column names to keep
+        chunksize (int): Number of rows read and written at a time
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    
+    try:
+        print(f"Streaming file: {input_file}")
+        result = stream_filter_columns(input_file, output_file, columns_to_keep, chunksize)
+        
+        print(f"Original file has {len(result['header'])} columns")
+        
+        if result['missing']:
+            print(f"\n⚠️  Warning: These columns were not found in the file:")
+            for col in result['missing']:
+                print(f"  - {col}")
+        
+        if result['rows'] is None:
+            print("❌ Error: None of the specified columns exist in the file!")
+            return False
+        
+        print(f"\n✅ Kept {len(result['columns'])} columns:")
+        for wanted, col in result['columns'].items():
+            print(f"  - {col}" if wanted == col else f"  - {col} (for {wanted})")
+        
+        print(f"\n✅ Successfully saved filtered file: {output_file}")
+        print(f"Filtered file has {result['rows']} rows and {len(result['columns'])} columns")
+        
+        return True
+        
+    except FileNotFoundError:
+        print(f"❌ Error: File '{input_file}' not found.")
+        return False
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return False
+
+def filter_csv_columns(input_file, output_file, columns_to_keep, chunksize=None):
     """
     Keep only specified columns from a CSV file and delete all others.
     
@@ -10,11 +59,16 @@ def filter_csv_columns(input_file, output_file, columns_to_keep):
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file
         columns_to_keep (list): List of column names to keep
+        chunksize (int): If set, stream the file in chunks of this many rows
+                         (see filter_csv_columns_streaming)
     
     Returns:
         bool: True if successful, False otherwise
     """
     
+    if chunksize:
+        return filter_csv_columns_streaming(input_file, output_file, columns_to_keep, chunksize)
+    
     try:
         # Read the CSV file
         print(f"Reading file: {input_file}")
@@ -124,7 +178,7 @@ def filter_csv_columns_interactive():
         return
     
     # Execute the filtering
-    success = filter_csv_columns(input_file, output_file, columns_to_keep)
+    success = filter_csv_columns(input_file, output_file, columns_to_keep, DEFAULT_CHUNKSIZE)
     
     if success:
         print("\n🎉 Operation completed successfully!")
@@ -142,20 +196,26 @@ def main():
         filter_csv_columns_interactive()
     else:
         # Command line mode
-        if len(sys.argv) < 4:
-            print("Usage: python filter_columns.py <input_file> <output_file> <column1> <column2> ...")
-            print("Example: python filter_columns.py data.csv filtered_data.csv SYSTEM_ID LG_USER_ID LG_LOG_TIME_TIMESTAMP")
+        args = sys.argv[1:]
+        chunksize = DEFAULT_CHUNKSIZE
+        if args and args[0] == '--in-memory':
+            chunksize = None
+            args = args[1:]
+        
+        if len(args) < 3:
+            print("Usage: python -m api.management.commands.filter_columns [--in-memory] <input_file> <output_file> <column1> <column2> ...")
+            print("Example: python -m api.management.commands.filter_columns data.csv filtered_data.csv SYSTEM_ID LG_USER_ID LG_LOG_TIME_TIMESTAMP")
             return
         
-        input_file = sys.argv[1]
-        output_file = sys.argv[2]
-        columns_to_keep = sys.argv[3:]
+        input_file = args[0]
+        output_file = args[1]
+        columns_to_keep = args[2:]
         
         print(f"Input file: {input_file}")
         print(f"Output file: {output_file}")
         print(f"Columns to keep: {columns_to_keep}")
         
-        success = filter_csv_columns(input_file, output_file, columns_to_keep)
+        success = filter_csv_columns(input_file, output_file, columns_to_keep, chunksize)
         
         if not success:
             sys.exit(1)
@@ -169,7 +229,7 @@ def filter_activity_tables():
     # Define the columns you want to keep
     columns_to_keep = [
         'SYSTEM_ID',
-        'CASE_ID',  # Note: might be 'CASE ID' in older files
+        'CASE_ID',  # Resolved to 'CASE ID' in older files
         'LG_USER_ID',
         'LG_ID_SOGGETTO', 
         'LG_LOG_TIME_TIMESTAMP',
@@ -194,17 +254,11 @@ def filter_activity_tables():
     
     # Filter first file
     print("\nProcessing 2025 file...")
-    success1 = filter_csv_columns(file1, output1, columns_to_keep)
+    success1 = filter_csv_columns_streaming(file1, output1, columns_to_keep)
     
-    # Filter second file (handle different column name)
+    # Filter second file (the streaming filter resolves 'CASE ID' for 'CASE_ID')
     print("\nProcessing 2024 file...")
-    columns_to_keep_2024 = columns_to_keep.copy()
-    # Replace CASE_ID with CASE ID for the 2024 file
-    if 'CASE_ID' in columns_to_keep_2024:
-        columns_to_keep_2024.remove('CASE_ID')
-        columns_to_keep_2024.append('CASE ID')
-    
-    success2 = filter_csv_columns(file2, output2, columns_to_keep_2024)
+    success2 = filter_csv_columns_streaming(file2, output2, columns_to_keep)
     
     if success1 and success2:
         print("\n🎉 Both files filtered successfully!")
@@ -2,7 +2,9 @@ import pandas as pd
 from pathlib import Path
 import os
 
-def keep_only_columns(input_file, output_file, columns_to_keep):
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, stream_filter_columns
+
+def keep_only_columns(input_file, output_file, columns_to_keep, chunksize=None, column_mapping=None):
     """
     Simple function to keep only specified columns from a CSV file.
     
@@ -10,8 +12,36 @@ def keep_only_columns(input_file, output_file, columns_to_keep):
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file  
         columns_to_keep (list): List of column names to keep
+        chunksize (int): If set, read only the needed columns and stream them
+                         in chunks of this many rows (constant memory)
+        column_mapping (dict): File column -> canonical name (see load_column_mapping),
+                               used when streaming
     """
     
+    if chunksize:
+        try:
+            result = stream_filter_columns(input_file, output_file, columns_to_keep, chunksize, column_mapping)
+            existing_columns = list(result['columns'].values())
+            
+            print(f"Processing: {Path(input_file).name}")
+            print(f"  Original columns: {len(result['header'])}")
+            print(f"  Keeping columns: {len(existing_columns)}")
+            print(f"  Found columns: {existing_columns}")
+            
+            if result['missing']:
+                print(f"  Missing columns: {result['missing']}")
+            
+            if result['rows'] is None:
+                print(f"  ❌ No matching columns found! Skipping file.")
+                return False
+            
+            print(f"  ✅ Saved filtered file: {Path(output_file).name} ({result['rows']} rows)")
+            return True
+            
+        except Exception as e:
+            print(f"  ❌ Error processing {Path(input_file).name}: {str(e)}")
+            return False
+    
     try:
         # Read CSV
         df = pd.read_csv(input_file)
@@ -43,7 +73,8 @@ def keep_only_columns(input_file, output_file, columns_to_keep):
         print(f"  ❌ Error processing {Path(input_file).name}: {str(e)}")
         return False
 
-def filter_all_csv_files_in_folder(input_folder, output_folder, columns_to_keep, suffix="_filtered"):
+def filter_all_csv_files_in_folder(input_folder, output_folder, columns_to_keep, suffix="_filtered", chunksize=DEFAULT_CHUNKSIZE,
+                                   column_mapping=None):
     """
     Process all CSV files in a folder and keep only specified columns.
     
@@ -52,6 +83,8 @@ def filter_all_csv_files_in_folder(input_folder, output_folder, columns_to_keep,
         output_folder (str): Path to folder for filtered files
         columns_to_keep (list): List of column names to keep
         suffix (str): Suffix to add to output filenames
+        chunksize (int): Rows per chunk when streaming (None to load each file whole)
+        column_mapping (dict): File column -> canonical name (see load_column_mapping)
     """
     
     input_path = Path(input_folder)
@@ -80,7 +113,7 @@ def filter_all_csv_files_in_folder(input_folder, output_folder, columns_to_keep,
         output_file = output_path / output_filename
         
         # Process the file
-        if keep_only_columns(str(csv_file), str(output_file), columns_to_keep):
+        if keep_only_columns(str(csv_file), str(output_file), columns_to_keep, chunksize, column_mapping):
             successful += 1
         else:
             failed += 1
@@ -3,6 +3,8 @@ import os
 import glob
 from pathlib import Path
 
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, count_rows, read_header, stream_concat
+
 def join_csv_files(folder_path, output_file=None, pattern="*.csv"):
     """
     Join all CSV files in a folder into one CSV file.
@@ -76,6 +78,60 @@ def join_csv_files(folder_path, output_file=None, pattern="*.csv"):
     
     return combined_df
 
+def join_csv_files_streaming(folder_path, output_file, pattern="*.csv", chunksize=DEFAULT_CHUNKSIZE, source_column='source_file'):
+    """
+    Join all CSV files in a folder into one CSV file, chunk by chunk.
+    
+    Headers are compared before any data is read; every file is then appended
+    to the output in chunks, so memory stays at one chunk however many files
+    are joined.
+    
+    Args:
+        folder_path (str): Path to the folder containing CSV files
+        output_file (str): Path for the output file
+        pattern (str): File pattern to match (default: "*.csv")
+        chunksize (int): Number of rows read and written at a time
+        source_column (str): Column tracking the source file (None to skip it)
+    
+    Returns:
+        dict: Joined columns, rows per source file and total rows, or None on failure
+    """
+    
+    folder_path = Path(folder_path)
+    
+    if not folder_path.exists():
+        print(f"Error: Folder '{folder_path}' does not exist.")
+        return None
+    
+    csv_files = sorted(folder_path.glob(pattern))
+    
+    if not csv_files:
+        print(f"No CSV files found in '{folder_path}' matching pattern '{pattern}'")
+        return None
+    
+    print(f"Joining {len(csv_files)} CSV files...")
+    
+    result = stream_concat(csv_files, output_file, chunksize=chunksize, source_column=source_column)
+    
+    for csv_file, error in result['errors'].items():
+        print(f"Error reading {Path(csv_file).name}: {error}")
+    for csv_file, collisions in result['collisions'].items():
+        for col, merged in collisions.items():
+            print(f"  - ⚠️  {Path(csv_file).name}: {col!r} is an alias of {merged!r} in the same file, kept apart")
+    for csv_file, mismatch in result['mismatches'].items():
+        print(f"  - ⚠️  {Path(csv_file).name}: missing {mismatch['missing']}, extra {mismatch['extra']}")
+    
+    if not result['row_counts']:
+        print("No valid CSV files were read.")
+        return None
+    
+    print(f"Joined CSV:")
+    print(f"  - Total rows: {result['rows']}")
+    print(f"  - Total columns: {len(result['columns'])}")
+    print(f"\nCombined CSV saved to: {output_file}")
+    
+    return result
+
 def join_csv_files_simple(folder_path, output_file):
     """
     Simple version that joins CSV files without source tracking.
@@ -94,13 +150,10 @@ def join_csv_files_simple(folder_path, output_file):
     
     print(f"Joining {len(csv_files)} CSV files...")
     
-    # Read and combine all CSV files
-    combined_df = pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True)
-    
-    # Save the combined file
-    combined_df.to_csv(output_file, index=False)
+    # Append all CSV files chunk by chunk
+    result = stream_concat(csv_files, output_file, source_column=None)
     
-    print(f"Combined {len(combined_df)} rows into: {output_file}")
+    print(f"Combined {result['rows']} rows into: {output_file}")
 
 def analyze_csv_structure(folder_path):
     """
@@ -123,15 +176,14 @@ def analyze_csv_structure(folder_path):
     
     for file_path in csv_files:
         try:
-            df = pd.read_csv(file_path, nrows=0)  # Read only headers
+            columns = read_header(file_path)  # Read only headers
             structures[file_path.name] = {
-                'columns': list(df.columns),
-                'column_count': len(df.columns)
+                'columns': columns,
+                'column_count': len(columns)
             }
             
-            # Get row count
-            df_full = pd.read_csv(file_path)
-            structures[file_path.name]['row_count'] = len(df_full)
+            # Get row count, parsing only the first column
+            structures[file_path.name]['row_count'] = count_rows(file_path)
             
         except Exception as e:
             print(f"Error reading {file_path.name}: {str(e)}")
@@ -189,18 +241,18 @@ def main():
     
     if response in ['y', 'yes']:
         print("\nStep 2: Joining CSV files...")
-        combined_df = join_csv_files(input_folder, output_file)
+        result = join_csv_files_streaming(input_folder, output_file)
         
-        if combined_df is not None:
+        if result is not None:
             print("\n✅ Files joined successfully!")
             
             # Show sample of combined data
             print("\nSample of combined data (first 5 rows):")
-            print(combined_df.head())
+            print(pd.read_csv(output_file, nrows=5))
             
             print(f"\nFile counts by source:")
-            if 'source_file' in combined_df.columns:
-                print(combined_df['source_file'].value_counts())
+            for source, count in sorted(result['row_counts'].items()):
+                print(f"{source}: {count}")
         else:
             print("\n❌ Failed to join files.")
     else:
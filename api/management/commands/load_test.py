@@ -0,0 +1,179 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def run_load(base_url, paths, concurrency, duration):
+    """
+    Send GET requests from `concurrency` clients for `duration` seconds.
+
+    Each client keeps one HTTP/1.1 connection open and cycles through `paths`.
+
+    Returns:
+        dict: Requests, throughput, latency percentiles in ms and status counts
+        (None for connection errors).
+    """
+    url = urlsplit(base_url)
+    deadline = time.perf_counter() + duration
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def client(index):
+        local_latencies = []
+        local_statuses = Counter()
+        connection = None
+        i = index
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+                # As behind the TLS proxy (SECURE_PROXY_SSL_HEADER), not redirected to HTTPS
+                connection.request('GET', path, headers={'Host': url.netloc, 'X-Forwarded-Proto': 'https'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException):
+                status = None
+                if connection is not None:
+                    connection.close()
+                connection = None
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            local_statuses[status] += 1
+        if connection is not None:
+            connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'statuses': dict(statuses),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start listening on port {port}")
+
+
+class Command(BaseCommand):
+    """
+    Django management command load-testing the API with concurrent keep-alive clients,
+    either against a running server or comparing runserver with gunicorn.
+    """
+    help = 'Measure concurrent throughput and latency of API endpoints (optionally runserver vs gunicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:5001', help='Base URL of a running server')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable); default /v1/metadata/')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server')
+        parser.add_argument('--compare', action='store_true',
+                            help='Start runserver and gunicorn (gunicorn.conf.py) on free ports and load both')
+        parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS for --compare')
+        parser.add_argument('--threads', type=int, help='GUNICORN_THREADS for --compare')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/v1/metadata/']
+        if not options['compare']:
+            self.report(options['url'], run_load(options['url'], paths, options['concurrency'], options['duration']))
+            return
+
+        env = os.environ.copy()
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+        if options['threads']:
+            env['GUNICORN_THREADS'] = str(options['threads'])
+        env.setdefault('GUNICORN_ACCESS_LOG', '/dev/null')
+        servers = {
+            'runserver': lambda port: [
+                sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}',
+            ],
+            'gunicorn': lambda port: [
+                sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+            ],
+        }
+        results = {}
+        for name, command in servers.items():
+            port = free_port()
+            process = subprocess.Popen(
+                command(port), cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_port(port, process)
+                base_url = f'http://127.0.0.1:{port}'
+                # Warm up imports and caches before measuring
+                run_load(base_url, paths, options['concurrency'], 1)
+                results[name] = run_load(base_url, paths, options['concurrency'], options['duration'])
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            self.report(name, results[name])
+
+        baseline = results['runserver']['requests_per_second']
+        if baseline:
+            speedup = results['gunicorn']['requests_per_second'] / baseline
+            self.stdout.write(self.style.SUCCESS(f"gunicorn throughput: {speedup:.1f}x runserver"))
+
+    def report(self, label, result):
+        self.stdout.write(
+            f"{label}: {result['requests']} requests in {result['seconds']:.1f}s "
+            f"= {result['requests_per_second']:.1f} req/s, "
+            f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+            f"statuses {result['statuses']}"
+        )
+        successes = sum(n for status, n in result['statuses'].items() if status and 200 <= status < 300)
+        if successes * 2 < result['requests']:
+            self.stdout.write(self.style.WARNING(
+                f"{label}: only {successes} of {result['requests']} responses were 2xx; "
+                f"the numbers measure redirects or errors, not the endpoints"
+            ))
@@ -4,7 +4,7 @@ Script to merge all CSV files in a folder into one big CSV file.
 All CSV files should have the same column structure.
 
 Configuration is done by editing the variables in the main() function.
-Simply run: python merge_all_csvs.py
+Simply run: python -m api.management.commands.merge_all_csvs
 """
 
 import pandas as pd
@@ -13,6 +13,8 @@ import glob
 from pathlib import Path
 import sys
 
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, load_column_mapping, plan_concat, stream_concat
+
 
 def merge_csv_files(input_folder, output_file=None, file_pattern="*.csv"):
     """
@@ -46,6 +48,13 @@ def merge_csv_files(input_folder, output_file=None, file_pattern="*.csv"):
     for file in csv_files:
         print(f"  - {file.name}")
     
+    # Check the schemas from the headers before loading anything
+    plan = plan_concat(csv_files, align_aliases=False)
+    for csv_file, mismatch in plan['mismatches'].items():
+        print(f"  - WARNING: Column mismatch in {Path(csv_file).name}")
+        print(f"    Missing: {mismatch['missing']}")
+        print(f"    Extra: {mismatch['extra']}")
+    
     # List to store all DataFrames
     dataframes = []
     
@@ -117,6 +126,79 @@ def merge_csv_files(input_folder, output_file=None, file_pattern="*.csv"):
     return merged_df
 
 
+def merge_csv_files_streaming(input_folder, output_file, file_pattern="*.csv", chunksize=DEFAULT_CHUNKSIZE, include_source=True,
+                              column_mapping=None):
+    """
+    Merge all CSV files in a folder into one big CSV file without loading them.
+    
+    The schemas are compared from the headers first and aliased columns
+    (e.g. 'CASE ID' and 'CASE_ID') are aligned; each file is then appended to
+    the output chunk by chunk, so at most one chunk is held in memory.
+    
+    Args:
+        input_folder (str): Path to the folder containing CSV files
+        output_file (str): Path to the output merged CSV file
+        file_pattern (str): Pattern to match CSV files (default: "*.csv")
+        chunksize (int): Number of rows read and written at a time
+        include_source (bool): Add a source_file column with the file name of each row
+        column_mapping (dict): File column -> canonical name (see load_column_mapping)
+    
+    Returns:
+        dict: Merged columns, rows per source file and total rows written
+    """
+    
+    input_path = Path(input_folder)
+    
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input folder does not exist: {input_folder}")
+    
+    if not input_path.is_dir():
+        raise ValueError(f"Input path is not a directory: {input_folder}")
+    
+    csv_files = sorted(input_path.glob(file_pattern))
+    
+    if not csv_files:
+        raise ValueError(f"No CSV files found in {input_folder} with pattern {file_pattern}")
+    
+    print(f"Found {len(csv_files)} CSV files to merge:")
+    for file in csv_files:
+        print(f"  - {file.name}")
+    
+    result = stream_concat(
+        csv_files,
+        output_file,
+        chunksize=chunksize,
+        source_column='source_file' if include_source else None,
+        column_mapping=column_mapping,
+    )
+    
+    for csv_file, error in result['errors'].items():
+        print(f"  - ERROR reading {Path(csv_file).name}: {error}")
+    for csv_file, collisions in result['collisions'].items():
+        for col, merged in collisions.items():
+            print(f"  - WARNING: {Path(csv_file).name} has both {merged!r} and its alias {col!r}; kept {col!r} apart")
+    for csv_file, mismatch in result['mismatches'].items():
+        print(f"  - WARNING: Column mismatch in {Path(csv_file).name}")
+        print(f"    Missing: {mismatch['missing']}")
+        print(f"    Extra: {mismatch['extra']}")
+    
+    if not result['row_counts']:
+        raise ValueError("No valid CSV files were processed")
+    
+    print(f"\nMerged CSV:")
+    print(f"  - Total rows: {result['rows']}")
+    print(f"  - Columns: {result['columns']}")
+    
+    print(f"\nRows by source file:")
+    for source, count in sorted(result['row_counts'].items()):
+        print(f"  - {source}: {count} rows")
+    
+    file_size = Path(output_file).stat().st_size / (1024 * 1024)  # MB
+    print(f"\nSaved merged CSV to: {output_file} ({file_size:.2f} MB)")
+    
+    return result
+
+
 def main():
     """Main function to run the script."""
     
@@ -136,6 +218,12 @@ def main():
     # Set to True if you want to remove the source_file column from output
     REMOVE_SOURCE_COLUMN = False
     
+    # Rows read and written at a time (set to None to load all files in memory)
+    CHUNKSIZE = DEFAULT_CHUNKSIZE
+    
+    # Column mapping written by compare_csv_columns.py (None to only align known aliases)
+    COLUMN_MAPPING_FILE = None
+    
     # ==============================
     # END CONFIGURATION
     # ==============================
@@ -146,8 +234,23 @@ def main():
         print(f"  Output file: {OUTPUT_FILE}")
         print(f"  File pattern: {FILE_PATTERN}")
         print(f"  Remove source column: {REMOVE_SOURCE_COLUMN}")
+        print(f"  Chunk size: {CHUNKSIZE}")
         print("-" * 50)
         
+        if CHUNKSIZE:
+            result = merge_csv_files_streaming(
+                INPUT_FOLDER,
+                OUTPUT_FILE,
+                FILE_PATTERN,
+                chunksize=CHUNKSIZE,
+                include_source=not REMOVE_SOURCE_COLUMN,
+                column_mapping=load_column_mapping(COLUMN_MAPPING_FILE) if COLUMN_MAPPING_FILE else None,
+            )
+            print(f"\n✅ Successfully merged CSV files!")
+            print(f"Output: {OUTPUT_FILE}")
+            print(f"Total rows: {result['rows']}")
+            return
+        
         # Merge CSV files
         merged_df = merge_csv_files(
             INPUT_FOLDER,
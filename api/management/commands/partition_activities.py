@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    """
+    Django management command managing the monthly partitions of the Activity
+    table (api.partitions): switch partitioning on or off, list the partitions,
+    and drop or empty the partition of one month.
+    """
+    help = 'Manage the monthly partitions of the Activity table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enable', 'disable', 'list', 'create', 'drop', 'truncate'],
+                            help='enable/disable partitioning, list partitions, or create/drop/truncate one month')
+        parser.add_argument('--month', help='Month (YYYY-MM) for create, drop and truncate')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        month = None
+        if action in ('create', 'drop', 'truncate'):
+            try:
+                month = partitions.parse_month(options['month'])
+            except ValueError as e:
+                raise CommandError(f"{action} needs --month: {e}")
+
+        if action == 'list':
+            if not partitions.is_partitioned():
+                self.stdout.write("Activity is not partitioned")
+                return
+            for month, name, rows in partitions.partition_counts():
+                self.stdout.write(f"{month:%Y-%m}  {name:28}{rows:>10}")
+            return
+
+        try:
+            if action == 'enable':
+                months = partitions.enable_partitioning()
+                self.stdout.write(self.style.SUCCESS(f"Activity partitioned into {len(months)} monthly partitions"))
+            elif action == 'disable':
+                partitions.disable_partitioning()
+                self.stdout.write(self.style.SUCCESS("Activity moved back into a single table"))
+            elif not partitions.is_partitioned():
+                raise CommandError("Activity is not partitioned; run `partition_activities enable` first")
+            elif action == 'create':
+                created = partitions.ensure_partitions([month])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Created {partitions.partition_name(month)}" if created else f"{month:%Y-%m} already exists"
+                ))
+            elif action == 'drop':
+                if not partitions.drop_partition(month):
+                    raise CommandError(f"No partition for {month:%Y-%m}")
+                self.stdout.write(self.style.SUCCESS(f"Dropped {partitions.partition_name(month)}"))
+            else:
+                rows = partitions.truncate_partition(month)
+                self.stdout.write(self.style.SUCCESS(f"Removed {rows} activities of {month:%Y-%m}"))
+        except ValueError as e:
+            raise CommandError(str(e))
+        if action in ('drop', 'truncate'):
+            self.stdout.write("Run the rollups job (or create_data's TPT, variants and sketches) to update the aggregates")
@@ -1,6 +1,15 @@
 import pandas as pd
+import numpy as np
 import os
 import re
+import time
+
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, iter_csv_chunks, read_header, write_chunks
+
+# Case ids look like GBS#####; rows without one get the bare 'GBS' case id
+GBS_PATTERN = re.compile(r'(GBS\d{5})')
+NO_CASE_ID = 'GBS'
+
 def process_first_column(text):
     """
     Example function to process the first column.
@@ -8,11 +17,66 @@ def process_first_column(text):
     You can modify this function to implement any logic you need.
     """
     #Look for all texts with the structure GBS#####
-    pattern = r'GBS\d{5}'
-    matches = re.findall(pattern, str(text))
+    matches = GBS_PATTERN.findall(str(text))
     if not matches:
-        return "['GBS']"
+        return [NO_CASE_ID]
     return matches
+
+def extract_case_ids(df, column=None, case_id_column='case_id'):
+    """
+    Extract the GBS case ids of a column and emit one row per (row, case id) pair.
+    Equivalent to process_csv_file followed by simple_explode_csv, without
+    building and re-parsing stringified lists.
+    
+    Args:
+        df (pandas.DataFrame): The data
+        column (str): Column to scan (default: the first column)
+        case_id_column (str): Name of the new case id column
+    
+    Returns:
+        pandas.DataFrame: The rows of df, repeated once per case id found
+        (once with 'GBS' if none), in their original order
+    """
+    if column is None:
+        column = df.columns[0]
+    text = df[column].astype(str).reset_index(drop=True)
+    matches = text.str.extractall(GBS_PATTERN)[0]
+    positions = matches.index.get_level_values(0).to_numpy()
+    unmatched = np.setdiff1d(np.arange(len(df)), positions)
+    positions = np.concatenate([positions, unmatched])
+    case_ids = np.concatenate([matches.to_numpy(dtype=object), np.full(len(unmatched), NO_CASE_ID, dtype=object)])
+    order = np.argsort(positions, kind='stable')
+    result = df.iloc[positions[order]].copy()
+    result[case_id_column] = case_ids[order]
+    return result
+
+def extract_case_ids_streaming(input_file, output_file, column=None, case_id_column='case_id', chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Extract the (row, case id) pairs of a CSV file chunk by chunk (see extract_case_ids).
+    
+    Args:
+        input_file (str): Path to the input CSV file
+        output_file (str): Path to the output CSV file
+        column (str): Column to scan (default: the first column)
+        case_id_column (str): Name of the new case id column
+        chunksize (int): Rows per chunk
+    
+    Returns:
+        dict: Number of input rows, of rows written and of rows without a case id
+    """
+    if column is None:
+        column = read_header(input_file)[0]
+    stats = {'rows': 0, 'unmatched_rows': 0}
+    
+    def chunks():
+        for chunk in iter_csv_chunks(input_file, chunksize=chunksize):
+            pairs = extract_case_ids(chunk, column, case_id_column)
+            stats['rows'] += len(chunk)
+            stats['unmatched_rows'] += int((pairs[case_id_column] == NO_CASE_ID).sum())
+            yield pairs
+    
+    stats['pairs'] = write_chunks(chunks(), output_file)
+    return stats
     
 def process_csv_file(input_file, output_file=None):
     """
@@ -36,7 +100,9 @@ def process_csv_file(input_file, output_file=None):
         
         # Apply the function to the first column and create a new column
         new_column_name = f"{first_column}_processed"
-        df[new_column_name] = df[first_column].apply(process_first_column)
+        df[new_column_name] = df[first_column].astype(str).str.findall(GBS_PATTERN).map(
+            lambda matches: matches or [NO_CASE_ID]
+        )
         
         print(f"Created new column: {new_column_name}")
         
@@ -62,24 +128,26 @@ def process_csv_file(input_file, output_file=None):
         return None
 
 def main():
+    # Run from the repository root: python -m api.management.commands.process_csv
     # Configuration
     input_file = r"d:\Projects\value-partners-backend\api\data\Activity Table Tickets copy.csv"
-    output_file = r"d:\Projects\value-partners-backend\api\data\Activity Table Tickets_processed.csv"
+    output_file = r"d:\Projects\value-partners-backend\api\data\Activity Table Tickets_case_ids.csv"
     
     # Check if input file exists
     if not os.path.exists(input_file):
         print(f"Input file not found: {input_file}")
         return
     
-    # Process the CSV
-    processed_df = process_csv_file(input_file, output_file)
+    # Extract one row per (ticket, case id) pair, ready for the merge step
+    start_time = time.time()
+    stats = extract_case_ids_streaming(input_file, output_file)
     
-    if processed_df is not None:
-        print("\nProcessing completed successfully!")
-        
-        # Show some sample results
-        print("\nSample results:")
-        print(processed_df[['SM_DS_REQUEST', 'CASE_IDs']].head(10))
+    print("\nProcessing completed successfully!")
+    print(f"- Total rows: {stats['rows']}")
+    print(f"- Rows without a case id: {stats['unmatched_rows']}")
+    print(f"- (row, case id) pairs written: {stats['pairs']}")
+    print(f"- Time: {time.time() - start_time:.2f} s")
+    print(f"\nProcessed data saved to: {output_file}")
 
 if __name__ == "__main__":
     main()
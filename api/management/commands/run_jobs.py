@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import STALE_SECONDS, work
+
+
+def worker_process(name, burst, poll_interval, stale_seconds):
+    """Entry point of a forked worker process: stop after the current job on SIGTERM."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    work(name, burst=burst, poll_interval=poll_interval, stale_seconds=stale_seconds, stop=stop)
+
+
+class Command(BaseCommand):
+    """
+    Django management command running the background job workers (api.jobs),
+    which take the jobs queued in the database through the jobs/ endpoints.
+    """
+    help = 'Run background job workers reading the queue stored in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between queue checks when it is empty')
+        parser.add_argument('--stale-after', type=int, default=STALE_SECONDS,
+                            help='Seconds without heartbeat after which a running job is requeued')
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        args = (options['burst'], options['poll_interval'], options['stale_after'])
+        if options['processes'] == 1:
+            self.stdout.write(f"Worker {prefix} waiting for jobs")
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *a: stop.set())
+            done = work(prefix, *args, stop=stop)
+            self.stdout.write(self.style.SUCCESS(f"Worker {prefix} ran {done} jobs"))
+            return
+
+        # Forked children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=worker_process, args=(f'{prefix}/{i}', *args), daemon=False)
+            for i in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} workers ({prefix}/0-{len(processes) - 1})")
+
+        def terminate(*a):
+            for process in processes:
+                process.terminate()
+        signal.signal(signal.SIGTERM, terminate)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            terminate()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,94 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from api.management.csv_utils import load_column_mapping
+from api.management.pipeline import build_activity_pipeline
+
+
+class Command(BaseCommand):
+    """
+    Django management command running the CSV preprocessing pipeline:
+    raw exports -> merged CASE_ID -> filtered and normalized activities ->
+    merged -> cleaned -> sampled -> activity CSV (-> database with --load).
+
+    Stage outputs are cached by content hash, so only the stages whose inputs
+    changed run again.
+    """
+    help = 'Run the CSV preprocessing pipeline, skipping stages whose inputs have not changed'
+
+    def add_arguments(self, parser):
+        data_dir = os.path.join(settings.BASE_DIR, 'api', 'data')
+        parser.add_argument('--exports-folder', default=os.path.join(data_dir, 'updated_data'),
+                            help='Folder of the monthly activity exports')
+        parser.add_argument('--pattern', default='Activities Table MySella*.csv',
+                            help='Pattern of the export files in the folder')
+        parser.add_argument('--tickets', nargs='*', default=[],
+                            help='Ticket exports whose GBS case ids are extracted and merged in')
+        parser.add_argument('--column-mapping',
+                            help='Column mapping JSON written by compare_csv_columns.py')
+        # Not the tracked merged_activities_data_sample_10pct.csv: the hash sampler keeps other cases
+        parser.add_argument('--output', default=os.path.join(data_dir, 'pipeline', 'activities.csv'),
+                            help='Activity CSV written at the end (load it with --load or create_data --file)')
+        parser.add_argument('--sample-percentage', type=float, default=10,
+                            help='Percentage of case ids kept (100 keeps all)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the case sampling hash')
+        parser.add_argument('--stratify', action='store_true',
+                            help='Sample the same percentage of every activity-count bucket')
+        parser.add_argument('--cache-dir', default=os.path.join(data_dir, '.pipeline_cache'),
+                            help='Folder of the cached stage outputs')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU)')
+        parser.add_argument('--force', action='store_true', help='Ignore the cache and run every stage')
+        parser.add_argument('--dry-run', action='store_true', help='Only show which stages would run')
+        parser.add_argument('--load', action='store_true',
+                            help='Load the output into the database with create_data (adds to existing data)')
+
+    def handle(self, *args, **options):
+        export_files = sorted(Path(options['exports_folder']).glob(options['pattern']))
+        if not export_files and not options['tickets']:
+            self.stderr.write(self.style.ERROR(
+                f"No files matching {options['pattern']} in {options['exports_folder']}"
+            ))
+            return
+
+        pipeline = build_activity_pipeline(
+            export_files,
+            options['output'],
+            options['cache_dir'],
+            ticket_files=options['tickets'],
+            sample_percentage=options['sample_percentage'],
+            random_seed=options['seed'],
+            stratify=options['stratify'],
+            workers=options['workers'],
+            column_mapping=load_column_mapping(options['column_mapping']) if options['column_mapping'] else None,
+        )
+
+        if options['dry_run']:
+            _, _, to_run = pipeline.plan(options['force'])
+            for name in pipeline.stages:
+                self.stdout.write(f"{'run   ' if name in to_run else 'cached'}  {name}")
+            return
+
+        started = time.perf_counter()
+        report = pipeline.run(force=options['force'], log=self.stdout.write)
+        elapsed = time.perf_counter() - started
+
+        width = max(len(row['stage']) for row in report)
+        self.stdout.write(f"\n{'Stage':<{width}}  {'Status':<6}  {'Rows':>10}  {'Seconds':>8}")
+        for row in report:
+            rows = '' if row['rows'] is None else row['rows']
+            self.stdout.write(f"{row['stage']:<{width}}  {row['status']:<6}  {rows:>10}  {row['seconds']:>8.2f}")
+        ran = sum(row['status'] == 'ran' for row in report)
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{ran} of {len(report)} stages ran, {len(report) - ran} cached, {elapsed:.2f} s wall time"
+        ))
+        self.stdout.write(f"Output: {options['output']}")
+
+        if options['load']:
+            self.stdout.write(self.style.SUCCESS('Loading activities'))
+            call_command('create_data', file=options['output'])
@@ -3,27 +3,185 @@
 Script to create a random sample of data by selecting a percentage of unique case_ids
 and keeping only rows with those selected case_ids.
 
+Cases are selected by hashing their case_id with a seed, so the same seed selects
+the same cases on every run and in every monthly file, without a pass over the
+unique case_ids first.
+
 Configuration is done by editing the variables in the main() function.
-Simply run: python sample_case_ids.py
+Run from the repository root: python -m api.management.commands.sample_case_ids
 """
 
-import pandas as pd
 import numpy as np
+import pandas as pd
 from pathlib import Path
-import random
 import sys
 
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, iter_csv_chunks, read_header, write_chunks
+from api.sampling import sample_rank
+from api.sketches import HyperLogLog
+
+# Buckets of activities per case_id: [1, 2), [2, 5), ... [100, inf)
+ACTIVITY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, float('inf')]
+ACTIVITY_BUCKET_LABELS = ['1', '2-4', '5-9', '10-19', '20-49', '50-99', '100+']
+
+
+def case_sample_ranks(case_ids, random_seed=None):
+    """
+    Deterministic sample rank of each case_id, uniformly distributed in [0, 1).
+    A case is in a p% sample if its rank is below p / 100, so smaller samples
+    are contained in larger ones. The ranks are those of api.sampling.sample_rank,
+    stored with every activity, so the offline sample and the API's `sample=`
+    parameter keep the same cases.
+    
+    Args:
+        case_ids (pandas.Series): The case ids (hashed as text)
+        random_seed (int): Seed selecting an independent family of samples (None uses 0)
+    
+    Returns:
+        numpy.ndarray: The ranks, aligned with case_ids
+    """
+    # Each distinct case id is hashed once
+    codes, uniques = pd.factorize(case_ids.astype(str), use_na_sentinel=False)
+    ranks = np.fromiter((sample_rank(case_id, random_seed or 0) for case_id in uniques), float, len(uniques))
+    return ranks[codes]
+
+
+def activity_count_buckets(case_id_counts):
+    """
+    Bucket case_ids by their number of activities (see ACTIVITY_BUCKETS).
+    
+    Args:
+        case_id_counts (pandas.Series): Number of activities per case_id
+    
+    Returns:
+        pandas.Series: Bucket label per case_id
+    """
+    return pd.cut(case_id_counts, bins=ACTIVITY_BUCKETS, labels=ACTIVITY_BUCKET_LABELS, right=False)
+
+
+def select_stratified_cases(case_id_counts, sample_percentage, random_seed=None):
+    """
+    Select sample_percentage% of the case_ids of every activity-count bucket
+    (at least one per non-empty bucket), taking the lowest sample ranks.
+    
+    Args:
+        case_id_counts (pandas.Series): Number of activities per case_id
+        sample_percentage (float): Percentage of case_ids to select (0-100)
+        random_seed (int): Seed of the case hash
+    
+    Returns:
+        set: The selected case_ids
+    """
+    cases = pd.DataFrame({
+        'bucket': activity_count_buckets(case_id_counts),
+        'rank': case_sample_ranks(case_id_counts.index.to_series(), random_seed),
+    }, index=case_id_counts.index)
+    selected = set()
+    for _, bucket in cases.groupby('bucket', observed=True):
+        sample_size = max(1, int(round(len(bucket) * sample_percentage / 100)))
+        selected.update(bucket['rank'].nsmallest(sample_size).index)
+    return selected
+
+
+def count_case_activities(input_file, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Count the activities of every case_id of a CSV file, reading only that column.
+    
+    Returns:
+        pandas.Series: Number of activities per case_id
+    """
+    counts = pd.Series(dtype='int64')
+    for chunk in iter_csv_chunks(input_file, usecols=['case_id'], chunksize=chunksize):
+        case_ids = chunk['case_id']
+        counts = counts.add(case_ids[case_ids != ''].value_counts(), fill_value=0)
+    return counts.astype('int64')
+
+
+def sample_case_ids_streaming(input_file, output_file, sample_percentage=10, random_seed=None,
+                              stratify=False, chunksize=DEFAULT_CHUNKSIZE, verbose=True):
+    """
+    Sample a percentage of the case_ids of a CSV file chunk by chunk.
+    
+    Without stratification the file is read once and memory stays at one chunk:
+    every row is kept or dropped from the hash of its case_id alone. With
+    stratify=True a first pass counts the activities per case_id and the same
+    percentage is selected in every activity-count bucket, so rare long cases
+    are represented too.
+    
+    Args:
+        input_file (str): Path to the input CSV file
+        output_file (str): Path to the output sampled CSV file
+        sample_percentage (float): Percentage of unique case_ids to sample (0-100)
+        random_seed (int): Seed of the case hash (None uses 0)
+        stratify (bool): Sample each activity-count bucket separately (two passes)
+        chunksize (int): Rows per chunk
+        verbose (bool): Print information about the sampling process
+    
+    Returns:
+        dict: Number of rows read and kept and the (estimated) number of sampled case_ids
+    """
+    
+    if not Path(input_file).exists():
+        raise FileNotFoundError(f"Input file does not exist: {input_file}")
+    
+    if not 0 < sample_percentage <= 100:
+        raise ValueError(f"Sample percentage must be between 0 and 100, got {sample_percentage}")
+    
+    if 'case_id' not in read_header(input_file):
+        raise ValueError("Column 'case_id' not found in the CSV file")
+    
+    selected = None
+    if stratify:
+        if verbose:
+            print(f"Counting activities per case_id: {input_file}")
+        selected = select_stratified_cases(count_case_activities(input_file, chunksize), sample_percentage, random_seed)
+    
+    stats = {'rows': 0}
+    sampled_cases = HyperLogLog()
+    
+    def chunks():
+        for chunk in iter_csv_chunks(input_file, chunksize=chunksize):
+            case_ids = chunk['case_id']
+            if selected is None:
+                keep = (case_sample_ranks(case_ids, random_seed) < sample_percentage / 100) & (case_ids != '')
+            else:
+                keep = case_ids.isin(selected)
+            sampled = chunk[keep]
+            stats['rows'] += len(chunk)
+            for case_id in sampled['case_id'].unique():
+                sampled_cases.add(case_id)
+            yield sampled
+    
+    if verbose:
+        print(f"Sampling {sample_percentage}% of the case_ids of: {input_file}")
+    stats['sampled_rows'] = write_chunks(chunks(), output_file)
+    stats['sampled_case_ids'] = len(selected) if selected is not None else sampled_cases.count()
+    
+    if verbose:
+        rows_kept_percentage = (stats['sampled_rows'] / stats['rows']) * 100 if stats['rows'] > 0 else 0
+        approx = '' if selected is not None else '~'
+        print(f"\nSampling Results:")
+        print(f"  Original rows: {stats['rows']:,}")
+        print(f"  Sampled rows: {stats['sampled_rows']:,}")
+        print(f"  Rows kept: {rows_kept_percentage:.2f}%")
+        print(f"  Sampled case_ids: {approx}{stats['sampled_case_ids']:,}")
+        print(f"Successfully saved sampled CSV to: {output_file}")
+    
+    return stats
+
 
-def sample_case_ids(input_file, output_file=None, sample_percentage=10, random_seed=None, verbose=True):
+def sample_case_ids(input_file, output_file=None, sample_percentage=10, random_seed=None, verbose=True, stratify=False):
     """
     Create a random sample by selecting a percentage of unique case_ids.
+    Selects the same cases as sample_case_ids_streaming; use that one for large files.
     
     Args:
         input_file (str): Path to the input CSV file
         output_file (str): Path to the output sampled CSV file (optional)
         sample_percentage (float): Percentage of unique case_ids to sample (0-100)
-        random_seed (int): Random seed for reproducible results (optional)
+        random_seed (int): Seed of the case hash (None uses 0)
         verbose (bool): Print detailed information about the sampling process
+        stratify (bool): Sample each activity-count bucket separately
     
     Returns:
         pandas.DataFrame: Sampled DataFrame
@@ -38,19 +196,12 @@ def sample_case_ids(input_file, output_file=None, sample_percentage=10, random_s
     if not 0 < sample_percentage <= 100:
         raise ValueError(f"Sample percentage must be between 0 and 100, got {sample_percentage}")
     
-    # Set random seed for reproducibility
-    if random_seed is not None:
-        random.seed(random_seed)
-        np.random.seed(random_seed)
-        if verbose:
-            print(f"Random seed set to: {random_seed}")
-    
     if verbose:
         print(f"Loading CSV file: {input_file}")
         
     # Read the CSV file
     try:
-        df = pd.read_csv(input_file)
+        df = pd.read_csv(input_file, dtype={'case_id': str})
     except Exception as e:
         raise ValueError(f"Error reading CSV file: {e}")
     
@@ -72,24 +223,26 @@ def sample_case_ids(input_file, output_file=None, sample_percentage=10, random_s
         print(f"  Unique case_ids: {total_unique_case_ids:,}")
         print(f"  Rows per case_id (average): {len(df) / total_unique_case_ids:.2f}")
     
-    # Calculate sample size
-    sample_size = max(1, int(total_unique_case_ids * (sample_percentage / 100)))
-    
     if verbose:
         print(f"\nSampling Configuration:")
         print(f"  Sample percentage: {sample_percentage}%")
-        print(f"  Case IDs to sample: {sample_size:,} out of {total_unique_case_ids:,}")
+        print(f"  Random seed: {random_seed}")
+        print(f"  Stratified by activity count: {stratify}")
     
-    # Randomly sample case_ids
-    sampled_case_ids = np.random.choice(unique_case_ids, size=sample_size, replace=False)
-    sampled_case_ids_set = set(sampled_case_ids)
-    
-    if verbose:
-        print(f"  Selected case_ids: {len(sampled_case_ids):,}")
-        print(f"  Sample of selected case_ids: {sorted(list(sampled_case_ids))[:10]}...")
+    # Select case_ids by their hash
+    if stratify:
+        case_id_counts = df['case_id'].value_counts()
+        keep = df['case_id'].isin(select_stratified_cases(case_id_counts, sample_percentage, random_seed))
+    else:
+        keep = df['case_id'].notna() & (case_sample_ranks(df['case_id'], random_seed) < sample_percentage / 100)
     
     # Filter dataframe to keep only rows with sampled case_ids
-    sampled_df = df[df['case_id'].isin(sampled_case_ids_set)].copy()
+    sampled_df = df[keep].copy()
+    
+    if verbose:
+        sampled_case_ids = sampled_df['case_id'].unique()
+        print(f"  Selected case_ids: {len(sampled_case_ids):,} out of {total_unique_case_ids:,}")
+        print(f"  Sample of selected case_ids: {sorted(sampled_case_ids)[:10]}...")
     
     # Calculate statistics
     original_rows = len(df)
@@ -186,17 +339,9 @@ def analyze_case_id_distribution(df, verbose=True):
         
         # Distribution analysis
         print(f"\nDistribution of activities per case_id:")
-        bins = [1, 2, 5, 10, 20, 50, 100, float('inf')]
-        labels = ['1', '2-4', '5-9', '10-19', '20-49', '50-99', '100+']
+        histogram = activity_count_buckets(case_id_counts).value_counts(sort=False)
         
-        for i, (lower, upper) in enumerate(zip(bins[:-1], bins[1:])):
-            if upper == float('inf'):
-                count = sum(1 for x in case_id_counts if x >= lower)
-                range_label = labels[i]
-            else:
-                count = sum(1 for x in case_id_counts if lower <= x < upper)
-                range_label = labels[i]
-            
+        for range_label, count in histogram.items():
             if count > 0:
                 pct = (count / len(case_id_counts)) * 100
                 print(f"  {range_label:>6} activities: {count:,} case_ids ({pct:.1f}%)")
@@ -220,9 +365,15 @@ def main():
     # Percentage of unique case_ids to sample (0-100)
     SAMPLE_PERCENTAGE = 10.0
     
-    # Random seed for reproducible results (set to None for different results each time)
+    # Seed of the case hash: the same seed selects the same case_ids in every file
     RANDOM_SEED = 42
     
+    # Sample the same percentage within each activity-count bucket (reads the file twice)
+    STRATIFY = False
+    
+    # Rows read per chunk
+    CHUNKSIZE = DEFAULT_CHUNKSIZE
+    
     # Set to True for detailed output, False for minimal output
     VERBOSE = True
     
@@ -239,38 +390,32 @@ def main():
         print(f"  Output file: {OUTPUT_FILE}")
         print(f"  Sample percentage: {SAMPLE_PERCENTAGE}%")
         print(f"  Random seed: {RANDOM_SEED}")
+        print(f"  Stratify: {STRATIFY}")
         print(f"  Verbose output: {VERBOSE}")
         print("=" * 50)
         
-        # Load and analyze the original data first
+        # Analyze the original data first, reading only the case_id column
         if RUN_ANALYSIS:
-            df_original = pd.read_csv(INPUT_FILE)
+            df_original = pd.read_csv(INPUT_FILE, usecols=['case_id'], dtype={'case_id': str})
             analyze_case_id_distribution(df_original, verbose=VERBOSE)
+            del df_original
         
         # Sample the CSV file
-        sampled_df = sample_case_ids(
+        stats = sample_case_ids_streaming(
             INPUT_FILE,
             OUTPUT_FILE,
             sample_percentage=SAMPLE_PERCENTAGE,
             random_seed=RANDOM_SEED,
+            stratify=STRATIFY,
+            chunksize=CHUNKSIZE,
             verbose=VERBOSE
         )
         
         print(f"\n✅ Successfully created sample dataset!")
         print(f"Input: {INPUT_FILE}")
         print(f"Output: {OUTPUT_FILE}")
-        print(f"Final row count: {len(sampled_df):,}")
-        print(f"Final unique case_ids: {sampled_df['case_id'].nunique():,}")
-        
-        # Show a sample of the sampled data
-        if VERBOSE and len(sampled_df) > 0:
-            print(f"\nSample of sampled data:")
-            print(sampled_df.head(10))
-            
-            # Quick verification
-            selected_case_ids = sampled_df['case_id'].unique()
-            print(f"\nVerification - First 10 selected case_ids:")
-            print(sorted(selected_case_ids)[:10])
+        print(f"Final row count: {stats['sampled_rows']:,}")
+        print(f"Final unique case_ids: {stats['sampled_case_ids']:,}")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -1,6 +1,68 @@
 import pandas as pd
 import ast
 import os
+import re
+import time
+
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, iter_csv_chunks, read_header, write_chunks
+
+# A list of plain quoted strings, e.g. "['GBS07328', 'GBS08509']"; anything else goes through ast
+SIMPLE_LIST_PATTERN = re.compile(r"^\[\s*(?:'[^'\\]*'\s*(?:,\s*'[^'\\]*'\s*)*)?\]$")
+QUOTED_ITEM_PATTERN = re.compile(r"'([^'\\]*)'")
+
+def parse_list_cell(value):
+    """
+    Parse one cell of the list column into a list of items.
+    Native lists are used as they are; string lists of plain quoted items
+    (the format written by process_csv) are parsed with a regular expression,
+    other strings fall back to ast.literal_eval.
+    
+    Args:
+        value: The cell value
+    
+    Returns:
+        list: The items ([''] for an empty cell, [value] if the cell is not a list)
+    """
+    if isinstance(value, list):
+        return value
+    if isinstance(value, tuple):
+        return list(value)
+    if pd.isna(value):
+        return ['']
+    text = str(value).strip()
+    if text == '':
+        return ['']
+    if SIMPLE_LIST_PATTERN.match(text):
+        return QUOTED_ITEM_PATTERN.findall(text)
+    try:
+        # Convert string representation of list to actual list
+        items = ast.literal_eval(text)
+        if not isinstance(items, list):
+            items = [items]
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        # If parsing fails, treat as single item
+        items = [str(value)]
+    return items
+
+def explode_list_column(df, list_column):
+    """
+    Create a new row for each item in the list column, copying all other data.
+    The items go to a new '<list_column>_individual' column; rows with an empty
+    list produce no row.
+    
+    Args:
+        df (pandas.DataFrame): The data
+        list_column (str): Column holding the lists (strings or native lists)
+    
+    Returns:
+        tuple: (exploded DataFrame, number of input rows with more than one item)
+    """
+    items = df[list_column].map(parse_list_cell)
+    lengths = items.str.len()
+    result_df = df.copy()
+    result_df[list_column + '_individual'] = items
+    result_df = result_df[lengths > 0].explode(list_column + '_individual')
+    return result_df, int((lengths > 1).sum())
 
 def simple_explode_csv(input_file, output_file=None):
     """
@@ -19,32 +81,9 @@ def simple_explode_csv(input_file, output_file=None):
         list_column = df.columns[-1]  # SM_DS_REQUEST_processed
         print(f"List column: {list_column}")
         
-        exploded_rows = []
-        
-        for _, row in df.iterrows():
-            list_value = row[list_column]
-            
-            # Parse the list string
-            try:
-                if pd.isna(list_value) or str(list_value).strip() == '':
-                    items = ['']
-                else:
-                    # Convert string representation of list to actual list
-                    items = ast.literal_eval(str(list_value))
-                    if not isinstance(items, list):
-                        items = [items]
-            except:
-                # If parsing fails, treat as single item
-                items = [str(list_value)]
-            
-            # Create a new row for each item in the list
-            for item in items:
-                new_row = row.copy()
-                new_row[list_column + '_individual'] = item
-                exploded_rows.append(new_row)
-        
         # Create new dataframe
-        result_df = pd.DataFrame(exploded_rows)
+        result_df, multi_item_count = explode_list_column(df, list_column)
+        result_df.attrs['multi_item_rows'] = multi_item_count
         
         print(f"Exploded data: {len(result_df)} rows")
         print(f"New rows created: {len(result_df) - len(df)}")
@@ -65,7 +104,37 @@ def simple_explode_csv(input_file, output_file=None):
         print(f"Error: {e}")
         return None
 
+def explode_csv_streaming(input_file, output_file, list_column=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Explode a CSV by its list column chunk by chunk, so only one chunk is in memory.
+    Values are read as text, exactly as written in the file.
+    
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        list_column (str): Column holding the lists (default: the last column)
+        chunksize (int): Rows per chunk
+    
+    Returns:
+        dict: Row counts ('rows', 'exploded_rows', 'multi_item_rows') and the expansion ratio
+    """
+    if list_column is None:
+        list_column = read_header(input_file)[-1]
+    stats = {'rows': 0, 'multi_item_rows': 0}
+    
+    def chunks():
+        for chunk in iter_csv_chunks(input_file, chunksize=chunksize):
+            exploded, multi_item_count = explode_list_column(chunk, list_column)
+            stats['rows'] += len(chunk)
+            stats['multi_item_rows'] += multi_item_count
+            yield exploded
+    
+    stats['exploded_rows'] = write_chunks(chunks(), output_file)
+    stats['expansion_ratio'] = stats['exploded_rows'] / stats['rows'] if stats['rows'] else 0
+    return stats
+
 def main():
+    # Run from the repository root: python -m api.management.commands.simple_explode_csv
     input_file = r"d:\Projects\value-partners-backend\api\data\Activity Table Tickets_processed.csv"
     output_file = r"d:\Projects\value-partners-backend\api\data\Activity Table Tickets_exploded_simple.csv"
     
@@ -73,30 +142,21 @@ def main():
         print(f"File not found: {input_file}")
         return
     
-    result = simple_explode_csv(input_file, output_file)
+    print(f"Exploding: {input_file}")
+    start_time = time.time()
+    stats = explode_csv_streaming(input_file, output_file)
     
-    if result is not None:
-        print("\n" + "="*50)
-        print("SUCCESS! CSV exploded by list items.")
-        print("="*50)
-        
-        # Show some statistics
-        original_df = pd.read_csv(input_file)
-        
-        # Count rows with multiple items
-        multi_item_count = 0
-        for _, row in original_df.iterrows():
-            try:
-                items = ast.literal_eval(str(row[original_df.columns[-1]]))
-                if isinstance(items, list) and len(items) > 1:
-                    multi_item_count += 1
-            except:
-                pass
-        
-        print(f"Original rows with multiple list items: {multi_item_count}")
-        print(f"Total original rows: {len(original_df)}")
-        print(f"Total exploded rows: {len(result)}")
-        print(f"Expansion ratio: {len(result) / len(original_df):.2f}x")
+    print("\n" + "="*50)
+    print("SUCCESS! CSV exploded by list items.")
+    print("="*50)
+    
+    # Show some statistics
+    print(f"Original rows with multiple list items: {stats['multi_item_rows']}")
+    print(f"Total original rows: {stats['rows']}")
+    print(f"Total exploded rows: {stats['exploded_rows']}")
+    print(f"Expansion ratio: {stats['expansion_ratio']:.2f}x")
+    print(f"Time: {time.time() - start_time:.2f} s")
+    print(f"Saved to: {output_file}")
 
 if __name__ == "__main__":
     main()
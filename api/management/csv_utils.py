@@ -0,0 +1,296 @@
+"""
+Helpers shared by the CSV preprocessing scripts to stream large exports
+chunk by chunk instead of loading them whole into memory.
+
+The scripts that use them import this module, so run them from the
+repository root as modules, e.g.:
+    python -m api.management.commands.filter_columns
+"""
+import json
+import pandas as pd
+from pathlib import Path
+
+# Number of rows read per chunk when streaming a CSV file
+DEFAULT_CHUNKSIZE = 100_000
+
+# Known spellings of the same column across the MySella exports
+COLUMN_ALIASES = {
+    'CASE ID': 'CASE_ID',
+}
+
+
+def normalize_column_name(name):
+    """
+    Normalize a column name so that aliases compare equal
+    (e.g. 'CASE ID', 'case_id ' and '\\ufeffCASE_ID' all become 'CASE_ID').
+    """
+    normalized = str(name).replace('\ufeff', '').strip().upper().replace(' ', '_')
+    return COLUMN_ALIASES.get(normalized, normalized)
+
+
+def read_header(input_file):
+    """
+    Read only the header of a CSV file.
+
+    Returns:
+        list: The column names, deduplicated the same way pandas does
+        ('CASE_ID', 'CASE_ID.1', ...).
+    """
+    return list(pd.read_csv(input_file, nrows=0).columns)
+
+
+def count_rows(input_file, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Count the data rows of a CSV file, parsing only its first column.
+    """
+    return sum(len(chunk) for chunk in iter_csv_chunks(input_file, usecols=[0], chunksize=chunksize))
+
+
+def load_column_mapping(mapping_file):
+    """
+    Load a column mapping written by compare_csv_columns.py.
+
+    Returns:
+        dict: File column -> canonical column name, for the `column_mapping`
+        argument of resolve_columns, stream_filter_columns and stream_concat.
+    """
+    with open(mapping_file, encoding='utf-8') as f:
+        return json.load(f)['columns']
+
+
+def resolve_columns(header, columns_to_keep, column_mapping=None):
+    """
+    Match the requested columns against a file header.
+
+    Exact names win; otherwise a column matches if its normalized name (or the
+    name given for it in `column_mapping`) is the normalized requested name, so
+    'CASE_ID' finds 'CASE ID' in older exports. Each header column is used once.
+
+    Args:
+        header (list): Column names of the file.
+        columns_to_keep (list): Requested column names.
+        column_mapping (dict): Optional file column -> canonical column name.
+
+    Returns:
+        tuple: (found, missing) where `found` maps each requested name that was
+        found to the header column it resolved to, in request order.
+    """
+    column_mapping = column_mapping or {}
+    canonical = {
+        col: normalize_column_name(column_mapping.get(col, col)) for col in header
+    }
+    found = {}
+    missing = []
+    used = set()
+    for wanted in columns_to_keep:
+        if wanted in header and wanted not in used:
+            match = wanted
+        else:
+            target = normalize_column_name(wanted)
+            match = next(
+                (col for col in header if col not in used and canonical[col] == target),
+                None,
+            )
+        if match is None:
+            missing.append(wanted)
+        else:
+            found[wanted] = match
+            used.add(match)
+    return found, missing
+
+
+def iter_csv_chunks(input_file, usecols=None, chunksize=DEFAULT_CHUNKSIZE, as_text=True, **kwargs):
+    """
+    Iterate over a CSV file in chunks.
+
+    Args:
+        input_file (str): Path to the CSV file.
+        usecols (list): Columns to parse; the others are skipped by the parser.
+        chunksize (int): Rows per chunk.
+        as_text (bool): Read every value as text, exactly as written in the file.
+            Avoids per-chunk dtype inference (which could turn '9473' into
+            '9473.0' in some chunks only) and is faster than inferring types.
+        **kwargs: Extra arguments for pandas.read_csv.
+
+    Yields:
+        pandas.DataFrame: The chunks, in file order.
+    """
+    if as_text:
+        kwargs.setdefault('dtype', str)
+        kwargs.setdefault('keep_default_na', False)
+    reader = pd.read_csv(input_file, usecols=usecols, chunksize=chunksize, **kwargs)
+    with reader:
+        yield from reader
+
+
+def write_chunks(chunks, output_file):
+    """
+    Write chunks to one CSV file, the header once and the rows incrementally.
+
+    Args:
+        chunks (iterable): DataFrames with the same columns.
+        output_file (str): Path to the output CSV file.
+
+    Returns:
+        int: The number of rows written.
+    """
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    rows = 0
+    header_written = False
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=not header_written)
+            header_written = True
+            rows += len(chunk)
+    return rows
+
+
+def stream_filter_columns(input_file, output_file, columns_to_keep, chunksize=DEFAULT_CHUNKSIZE, column_mapping=None):
+    """
+    Keep only some columns of a CSV file, reading and writing it chunk by chunk.
+
+    Only the header is read up front; the requested columns (with aliases
+    resolved) are then parsed with `usecols`, so unneeded columns are never
+    parsed and memory stays at one chunk.
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        columns_to_keep (list): List of column names to keep
+        chunksize (int): Rows per chunk
+        column_mapping (dict): Optional file column -> canonical column name
+
+    Returns:
+        dict: The header, the resolved columns, the missing columns and the
+        number of rows written (None if no column matched and nothing was written).
+    """
+    header = read_header(input_file)
+    found, missing = resolve_columns(header, columns_to_keep, column_mapping)
+    result = {'header': header, 'columns': found, 'missing': missing, 'rows': None}
+    if not found:
+        return result
+    selected = list(found.values())
+    # Positions, because pandas deduplicates repeated header names
+    positions = [header.index(col) for col in selected]
+    chunks = (
+        chunk[selected]
+        for chunk in iter_csv_chunks(input_file, usecols=positions, chunksize=chunksize)
+    )
+    result['rows'] = write_chunks(chunks, output_file)
+    return result
+
+
+def plan_concat(csv_files, align_aliases=True, column_mapping=None):
+    """
+    Work out the merged schema of several CSV files from their headers only.
+
+    Args:
+        csv_files (list): Paths of the CSV files, in merge order.
+        align_aliases (bool): Merge columns whose normalized names are equal
+            (e.g. 'CASE ID' and 'CASE_ID') under the first name seen.
+        column_mapping (dict): Optional file column -> canonical column name;
+            mapped columns are merged under their canonical name.
+
+    Returns:
+        dict: 'columns' (merged columns in first-seen order), 'renames'
+        (file -> {file column: merged column}), 'mismatches' (file -> missing and
+        extra columns compared to the first file), 'errors' (file -> message
+        for files whose header could not be read) and 'collisions' (file ->
+        {file column: merged column} for columns kept under their own name
+        because another column of the same file already became that merged column).
+    """
+    column_mapping = column_mapping or {}
+    columns = []
+    canonical_to_column = {}
+    renames = {}
+    headers = {}
+    errors = {}
+    collisions = {}
+    for csv_file in csv_files:
+        try:
+            header = read_header(csv_file)
+        except Exception as e:
+            errors[csv_file] = str(e)
+            continue
+        headers[csv_file] = header
+        renames[csv_file] = {}
+        merged_in_file = set()
+        for col in header:
+            mapped = column_mapping.get(col, col)
+            key = normalize_column_name(mapped) if align_aliases else mapped
+            if key not in canonical_to_column:
+                canonical_to_column[key] = mapped
+                columns.append(mapped)
+            target = canonical_to_column[key]
+            if target in merged_in_file:
+                # Two aliases of one column in the same file ('CASE ID' and 'CASE_ID'):
+                # the second keeps its own name instead of overwriting the first
+                collisions.setdefault(csv_file, {})[col] = target
+                target = col
+                if col not in columns:
+                    columns.append(col)
+            merged_in_file.add(target)
+            if target != col:
+                renames[csv_file][col] = target
+
+    mismatches = {}
+    if headers:
+        first = next(iter(headers))
+        expected = {renames[first].get(col, col) for col in headers[first]}
+        for csv_file, header in headers.items():
+            current = {renames[csv_file].get(col, col) for col in header}
+            if current != expected:
+                mismatches[csv_file] = {
+                    'missing': sorted(expected - current),
+                    'extra': sorted(current - expected),
+                }
+    return {
+        'columns': columns, 'renames': renames, 'mismatches': mismatches, 'errors': errors, 'collisions': collisions,
+    }
+
+
+def stream_concat(csv_files, output_file, chunksize=DEFAULT_CHUNKSIZE, source_column='source_file', align_aliases=True,
+                  column_mapping=None):
+    """
+    Concatenate CSV files into one, holding at most one chunk in memory.
+
+    Schemas are checked from the headers first; every chunk is then aligned to
+    the merged columns (missing columns left empty), tagged with its source file
+    name and appended to the output.
+
+    Args:
+        csv_files (list): Paths of the CSV files, in merge order.
+        output_file (str): Path to the merged CSV file.
+        chunksize (int): Rows per chunk.
+        source_column (str): Name of the column tagging each row with its file
+            name (None to leave rows untagged).
+        align_aliases (bool): Merge aliased columns (see plan_concat).
+        column_mapping (dict): Optional file column -> canonical column name.
+
+    Returns:
+        dict: The plan from plan_concat plus 'row_counts' (file name -> rows)
+        and 'rows' (total rows written).
+    """
+    plan = plan_concat(csv_files, align_aliases, column_mapping)
+    columns = list(plan['columns'])
+    if source_column:
+        columns.append(source_column)
+    row_counts = {}
+
+    def chunks():
+        for csv_file in csv_files:
+            if csv_file in plan['errors']:
+                continue
+            name = Path(csv_file).name
+            row_counts[name] = 0
+            for chunk in iter_csv_chunks(csv_file, chunksize=chunksize):
+                chunk = chunk.rename(columns=plan['renames'][csv_file])
+                if source_column:
+                    chunk[source_column] = name
+                row_counts[name] += len(chunk)
+                yield chunk.reindex(columns=columns, fill_value='')
+
+    plan['rows'] = write_chunks(chunks(), output_file)
+    plan['row_counts'] = row_counts
+    return plan
@@ -0,0 +1,431 @@
+"""
+Preprocessing pipeline: the CSV preparation scripts wired as a DAG of stages.
+
+Every stage is a function of the outputs of its upstream stages (and of the
+source files it reads). Its output is cached in a file named by a key hashed
+from the stage, its parameters, the content of its source files and the keys
+of its upstream stages, so a stage only runs again when something it depends
+on changed. Independent stages (e.g. one chain per monthly export) run in
+parallel worker processes; a chain of single-input stages runs in one worker
+and hands its DataFrames over in memory, and results go back to the parent
+through the cache files, stored typed in Parquet rather than CSV (a pickle
+when pyarrow is not installed, see api.management.columnar.FRAME_SUFFIX). Activities are typed once, when normalized, and CSV is only
+read from the raw exports and written by the export stage.
+
+Run it with the run_pipeline management command.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from api.management.columnar import FRAME_SUFFIX, read_frame, to_typed_activities, write_activities, write_frame
+from api.management.csv_utils import normalize_column_name, read_header, resolve_columns
+from api.management.commands.merge_case_id_columns import coalesce_case_ids
+from api.management.commands.process_csv import extract_case_ids
+from api.management.commands.sample_case_ids import case_sample_ranks, select_stratified_cases
+
+# Columns of the activity files loaded by create_data
+ACTIVITY_COLUMNS = ['name', 'timestamp', 'case_id']
+
+# Source column -> activity column, per kind of export
+EXPORT_COLUMNS = {
+    'LG_OPCODE_DESCRIPTION': 'name',
+    'LG_LOG_TIME_TIMESTAMP': 'timestamp',
+    'CASE_ID': 'case_id',
+}
+TICKET_COLUMNS = {
+    'SM_S_RESOLUTION_CAT_1': 'name',
+    'SM_T_LAST_RESOLVED_DATE': 'timestamp',
+    'case_id': 'case_id',
+}
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """Return the SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    A step of the pipeline.
+
+    Attributes:
+        name (str): Unique name of the stage.
+        func (callable): ``func(inputs, sources, **params)`` returning a DataFrame,
+            where ``inputs`` are the outputs of ``deps`` in order. Must be a
+            module-level function unless ``in_process`` is set.
+        deps (list): Names of the upstream stages.
+        sources (list): Paths of the files the stage reads (part of the cache key).
+        params (dict): Keyword arguments of ``func`` (JSON-serializable, part of the cache key).
+        outputs (list): Files the stage writes; the stage runs again if one is missing.
+        in_process (bool): Run in the main process (e.g. stages that use the database).
+        cache (bool): Cache the output; uncached stages run on every run.
+    """
+
+    def __init__(self, name, func, deps=(), sources=(), params=None, outputs=(), in_process=False, cache=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.sources = [str(source) for source in sources]
+        self.params = params or {}
+        self.outputs = [str(output) for output in outputs]
+        self.in_process = in_process
+        self.cache = cache
+
+
+def run_chain(tasks):
+    """
+    Run a chain of stages in a worker process.
+
+    Each task is ``(name, func, sources, params, input_paths, output_path)``;
+    an input path of None stands for the output of the previous task, which is
+    handed over in memory.
+
+    Returns:
+        list: ``(name, seconds, rows)`` for every task.
+    """
+    results = []
+    previous = None
+    for name, func, sources, params, input_paths, output_path in tasks:
+        started = time.perf_counter()
+        inputs = [previous if path is None else read_frame(path) for path in input_paths]
+        previous = func(inputs, sources, **params)
+        if output_path:
+            write_frame(previous, output_path)
+        results.append((name, time.perf_counter() - started, len(previous)))
+    return results
+
+
+class Pipeline:
+    """
+    A DAG of stages with content-hash caching and parallel execution.
+
+    Args:
+        cache_dir (str): Folder of the cached stage outputs.
+        workers (int): Worker processes (default: one per CPU; 1 runs everything in process).
+    """
+
+    def __init__(self, cache_dir, workers=None):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.stages = {}
+
+    def add(self, stage):
+        """Add a stage after its upstream stages; returns its name."""
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage: {stage.name}")
+        unknown = [dep for dep in stage.deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {unknown}")
+        self.stages[stage.name] = stage
+        return stage.name
+
+    def cache_keys(self):
+        """
+        Compute the cache key of every stage (source files are hashed in parallel).
+
+        Returns:
+            dict: Stage name -> hex key.
+        """
+        sources = sorted({source for stage in self.stages.values() for source in stage.sources})
+        with ThreadPoolExecutor(max_workers=min(8, len(sources) or 1)) as executor:
+            digests = dict(zip(sources, executor.map(file_digest, sources)))
+        keys = {}
+        # Stages are added after their dependencies, so insertion order is topological
+        for name, stage in self.stages.items():
+            payload = json.dumps([
+                name,
+                f"{stage.func.__module__}.{stage.func.__qualname__}",
+                stage.params,
+                [digests[source] for source in stage.sources],
+                [keys[dep] for dep in stage.deps],
+            ], sort_keys=True, default=str)
+            keys[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return keys
+
+    def cache_path(self, name, key):
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        return self.cache_dir / f"{safe_name}.{key[:16]}{FRAME_SUFFIX}"
+
+    def _is_cached(self, stage, path):
+        return stage.cache and path.exists() and all(Path(output).exists() for output in stage.outputs)
+
+    def _prune(self, path):
+        """Remove the outdated cached outputs of the stage cached at `path`."""
+        prefix = path.name.rsplit('.', 2)[0]
+        for old in self.cache_dir.glob(f"*{FRAME_SUFFIX}"):
+            if old != path and old.name.rsplit('.', 2)[0] == prefix:
+                old.unlink()
+
+    def plan(self, force=False):
+        """
+        Work out which stages must run.
+
+        Returns:
+            tuple: (keys, cache paths, names of the stages to run in order)
+        """
+        keys = self.cache_keys()
+        paths = {name: self.cache_path(name, key) for name, key in keys.items()}
+        to_run = []
+        for name, stage in self.stages.items():
+            stale_deps = any(dep in to_run for dep in stage.deps)
+            if force or stale_deps or not self._is_cached(stage, paths[name]):
+                to_run.append(name)
+        return keys, paths, to_run
+
+    def _chain_from(self, name, to_run, children, started):
+        """The stage and its linear run of single-input descendants (run in one worker)."""
+        chain = [name]
+        while True:
+            current = chain[-1]
+            next_stages = [child for child in children[current] if child in to_run]
+            if len(next_stages) != 1 or len(children[current]) != 1:
+                return chain
+            child = self.stages[next_stages[0]]
+            if child.in_process or child.deps != [current] or child.name in started:
+                return chain
+            chain.append(child.name)
+
+    def run(self, force=False, log=print):
+        """
+        Run the stages whose cached output is missing or outdated.
+
+        Args:
+            force (bool): Ignore the cache and run every stage.
+            log (callable): Receives one progress line per finished stage.
+
+        Returns:
+            list: One dict per stage with 'stage', 'status' ('cached' or 'ran'),
+            'seconds' and 'rows' (None for cached stages).
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        keys, paths, to_run = self.plan(force)
+        report = {
+            name: {'stage': name, 'status': 'cached', 'seconds': 0.0, 'rows': None}
+            for name in self.stages
+        }
+        children = {name: [] for name in self.stages}
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                children[dep].append(stage.name)
+
+        done = {name for name in self.stages if name not in to_run}
+        started = set()
+
+        def task(name, input_from_previous):
+            stage = self.stages[name]
+            input_paths = [None if input_from_previous else str(paths[dep]) for dep in stage.deps]
+            output_path = str(paths[name]) if stage.cache else None
+            return name, stage.func, stage.sources, stage.params, input_paths, output_path
+
+        def finish(results):
+            for name, seconds, rows in results:
+                report[name].update(status='ran', seconds=seconds, rows=rows)
+                done.add(name)
+                if self.stages[name].cache:
+                    self._prune(paths[name])
+                log(f"{name}: {rows} rows in {seconds:.2f} s")
+
+        def run_in_process(name):
+            stage = self.stages[name]
+            started_at = time.perf_counter()
+            inputs = [read_frame(paths[dep]) for dep in stage.deps]
+            result = stage.func(inputs, stage.sources, **stage.params)
+            if stage.cache:
+                write_frame(result, paths[name])
+            finish([(name, time.perf_counter() - started_at, len(result))])
+
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        pending = {}
+        try:
+            while len(done) < len(self.stages):
+                ready = [
+                    name for name in to_run
+                    if name not in started and all(dep in done for dep in self.stages[name].deps)
+                ]
+                for name in ready:
+                    if self.stages[name].in_process:
+                        started.add(name)
+                        run_in_process(name)
+                        continue
+                    chain = self._chain_from(name, to_run, children, started)
+                    started.update(chain)
+                    tasks = [task(chain_name, index > 0) for index, chain_name in enumerate(chain)]
+                    if executor is None:
+                        finish(run_chain(tasks))
+                    else:
+                        pending[executor.submit(run_chain, tasks)] = chain
+                if ready and not pending:
+                    continue
+                if not pending:
+                    if len(done) < len(self.stages):
+                        raise RuntimeError("Pipeline is stuck: a stage depends on a stage that cannot run")
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.pop(future)
+                    finish(future.result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return [report[name] for name in self.stages]
+
+
+# ==============================
+# Stage functions
+# ==============================
+
+def _read_text_csv(path, usecols=None):
+    # Values as written in the file; empty cells are missing
+    return pd.read_csv(path, usecols=usecols, dtype=str)
+
+
+def merge_case_id_stage(inputs, sources, columns=(), column_mapping=None):
+    """
+    Read a monthly export and merge its CASE ID columns into CASE_ID
+    (see merge_case_id_columns). Only the CASE columns and `columns` are parsed.
+    """
+    source = sources[0]
+    header = read_header(source)
+    case_columns = [col for col in header if col.strip().upper().startswith('CASE')]
+    found, _ = resolve_columns(
+        header, [col for col in columns if normalize_column_name(col) != 'CASE_ID'], column_mapping
+    )
+    # Positions, because pandas deduplicates repeated header names
+    positions = sorted({header.index(col) for col in case_columns + list(found.values())})
+    df = _read_text_csv(source, usecols=positions)
+    df.columns = [header[position] for position in positions]
+    if len(case_columns) >= 2:
+        df['CASE_ID'] = coalesce_case_ids(df[case_columns[0]], df[case_columns[1]])
+        df = df.drop(columns=[col for col in case_columns if col != 'CASE_ID'])
+    elif case_columns and case_columns[0] != 'CASE_ID':
+        df = df.rename(columns={case_columns[0]: 'CASE_ID'})
+    return df
+
+
+def extract_case_ids_stage(inputs, sources, column=None):
+    """Read a ticket export and emit one row per (ticket, GBS case id) pair (see process_csv)."""
+    return extract_case_ids(_read_text_csv(sources[0]), column, 'case_id')
+
+
+def filter_columns_stage(inputs, sources, columns, column_mapping=None):
+    """Keep only `columns`, resolving aliases such as 'CASE ID' (see filter_columns)."""
+    df = inputs[0]
+    found, missing = resolve_columns(list(df.columns), columns, column_mapping)
+    if missing:
+        raise ValueError(f"Columns not found: {missing}")
+    return df[list(found.values())].set_axis(list(found), axis=1)
+
+
+def normalize_stage(inputs, sources, mapping):
+    """Rename the columns to the activity columns and convert them to their dtypes."""
+    return to_typed_activities(inputs[0].rename(columns=mapping)[ACTIVITY_COLUMNS])
+
+
+def concat_stage(inputs, sources):
+    """Concatenate the upstream outputs (see merge_all_csvs), keeping categorical columns categorical."""
+    merged = pd.concat(inputs, ignore_index=True)
+    for column, dtype in inputs[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            merged[column] = merged[column].astype('category')
+    return merged
+
+
+def clean_stage(inputs, sources, how='any', subset=None):
+    """Remove rows with missing data (see clean_csv_data)."""
+    return inputs[0].dropna(how=how, subset=subset).reset_index(drop=True)
+
+
+def sample_stage(inputs, sources, sample_percentage=10, random_seed=None, stratify=False):
+    """Keep the rows of a hash-based sample of the case ids (see sample_case_ids)."""
+    df = inputs[0]
+    if sample_percentage >= 100:
+        return df
+    if stratify:
+        selected = select_stratified_cases(df['case_id'].value_counts(), sample_percentage, random_seed)
+        keep = df['case_id'].isin(selected)
+    else:
+        keep = case_sample_ranks(df['case_id'], random_seed) < sample_percentage / 100
+    return df[keep].reset_index(drop=True)
+
+
+def export_stage(inputs, sources, output_file):
+    """Write the activities read by create_data (CSV as in the exports, or Parquet)."""
+    write_activities(inputs[0], output_file)
+    return inputs[0]
+
+
+def build_activity_pipeline(export_files, output_file, cache_dir, ticket_files=(), sample_percentage=10,
+                            random_seed=42, stratify=False, workers=None, column_mapping=None):
+    """
+    Build the pipeline turning the raw exports into the activity file loaded by create_data.
+
+    Per monthly export: merge_case_id -> filter -> normalize; per ticket export:
+    extract -> normalize; then merge -> clean -> sample -> export.
+
+    Args:
+        export_files (list): Paths of the monthly MySella activity exports.
+        output_file (str): Path of the activity CSV written at the end.
+        cache_dir (str): Folder of the cached stage outputs.
+        ticket_files (list): Paths of ticket exports whose GBS case ids are extracted.
+        sample_percentage (float): Percentage of case ids kept (100 keeps all).
+        random_seed (int): Seed of the case hash.
+        stratify (bool): Sample each activity-count bucket separately.
+        workers (int): Worker processes.
+        column_mapping (dict): File column -> canonical name (see compare_csv_columns.py).
+
+    Returns:
+        Pipeline: The pipeline, ready to run.
+    """
+    pipeline = Pipeline(cache_dir, workers)
+    normalized = []
+    for export_file in export_files:
+        file_name = Path(export_file).name
+        merged = pipeline.add(Stage(
+            f"merge_case_id[{file_name}]", merge_case_id_stage,
+            sources=[export_file], params={'columns': list(EXPORT_COLUMNS), 'column_mapping': column_mapping},
+        ))
+        filtered = pipeline.add(Stage(
+            f"filter[{file_name}]", filter_columns_stage, deps=[merged],
+            params={'columns': list(EXPORT_COLUMNS), 'column_mapping': column_mapping},
+        ))
+        normalized.append(pipeline.add(Stage(
+            f"normalize[{file_name}]", normalize_stage, deps=[filtered],
+            params={'mapping': EXPORT_COLUMNS},
+        )))
+    for ticket_file in ticket_files:
+        file_name = Path(ticket_file).name
+        extracted = pipeline.add(Stage(
+            f"extract[{file_name}]", extract_case_ids_stage, sources=[ticket_file],
+        ))
+        filtered = pipeline.add(Stage(
+            f"filter[{file_name}]", filter_columns_stage, deps=[extracted],
+            params={'columns': list(TICKET_COLUMNS), 'column_mapping': column_mapping},
+        ))
+        normalized.append(pipeline.add(Stage(
+            f"normalize[{file_name}]", normalize_stage, deps=[filtered],
+            params={'mapping': TICKET_COLUMNS},
+        )))
+    merged = pipeline.add(Stage("merge", concat_stage, deps=normalized))
+    cleaned = pipeline.add(Stage("clean", clean_stage, deps=[merged]))
+    sampled = pipeline.add(Stage(
+        "sample", sample_stage, deps=[cleaned],
+        params={'sample_percentage': sample_percentage, 'random_seed': random_seed, 'stratify': stratify},
+    ))
+    pipeline.add(Stage(
+        "export", export_stage, deps=[sampled],
+        params={'output_file': str(output_file)}, outputs=[output_file],
+    ))
+    return pipeline
@@ -0,0 +1,134 @@
+"""
+Synthetic activity logs shaped like the MySella exports, for benchmarks.
+
+The shape is measured on the 10% sample of the MySella activities
+(merged_activities_data_sample_10pct.csv): 29 activity names with a long-tailed
+frequency (the most frequent name is about 30% of the events), case lengths
+that are log-normal (median about 45 events, some cases with hundreds), and
+waiting times that are either seconds (clicks of one session) or weeks
+(the next session). Cases start uniformly over MYSELLA_PROFILE's period and
+end within it.
+
+The same events, seed and profile always give the same file, so benchmark runs
+on different commits load identical data.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .columnar import to_text_activities, write_activities
+
+MYSELLA_PROFILE = {
+    'activities': 29,
+    # Zipf exponent of the activity name frequencies
+    'activity_skew': 1.15,
+    # log-normal case length (events per case), clipped to max_case_events
+    'case_log_mean': 3.73,
+    'case_log_sigma': 1.21,
+    'max_case_events': 1000,
+    # Share of waiting times inside a session, their median, and the mean gap between sessions
+    'session_share': 0.7,
+    'session_median_seconds': 5.0,
+    'between_sessions_seconds': 2.5e6,
+    'start': '2023-04-01',
+    'end': '2025-07-31',
+    # Case ids are numbers, like the MySella request ids
+    'first_case_id': 13000000,
+}
+
+# Events written per CSV chunk, to bound memory on large logs
+CHUNK_EVENTS = 500_000
+
+
+def activity_names(profile=MYSELLA_PROFILE):
+    return [f'Activity {i + 1:02d}' for i in range(profile['activities'])]
+
+
+def case_lengths(events, rng, profile=MYSELLA_PROFILE):
+    """
+    Number of events of each case, summing to `events`.
+
+    Returns:
+        numpy.ndarray: One length per case.
+    """
+    lengths = []
+    total = 0
+    while total < events:
+        batch = np.exp(rng.normal(profile['case_log_mean'], profile['case_log_sigma'], 10_000))
+        batch = np.clip(batch.round(), 1, profile['max_case_events']).astype(np.int64)
+        lengths.append(batch)
+        total += int(batch.sum())
+    lengths = np.concatenate(lengths)
+    cases = int(np.searchsorted(np.cumsum(lengths), events)) + 1
+    lengths = lengths[:cases]
+    lengths[-1] -= int(lengths.sum()) - events
+    return lengths
+
+
+def _chunk(lengths, first_case, rng, start, span, weights, names, profile):
+    events = int(lengths.sum())
+    case_starts = start + rng.uniform(0, span, len(lengths))
+    in_session = rng.random(events) < profile['session_share']
+    gaps = np.where(
+        in_session,
+        rng.lognormal(np.log(profile['session_median_seconds']), 1.0, events),
+        rng.exponential(profile['between_sessions_seconds'], events),
+    )
+    # The first event of each case starts at the case start
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    gaps[offsets] = 0
+    elapsed = np.cumsum(gaps)
+    elapsed -= np.repeat(elapsed[offsets], lengths)
+    # Long cases are compressed to end within the period, like the cases of an export
+    durations = elapsed[np.cumsum(lengths) - 1]
+    room = start + span - case_starts
+    scale = np.where(durations > room, room / np.maximum(durations, 1), 1.0)
+    seconds = np.repeat(case_starts, lengths) + elapsed * np.repeat(scale, lengths)
+    codes = rng.choice(len(names), size=events, p=weights)
+    case_ids = np.repeat(np.arange(first_case, first_case + len(lengths)), lengths)
+    return pd.DataFrame({
+        'name': pd.Categorical.from_codes(codes, categories=names),
+        'timestamp': pd.to_datetime((seconds * 1000).astype(np.int64), unit='ms'),
+        'case_id': pd.Series(case_ids.astype(str), dtype='string'),
+    })
+
+
+def generate_activities(path, events, seed=0, profile=MYSELLA_PROFILE):
+    """
+    Write a synthetic activity log with name, timestamp and case_id columns.
+
+    Args:
+        path (str): CSV file (export text, read by create_data) or Parquet file.
+        events (int): Number of activities.
+        seed (int): Seed of the random generator.
+        profile (dict): Shape of the log (MYSELLA_PROFILE).
+
+    Returns:
+        dict: Events, cases and activity names of the log.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    names = activity_names(profile)
+    weights = 1 / np.arange(1, len(names) + 1) ** profile['activity_skew']
+    weights /= weights.sum()
+    start = pd.Timestamp(profile['start']).timestamp()
+    span = pd.Timestamp(profile['end']).timestamp() - start
+    lengths = case_lengths(events, rng, profile)
+
+    frames = []
+    ends = np.cumsum(lengths)
+    first = 0
+    while first < len(lengths):
+        # Whole cases per chunk, about CHUNK_EVENTS events each
+        last = max(first + 1, int(np.searchsorted(ends, ends[first] - lengths[first] + CHUNK_EVENTS, 'right')))
+        df = _chunk(lengths[first:last], profile['first_case_id'] + first, rng, start, span, weights, names, profile)
+        if path.suffix == '.csv':
+            to_text_activities(df).to_csv(path, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+        else:
+            frames.append(df)
+        first = last
+    if frames:
+        write_activities(pd.concat(frames, ignore_index=True), path)
+    return {'events': events, 'cases': len(lengths), 'activities': len(names)}
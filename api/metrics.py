@@ -0,0 +1,248 @@
+"""
+Prometheus metrics of the API, served in the text exposition format at /metrics.
+
+Request metrics are recorded by MetricsMiddleware (api.middleware) on the hot
+path, so they cost a few integer increments: every thread updates its own
+counters (a shard), and the scrape sums the shards. A lock is only taken when
+a thread records its first metric and when it exits, as the counters of exited
+threads are folded into one retired shard. Latency is a histogram per URL name
+of api/urls.py, with the request count per status class and the number of SQL
+queries (counted by PerformanceMiddleware).
+
+Other metrics are read when /metrics is scraped: cache hits and misses (the
+compiled query plans of api.query_dsl, the event store of api.eventstore),
+the calls of the analytics thread pool, the jobs per kind and status, and the
+throughput of each stage of the last finished ingest or rollups job.
+
+Metrics are per process: with several gunicorn workers, each scrape shows
+the worker that served it.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+# Upper bounds in seconds of the latency histogram buckets (plus +Inf)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Layout of the counters of one route: bucket counts (+Inf last), then:
+COUNT = len(LATENCY_BUCKETS) + 1
+SUM = COUNT + 1
+QUERIES = SUM + 1
+STATUS = QUERIES + 1
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+ROUTE_SIZE = STATUS + len(STATUS_CLASSES)
+
+UNMATCHED_ROUTE = 'unmatched'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    """The counters updated by one thread."""
+    __slots__ = ('routes', 'in_flight', 'counters')
+
+    def __init__(self):
+        self.routes = {}
+        self.in_flight = 0
+        self.counters = {}
+
+    def merge(self, other):
+        """Add the counters of another shard to this one."""
+        self.in_flight += other.in_flight
+        for route, values in list(other.routes.items()):
+            total = self.routes.setdefault(route, [0] * ROUTE_SIZE)
+            for i, value in enumerate(values):
+                total[i] += value
+        for name, value in list(other.counters.items()):
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _ThreadOwner:
+    """Kept in the thread-local storage; collected when its thread exits."""
+    __slots__ = ('__weakref__',)
+
+
+_local = threading.local()
+_shards = []
+# Counters of the threads that exited (runserver and ASGI use short-lived threads)
+_retired = _Shard()
+_shards_lock = threading.Lock()
+
+
+def _retire(shard):
+    with _shards_lock:
+        _shards.remove(shard)
+        _retired.merge(shard)
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _Shard()
+        _local.owner = _ThreadOwner()
+        with _shards_lock:
+            _shards.append(shard)
+        # Fold the shard into _retired once the thread exits, so shards do not pile up
+        weakref.finalize(_local.owner, _retire, shard)
+        return shard
+
+
+def request_started():
+    _shard().in_flight += 1
+
+
+def request_finished(route, status, seconds, queries=0):
+    """Record a served request under its URL name (None when no URL matched)."""
+    shard = _shard()
+    shard.in_flight -= 1
+    values = shard.routes.get(route)
+    if values is None:
+        values = shard.routes[route] = [0] * ROUTE_SIZE
+        values[SUM] = 0.0
+    values[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    values[COUNT] += 1
+    values[SUM] += seconds
+    values[QUERIES] += queries
+    if 100 <= status < 600:
+        values[STATUS + status // 100 - 1] += 1
+
+
+def count(name, amount=1):
+    """Add to a process-wide counter, e.g. count(('cache', 'event_store', 'hit'))."""
+    counters = _shard().counters
+    counters[name] = counters.get(name, 0) + amount
+
+
+def _totals():
+    totals = _Shard()
+    with _shards_lock:
+        totals.merge(_retired)
+        shards = list(_shards)
+    for shard in shards:
+        totals.merge(shard)
+    return totals.routes, totals.counters, totals.in_flight
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Exposition:
+    """Lines of the text exposition format, with one HELP and TYPE header per metric."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            self.lines.append(f'{name}{suffix}{{{label_text}}} {_number(value)}' if label_text
+                              else f'{name}{suffix} {_number(value)}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _cache_samples(counters):
+    from .query_dsl import compile_shape
+
+    info = compile_shape.cache_info()
+    caches = {'query_plan': (info.hits, info.misses)}
+    for key, value in counters.items():
+        if key[0] == 'cache':
+            hits, misses = caches.get(key[1], (0, 0))
+            caches[key[1]] = (hits + value, misses) if key[2] == 'hit' else (hits, misses + value)
+    return caches
+
+
+def _job_samples():
+    from django.db.models import Count
+
+    from .constants import JOB_KIND_INGEST, JOB_KIND_ROLLUPS, JOB_SUCCEEDED
+    from .models import Job
+
+    statuses = list(Job.objects.values_list('kind', 'status').annotate(n=Count('id')).order_by())
+    last = (
+        Job.objects.filter(kind__in=[JOB_KIND_INGEST, JOB_KIND_ROLLUPS], status=JOB_SUCCEEDED)
+        .order_by('-finished_at').values_list('result', flat=True).first()
+    )
+    stages = (last or {}).get('stages', {})
+    return statuses, stages
+
+
+def render_metrics():
+    """
+    Returns:
+        str: All metrics in the Prometheus text exposition format.
+    """
+    from .views.async_views import POOL_STATS
+
+    routes, counters, in_flight = _totals()
+    out = _Exposition()
+
+    histogram = []
+    for route, values in sorted(routes.items(), key=lambda item: str(item[0])):
+        labels = {'route': route or UNMATCHED_ROUTE}
+        cumulative = 0
+        for bound, bucket in zip((*LATENCY_BUCKETS, '+Inf'), values[:COUNT]):
+            cumulative += bucket
+            histogram.append(('_bucket', {**labels, 'le': bound}, cumulative))
+        histogram.append(('_sum', labels, values[SUM]))
+        histogram.append(('_count', labels, values[COUNT]))
+    out.metric('ofi_http_request_duration_seconds', 'histogram', 'Request latency per URL name.', histogram)
+    out.metric('ofi_http_requests_total', 'counter', 'Requests per URL name and status class.', [
+        ('', {'route': route or UNMATCHED_ROUTE, 'status': status}, values[STATUS + i])
+        for route, values in routes.items() for i, status in enumerate(STATUS_CLASSES) if values[STATUS + i]
+    ])
+    out.metric('ofi_http_requests_in_flight', 'gauge', 'Requests being served.', [('', {}, in_flight)])
+    out.metric('ofi_db_queries_total', 'counter', 'SQL queries run by the requests of each URL name.', [
+        ('', {'route': route or UNMATCHED_ROUTE}, values[QUERIES]) for route, values in routes.items()
+    ])
+
+    caches = _cache_samples(counters)
+    out.metric('ofi_cache_requests_total', 'counter', 'Cache lookups per cache and result.', [
+        ('', {'cache': cache, 'result': result}, value)
+        for cache, (hits, misses) in sorted(caches.items()) for result, value in (('hit', hits), ('miss', misses))
+    ])
+    out.metric('ofi_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit.', [
+        ('', {'cache': cache}, hits / (hits + misses)) for cache, (hits, misses) in sorted(caches.items())
+        if hits + misses
+    ])
+    out.metric('ofi_analytics_calls_total', 'counter', 'Calls of the async analytics thread pool per outcome.', [
+        ('', {'outcome': outcome}, value) for outcome, value in sorted(POOL_STATS.items())
+    ])
+
+    statuses, stages = _job_samples()
+    out.metric('ofi_jobs', 'gauge', 'Background jobs per kind and status.', [
+        ('', {'kind': kind, 'status': status}, n) for kind, status, n in statuses
+    ])
+    out.metric('ofi_ingest_stage_rows', 'gauge', 'Rows processed by each stage of the last ingest or rollups job.', [
+        ('', {'stage': stage}, values['rows']) for stage, values in stages.items()
+    ])
+    out.metric('ofi_ingest_stage_seconds', 'gauge', 'Duration of each stage of the last ingest or rollups job.', [
+        ('', {'stage': stage}, float(values['seconds'])) for stage, values in stages.items()
+    ])
+    out.metric('ofi_ingest_rows_per_second', 'gauge', 'Throughput of each stage of the last ingest or rollups job.', [
+        ('', {'stage': stage}, values['rows'] / values['seconds']) for stage, values in stages.items()
+        if values['seconds']
+    ])
+    return out.text()
+
+
+class StageTimer:
+    """Collects the rows and duration of the stages of an ingestion, for the job result."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage, rows, started):
+        """Record a stage started at `started` (time.perf_counter()) that processed `rows`."""
+        self.stages[stage] = {'rows': rows, 'seconds': round(time.perf_counter() - started, 4)}
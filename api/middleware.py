@@ -1,5 +1,20 @@
+import json
+import logging
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
 from django.http import HttpResponse
 
+from . import metrics
+from .sqlite import readonly_reads, refresh_connections
+
+perf_logger = logging.getLogger('api.performance')
+
+
 class CorsMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -18,3 +33,174 @@ class CorsMiddleware:
         response["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
         response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
         return response
+
+
+class ReadOnlyDatabaseMiddleware:
+    """
+    Serves the reads of GET, HEAD and OPTIONS requests from the read-only SQLite
+    connection, after switching to the live database file if a reload replaced it.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        refresh_connections()
+        if request.method not in self.SAFE_METHODS:
+            return self.get_response(request)
+        with readonly_reads():
+            return self.get_response(request)
+
+
+class QueryRecorder:
+    """Database execute wrapper recording the SQL, alias and duration of each query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, context['connection'].alias, time.perf_counter() - started))
+
+    @property
+    def total_seconds(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def repeated(self, threshold):
+        """
+        Statements run at least `threshold` times with different parameters, the
+        signature of an N+1 pattern (one query per row of a previous query).
+
+        Returns:
+            list: {'sql', 'count', 'ms'} of each repeated statement, most frequent first.
+        """
+        stats = defaultdict(lambda: [0, 0.0])
+        for sql, _, duration in self.queries:
+            stats[sql][0] += 1
+            stats[sql][1] += duration
+        return [
+            {'sql': sql[:500], 'count': count, 'ms': round(seconds * 1000, 2)}
+            for sql, (count, seconds) in sorted(stats.items(), key=lambda item: -item[1][0])
+            if count >= threshold
+        ]
+
+    def slowest(self, limit):
+        return [
+            {'sql': sql[:2000], 'alias': alias, 'ms': round(duration * 1000, 2)}
+            for sql, alias, duration in sorted(self.queries, key=lambda query: -query[2])[:limit]
+        ]
+
+
+class PerformanceMiddleware:
+    """
+    Measures each request: SQL queries (count and time, on every database alias),
+    response rendering time (the JSON serialization of DRF responses), response
+    size and, with settings.PERF_TRACEMALLOC, the peak Python allocation.
+
+    The measures are returned in a `Server-Timing` header and logged as one JSON
+    line on the `api.performance` logger. Requests slower than
+    settings.PERF_SLOW_REQUEST_MS (0: off) are logged as warnings with their
+    slowest queries, and so are requests repeating a statement at least
+    settings.PERF_N_PLUS_ONE_THRESHOLD times (N+1 queries).
+
+    Queries run by other threads, such as the analytics pool of the async
+    views, are not counted. tracemalloc measures the whole process, so under
+    concurrent requests the peak includes the allocations of the other threads.
+    """
+    SLOW_QUERIES_LOGGED = 20
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = settings.PERF_SLOW_REQUEST_MS
+        self.n_plus_one_threshold = settings.PERF_N_PLUS_ONE_THRESHOLD
+        self.trace_memory = settings.PERF_TRACEMALLOC
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        recorder = QueryRecorder()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': getattr(request.resolver_match, 'url_name', None),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': len(recorder.queries),
+            'db_ms': round(recorder.total_seconds * 1000, 2),
+            'render_ms': round(getattr(request, '_render_seconds', 0.0) * 1000, 2),
+            'bytes': None if response.streaming else len(response.content),
+        }
+        timings = [
+            f'db;dur={record["db_ms"]};desc="{record["db_queries"]} queries"',
+            f'render;dur={record["render_ms"]}',
+            f'total;dur={record["total_ms"]}',
+        ]
+        if self.trace_memory:
+            record['peak_alloc_kb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+            timings.append(f'mem;desc="peak {record["peak_alloc_kb"]} KiB"')
+        response['Server-Timing'] = ', '.join(timings)
+        # Read by MetricsMiddleware
+        request._db_queries = record['db_queries']
+
+        repeated = recorder.repeated(self.n_plus_one_threshold) if self.n_plus_one_threshold else []
+        slow = self.slow_ms and record['total_ms'] >= self.slow_ms
+        if repeated:
+            record['n_plus_one'] = repeated
+        if slow:
+            record['slowest_queries'] = recorder.slowest(self.SLOW_QUERIES_LOGGED)
+        if slow or repeated:
+            perf_logger.warning(json.dumps(record, default=str))
+        else:
+            perf_logger.info(json.dumps(record, default=str))
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of DRF (and template) responses, which runs after the view."""
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and SQL query count of each request under its
+    URL name for the /metrics endpoint (api.metrics). Place it before
+    PerformanceMiddleware, which counts the queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.request_started()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            match = request.resolver_match
+            metrics.request_finished(
+                match.url_name if match is not None else None,
+                status,
+                time.perf_counter() - started,
+                getattr(request, '_db_queries', 0),
+            )
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DurationSketch',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('scope', models.CharField(choices=[('case', 'Case throughput time'), ('variant', 'Variant throughput time'), ('activity', 'Activity waiting time')], max_length=20)),
+                ('key', models.CharField(blank=True, default='', max_length=255)),
+                ('bucket', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('sketch', models.TextField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'bucket'], name='api_duratio_scope_b7ef89_idx')],
+            },
+        ),
+    ]
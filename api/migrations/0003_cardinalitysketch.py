@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_durationsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardinalitySketch',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(blank=True, default='', max_length=255)),
+                ('bucket', models.DateField()),
+                ('sketch', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'bucket'], name='api_cardina_key_0137b4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+from api.sampling import sample_rank
+
+
+def populate_sample_rank(apps, schema_editor):
+    Activity = apps.get_model('api', 'Activity')
+    for case_id in Activity.objects.values_list('case', flat=True).distinct():
+        Activity.objects.filter(case=case_id).update(sample_rank=sample_rank(case_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_cardinalitysketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='sample_rank',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(populate_sample_rank, migrations.RunPython.noop),
+    ]
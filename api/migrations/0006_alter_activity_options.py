@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 22:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='activity',
+            options={'select_on_save': True},
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
-from .constants import ACTIVITY_CHOICES, PATTERN_CHOICES
+from .constants import (
+    ACTIVITY_CHOICES, PATTERN_CHOICES, SKETCH_SCOPE_CHOICES, JOB_KIND_CHOICES, JOB_STATUS_CHOICES, JOB_QUEUED,
+)
 
 class Activity(models.Model):
     """
@@ -12,6 +14,8 @@ class Activity(models.Model):
         name (str): The name of the activity, chosen from ACTIVITY_CHOICES.
         case_index (int): The index of the case, with a default value of 0.
         tpt (float): The time per task of the activity, with a default value of 0.
+        sample_rank (float): Deterministic rank in [0, 1) of the case, used to select
+            case-consistent samples (see api.sampling).
     """
     id = models.AutoField(primary_key=True)
     case = models.CharField(max_length=10)
@@ -19,6 +23,12 @@ class Activity(models.Model):
     name = models.CharField(max_length=60)
     tpt = models.FloatField(default=0)
     case_index = models.CharField(max_length=50)
+    sample_rank = models.FloatField(default=0, db_index=True)
+
+    class Meta:
+        # Updates through the partitioned SQLite view report no rows (api.partitions),
+        # so save() must not read 0 updated rows as a missing row and INSERT it again
+        select_on_save = True
 
     def __str__(self):
         return f"{self.case.id} - {self.name} at {self.timestamp}"
@@ -44,4 +54,98 @@ class Variant(models.Model):
 
     def __str__(self):
         return self.name
-    
+
+
+class DurationSketch(models.Model):
+    """
+    A model storing a mergeable quantile sketch of durations for one scope,
+    key and monthly time bucket.
+
+    Attributes:
+        id (int): The primary key for the sketch.
+        scope (str): What the durations measure, chosen from SKETCH_SCOPE_CHOICES.
+        key (str): The variant id or activity name the sketch belongs to
+            (empty for the case scope).
+        bucket (date): The first day of the month the durations belong to.
+        count (int): The number of durations summarised by the sketch.
+        sketch (str): The serialized QuantileSketch.
+    """
+    id = models.AutoField(primary_key=True)
+    scope = models.CharField(max_length=20, choices=SKETCH_SCOPE_CHOICES)
+    key = models.CharField(max_length=255, blank=True, default='')
+    bucket = models.DateField()
+    count = models.IntegerField(default=0)
+    sketch = models.TextField()
+
+    class Meta:
+        indexes = [models.Index(fields=['scope', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} {self.bucket:%Y-%m}"
+
+
+class CardinalitySketch(models.Model):
+    """
+    A model storing a HyperLogLog sketch of the distinct cases seen in one
+    monthly time bucket, overall or for a single activity.
+
+    Attributes:
+        id (int): The primary key for the sketch.
+        key (str): The activity name the sketch belongs to (empty for all activities).
+        bucket (date): The first day of the month the activities belong to.
+        sketch (bytes): The serialized HyperLogLog.
+    """
+    id = models.AutoField(primary_key=True)
+    key = models.CharField(max_length=255, blank=True, default='')
+    bucket = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        indexes = [models.Index(fields=['key', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.key or 'all'} {self.bucket:%Y-%m}"
+
+
+class Job(models.Model):
+    """
+    A model representing a background job, queued in the database and run by
+    the `run_jobs` worker command (see api.jobs).
+
+    Attributes:
+        id (int): The primary key for the job.
+        kind (str): What the job does, chosen from JOB_KIND_CHOICES.
+        params (dict): The parameters of the job.
+        status (str): The state of the job, chosen from JOB_STATUS_CHOICES.
+        progress (float): Completion percentage reported by the running job.
+        message (str): Description of the current step.
+        result (dict): The result of a succeeded job.
+        error (str): The error of a failed job.
+        attempts (int): How many times a worker started the job.
+        worker (str): The worker running (or that ran) the job.
+        created_at (datetime): When the job was submitted.
+        started_at (datetime): When a worker started the job.
+        heartbeat_at (datetime): Last progress report of the running job; stale
+            running jobs are requeued.
+        finished_at (datetime): When the job succeeded, failed or was cancelled.
+    """
+    id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=JOB_KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default=JOB_QUEUED)
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=255, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
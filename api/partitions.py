@@ -0,0 +1,472 @@
+"""
+Monthly partitions of the Activity table.
+
+Partitioning is switched on and off with `python manage.py partition_activities
+enable|disable`. Every partition holds the activities of one calendar month (UTC):
+    - PostgreSQL: `api_activity` becomes a declarative partitioned table
+      (PARTITION BY RANGE on timestamp), with one partition `api_activity_YYYY_MM`
+      per month. The planner prunes the partitions outside a date filter.
+    - SQLite: each month is a table `api_activity_YYYY_MM` with its own timestamp
+      index, and `api_activity` becomes a UNION ALL view over them. SQLite pushes
+      the date filter into every branch of the view, so a partition outside the
+      range costs one index seek instead of a scan. INSTEAD OF triggers send the
+      ORM's inserts, updates and deletes to the partition of the row, and the
+      loaders write to the partition tables directly (insert_rows). Ids come from
+      the `api_activity_seq` table, so they stay unique across partitions.
+      Statements rewritten by triggers report no rows to SQLite, so the ORM
+      is adapted: Activity has `Meta.select_on_save`, so save() checks that the
+      row exists instead of trusting the updated row count, and new activities
+      get their id from the sequence before the INSERT (reserve_sqlite_id),
+      since the view cannot return it. QuerySet.update() still returns 0.
+
+The Activity model is unchanged. Dropping or reloading a month drops or empties
+its partition (drop_partition, truncate_partition) instead of deleting rows one
+by one. Loaders call ensure_partitions for the months they are about to write.
+
+On SQLite, migrations that alter Activity cannot run on the view: run
+`partition_activities disable` first and enable it again afterwards.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Activity
+
+TABLE = Activity._meta.db_table
+
+# Empty table with the schema of the partitions (SQLite)
+TEMPLATE_TABLE = f'{TABLE}_template'
+
+# Last id handed out across the partitions (SQLite)
+SEQUENCE_TABLE = f'{TABLE}_seq'
+
+# Index on the timestamp of every partition
+TIMESTAMP_INDEX = f'{TABLE}_timestamp_part_idx'
+
+
+def month_of(value):
+    """The first day of the (UTC) month of a datetime or date."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def parse_month(value):
+    """
+    Parse a month given as YYYY-MM.
+
+    Raises:
+        ValueError: If the value is not a valid month.
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid month {value!r}. Use YYYY-MM.")
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def activity_alias():
+    """The database alias Activity rows are written to (the shadow copy during a reload)."""
+    return router.db_for_write(Activity) or DEFAULT_DB_ALIAS
+
+
+def _bound(connection, month):
+    """SQL literal of the first instant of a month, as the backend stores timestamps."""
+    value = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    if connection.vendor == 'sqlite':
+        return f"'{connection.ops.adapt_datetimefield_value(value)}'"
+    return f"'{value.isoformat()}'"
+
+
+def is_partitioned(using=None):
+    """Whether the Activity table is stored in monthly partitions."""
+    connection = connections[using or activity_alias()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT type FROM sqlite_master WHERE name = %s", [TABLE])
+            row = cursor.fetchone()
+            return row is not None and row[0] == 'view'
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+            row = cursor.fetchone()
+            return row is not None and row[0] == 'p'
+    return False
+
+
+def list_partitions(using=None):
+    """
+    Returns:
+        list: The (month, table name) of the existing partitions, oldest first.
+    """
+    connection = connections[using or activity_alias()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB %s",
+                [f'{TABLE}_[0-9][0-9][0-9][0-9]_[0-9][0-9]'],
+            )
+        else:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%s)",
+                [TABLE],
+            )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = len(TABLE) + 1
+    return sorted((datetime.strptime(name[prefix:], '%Y_%m').date(), name) for name in names)
+
+
+def partition_counts(using=None):
+    """
+    Returns:
+        list: (month, table name, number of activities) of each partition, oldest first.
+    """
+    connection = connections[using or activity_alias()]
+    quote = connection.ops.quote_name
+    counts = []
+    with connection.cursor() as cursor:
+        for month, name in list_partitions(using):
+            cursor.execute(f'SELECT COUNT(*) FROM {quote(name)}')
+            counts.append((month, name, cursor.fetchone()[0]))
+    return counts
+
+
+def _columns():
+    return [field.column for field in Activity._meta.concrete_fields]
+
+
+def _create_sqlite_view(cursor, connection, months):
+    """(Re)create the `api_activity` view and its triggers over the partitions of `months`."""
+    quote = connection.ops.quote_name
+    columns = _columns()
+    column_list = ', '.join(quote(column) for column in columns)
+    cursor.execute(f'DROP VIEW IF EXISTS {quote(TABLE)}')
+    branches = [f'SELECT {column_list} FROM {quote(partition_name(month))}' for month in months]
+    cursor.execute(
+        f'CREATE VIEW {quote(TABLE)} AS '
+        + (' UNION ALL '.join(branches) or f'SELECT {column_list} FROM {quote(TEMPLATE_TABLE)}')
+    )
+
+    def within(row, month):
+        return (f'{row}.{quote("timestamp")} >= {_bound(connection, month)} '
+                f'AND {row}.{quote("timestamp")} < {_bound(connection, next_month(month))}')
+
+    new_values = ', '.join(
+        f'COALESCE(NEW.{quote(column)}, (SELECT id FROM {quote(SEQUENCE_TABLE)}))' if column == 'id'
+        else f'NEW.{quote(column)}'
+        for column in columns
+    )
+    assignments = ', '.join(f'{quote(column)} = NEW.{quote(column)}' for column in columns)
+    for month in months:
+        table = quote(partition_name(month))
+        cursor.execute(
+            f'CREATE TRIGGER {quote(partition_name(month) + "_insert")} INSTEAD OF INSERT ON {quote(TABLE)} '
+            f'WHEN {within("NEW", month)} BEGIN '
+            f'UPDATE {quote(SEQUENCE_TABLE)} SET id = MAX(id, COALESCE(NEW.id, id + 1)); '
+            f'INSERT INTO {table} ({column_list}) VALUES ({new_values}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER {quote(partition_name(month) + "_update")} INSTEAD OF UPDATE ON {quote(TABLE)} '
+            f'WHEN {within("OLD", month)} AND {within("NEW", month)} BEGIN '
+            f'UPDATE {table} SET {assignments} WHERE id = OLD.id; END'
+        )
+        # A new timestamp in another month moves the row to that partition
+        cursor.execute(
+            f'CREATE TRIGGER {quote(partition_name(month) + "_move")} INSTEAD OF UPDATE ON {quote(TABLE)} '
+            f'WHEN {within("OLD", month)} AND NOT ({within("NEW", month)}) BEGIN '
+            f'DELETE FROM {table} WHERE id = OLD.id; '
+            f'INSERT INTO {quote(TABLE)} ({column_list}) VALUES ({", ".join(f"NEW.{quote(c)}" for c in columns)}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER {quote(partition_name(month) + "_delete")} INSTEAD OF DELETE ON {quote(TABLE)} '
+            f'WHEN {within("OLD", month)} BEGIN DELETE FROM {table} WHERE id = OLD.id; END'
+        )
+    covered = ' OR '.join(f'({within("NEW", month)})' for month in months) or '0'
+    cursor.execute(
+        f'CREATE TRIGGER {quote(TABLE + "_no_partition")} INSTEAD OF INSERT ON {quote(TABLE)} '
+        f"WHEN NOT ({covered}) BEGIN SELECT RAISE(ABORT, 'No partition of {TABLE} for this timestamp'); END"
+    )
+
+
+def _create_sqlite_partition(cursor, connection, month):
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [TEMPLATE_TABLE])
+    template_sql = cursor.fetchone()[0]
+    cursor.execute(template_sql.replace(quote(TEMPLATE_TABLE), quote(name), 1))
+    cursor.execute(f'CREATE INDEX {quote(name + "_timestamp")} ON {quote(name)} ({quote("timestamp")})')
+    cursor.execute(f'CREATE INDEX {quote(name + "_sample_rank")} ON {quote(name)} ({quote("sample_rank")})')
+
+
+def _create_postgresql_partition(cursor, connection, month):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} PARTITION OF {quote(TABLE)} '
+        f'FOR VALUES FROM ({_bound(connection, month)}) TO ({_bound(connection, next_month(month))})'
+    )
+
+
+def ensure_partitions(months, using=None):
+    """
+    Create the missing partitions of `months` (no-op when Activity is not partitioned).
+
+    Returns:
+        list: The months whose partition was created.
+    """
+    using = using or activity_alias()
+    if not is_partitioned(using):
+        return []
+    connection = connections[using]
+    existing = {month for month, _ in list_partitions(using)}
+    missing = sorted({month_of(month) for month in months} - existing)
+    if not missing:
+        return []
+    with connection.cursor() as cursor:
+        for month in missing:
+            if connection.vendor == 'sqlite':
+                _create_sqlite_partition(cursor, connection, month)
+            else:
+                _create_postgresql_partition(cursor, connection, month)
+        if connection.vendor == 'sqlite':
+            _create_sqlite_view(cursor, connection, sorted(existing | set(missing)))
+    return missing
+
+
+def drop_partition(month, using=None):
+    """
+    Drop the partition of a month with all its activities.
+
+    Returns:
+        bool: False if the month has no partition.
+    """
+    using = using or activity_alias()
+    connection = connections[using]
+    partitions = dict(list_partitions(using))
+    if month not in partitions:
+        return False
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            _create_sqlite_view(cursor, connection, sorted(set(partitions) - {month}))
+        cursor.execute(f'DROP TABLE {quote(partitions[month])}')
+    return True
+
+
+def truncate_partition(month, using=None):
+    """
+    Remove the activities of a month before reloading it: empties its partition,
+    or deletes the rows of the month when Activity is not partitioned.
+
+    Returns:
+        int: The number of activities removed.
+    """
+    using = using or activity_alias()
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    if not is_partitioned(using):
+        start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+        end = datetime(next_month(month).year, next_month(month).month, 1, tzinfo=dt_timezone.utc)
+        deleted, _ = Activity.objects.using(using).filter(timestamp__gte=start, timestamp__lt=end).delete()
+        return deleted
+    partitions = dict(list_partitions(using))
+    if month not in partitions:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {quote(partitions[month])}')
+        rows = cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            # DELETE without WHERE on a table without triggers drops its pages at once
+            cursor.execute(f'DELETE FROM {quote(partitions[month])}')
+        else:
+            cursor.execute(f'TRUNCATE {quote(partitions[month])}')
+    return rows
+
+
+def insert_rows(records, fields, using=None):
+    """
+    Write activities straight to their SQLite partitions, bypassing the view triggers.
+    The partitions must exist (ensure_partitions).
+
+    Args:
+        records (iterable): Column values in `fields` order, with aware timestamps.
+        fields (tuple): Activity field names, including 'timestamp' and not 'id'.
+
+    Returns:
+        int: The number of activities written.
+    """
+    using = using or activity_alias()
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    columns = [Activity._meta.get_field(field).column for field in fields]
+    position = fields.index('timestamp')
+    by_month = defaultdict(list)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM {quote(SEQUENCE_TABLE)}')
+        next_id = cursor.fetchone()[0]
+        for record in records:
+            next_id += 1
+            values = list(record)
+            values[position] = connection.ops.adapt_datetimefield_value(record[position])
+            by_month[month_of(record[position])].append((next_id, *values))
+        column_list = ', '.join(quote(column) for column in ['id', *columns])
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        for month, rows in by_month.items():
+            cursor.executemany(
+                f'INSERT INTO {quote(partition_name(month))} ({column_list}) VALUES ({placeholders})', rows
+            )
+        cursor.execute(f'UPDATE {quote(SEQUENCE_TABLE)} SET id = %s', [next_id])
+    return sum(len(rows) for rows in by_month.values())
+
+
+@receiver(pre_save, sender=Activity)
+def reserve_sqlite_id(sender, instance, using, raw=False, **kwargs):
+    """Give a new activity its id from the sequence before it is inserted through the SQLite view."""
+    connection = connections[using]
+    if raw or instance.pk is not None or connection.vendor != 'sqlite' or not is_partitioned(using):
+        return
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {quote(SEQUENCE_TABLE)} SET id = id + 1')
+        cursor.execute(f'SELECT id FROM {quote(SEQUENCE_TABLE)}')
+        instance.pk = cursor.fetchone()[0]
+
+
+def _months_in_table(cursor, connection):
+    quote = connection.ops.quote_name
+    cursor.execute(f'SELECT MIN({quote("timestamp")}), MAX({quote("timestamp")}) FROM {quote(TABLE)}')
+    first, last = cursor.fetchone()
+    if first is None:
+        return []
+    if connection.vendor == 'sqlite':
+        first, last = (connection.ops.convert_datetimefield_value(value, None, connection) for value in (first, last))
+    months, month = [], month_of(first)
+    while month <= month_of(last):
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def enable_partitioning(using=None):
+    """
+    Move the activities into monthly partitions, one per month from the first to
+    the last activity. Runs in one transaction.
+
+    Returns:
+        list: The months of the partitions created.
+
+    Raises:
+        ValueError: If Activity is already partitioned or the backend is not supported.
+    """
+    using = using or activity_alias()
+    connection = connections[using]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        raise ValueError(f"Partitioning is not supported on {connection.vendor}.")
+    if is_partitioned(using):
+        raise ValueError("Activity is already partitioned.")
+    quote = connection.ops.quote_name
+    column_list = ', '.join(quote(column) for column in _columns())
+    old = f'{TABLE}_unpartitioned'
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        months = _months_in_table(cursor, connection)
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+            table_sql = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}')
+            cursor.execute(table_sql.replace(quote(TABLE), quote(TEMPLATE_TABLE), 1))
+            cursor.execute(f'CREATE TABLE {quote(SEQUENCE_TABLE)} (id INTEGER NOT NULL)')
+            cursor.execute(f'INSERT INTO {quote(SEQUENCE_TABLE)} SELECT COALESCE(MAX(id), 0) FROM {quote(old)}')
+            for month in months:
+                _create_sqlite_partition(cursor, connection, month)
+                cursor.execute(
+                    f'INSERT INTO {quote(partition_name(month))} ({column_list}) '
+                    f'SELECT {column_list} FROM {quote(old)} WHERE {quote("timestamp")} >= {_bound(connection, month)} '
+                    f'AND {quote("timestamp")} < {_bound(connection, next_month(month))}'
+                )
+            cursor.execute(f'DROP TABLE {quote(old)}')
+            _create_sqlite_view(cursor, connection, months)
+        else:
+            # Index definitions are recreated on the partitioned table under the same names
+            cursor.execute(
+                'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = to_regclass(%s) AND NOT indisprimary',
+                [TABLE],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}')
+            cursor.execute(
+                f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old)} INCLUDING DEFAULTS) '
+                f'PARTITION BY RANGE ({quote("timestamp")})'
+            )
+            for month in months:
+                _create_postgresql_partition(cursor, connection, month)
+            cursor.execute(f'INSERT INTO {quote(TABLE)} ({column_list}) SELECT {column_list} FROM {quote(old)}')
+            cursor.execute(f'DROP TABLE {quote(old)}')
+            # The primary key of a partitioned table must include the partition key
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, {quote("timestamp")})')
+            for index in indexes:
+                cursor.execute(index)
+            cursor.execute(f'CREATE INDEX {quote(TIMESTAMP_INDEX)} ON {quote(TABLE)} ({quote("timestamp")})')
+            # Identity columns are not supported on partitioned tables before PostgreSQL 17
+            sequence = quote(f'{TABLE}_id_seq')
+            cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {quote(TABLE)}.id')
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+            cursor.execute(f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {quote(TABLE)}")
+    return months
+
+
+def disable_partitioning(using=None):
+    """
+    Move the activities back into a single `api_activity` table. Runs in one transaction.
+
+    Raises:
+        ValueError: If Activity is not partitioned.
+    """
+    using = using or activity_alias()
+    connection = connections[using]
+    if not is_partitioned(using):
+        raise ValueError("Activity is not partitioned.")
+    quote = connection.ops.quote_name
+    column_list = ', '.join(quote(column) for column in _columns())
+    partitions = [name for _, name in list_partitions(using)]
+    old = f'{TABLE}_partitioned'
+    if connection.vendor == 'sqlite':
+        # The table and indexes of the current model; the SQLite schema editor cannot run in a transaction
+        with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+            editor.create_model(Activity)
+        create_table = [statement.rstrip(';') for statement in editor.collected_sql]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP VIEW {quote(TABLE)}')
+            for statement in create_table:
+                cursor.execute(statement)
+            for name in partitions:
+                cursor.execute(f'INSERT INTO {quote(TABLE)} ({column_list}) SELECT {column_list} FROM {quote(name)}')
+                cursor.execute(f'DROP TABLE {quote(name)}')
+            cursor.execute(f'DROP TABLE {quote(TEMPLATE_TABLE)}')
+            cursor.execute(f'DROP TABLE {quote(SEQUENCE_TABLE)}')
+        else:
+            cursor.execute(
+                'SELECT pg_get_indexdef(indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary AND c.relname <> %s',
+                [TABLE, TIMESTAMP_INDEX],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+            sequence = quote(f'{TABLE}_id_seq')
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}')
+            cursor.execute(f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old)} INCLUDING DEFAULTS)')
+            # Keep the id sequence when the partitioned table is dropped
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(TABLE)}.id')
+            cursor.execute(f'INSERT INTO {quote(TABLE)} ({column_list}) SELECT {column_list} FROM {quote(old)}')
+            cursor.execute(f'DROP TABLE {quote(old)}')
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id)')
+            for index in indexes:
+                cursor.execute(index)
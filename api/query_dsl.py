@@ -0,0 +1,396 @@
+"""
+A small JSON query language compiled into a single ORM query.
+
+Example query:
+    {
+        "source": "activity",
+        "filters": [
+            {"field": "timestamp", "op": "gte", "value": "2024-01-01"},
+            {"field": "name", "op": "in", "value": ["CREATE", "UPDATE"]}
+        ],
+        "group_by": ["month", "name"],
+        "aggregates": [{"fn": "count", "as": "activities"},
+                       {"fn": "avg", "field": "tpt", "as": "avg_tpt"}],
+        "order_by": ["month", "-activities"],
+        "limit": 100
+    }
+
+Sources:
+    - activity: the raw event log.
+    - variant: the precomputed variants.
+    - case: one summary row per case (activity_count, first_timestamp,
+      last_timestamp, throughput_seconds, total_tpt).
+
+Queries are validated against a whitelist of fields, operators and aggregate
+functions; nothing in the request is evaluated as code. Validation and
+compilation only depend on the shape of the query (everything except the
+filter values and the limit), so compiled plans are cached by shape.
+"""
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast, Extract, TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Activity, Variant
+
+# Row and time limits, overridable from settings
+DEFAULT_LIMIT = 1000
+MAX_ROWS = getattr(settings, "QUERY_DSL_MAX_ROWS", 10000)
+TIMEOUT_SECONDS = getattr(settings, "QUERY_DSL_TIMEOUT_SECONDS", 10)
+
+NUMBER = "number"
+STRING = "str"
+DATE = "date"
+
+OPERATORS = {
+    "eq": "exact",
+    "ne": "exact",
+    "lt": "lt",
+    "lte": "lte",
+    "gt": "gt",
+    "gte": "gte",
+    "in": "in",
+    "contains": "icontains",
+    "between": "range",
+    "isnull": "isnull",
+}
+
+AGGREGATES = {
+    "count": Count,
+    "sum": Sum,
+    "avg": Avg,
+    "min": Min,
+    "max": Max,
+}
+
+CASE_SUMMARY_ANNOTATIONS = {
+    "activity_count": lambda: Count("id"),
+    "first_timestamp": lambda: Min("timestamp"),
+    "last_timestamp": lambda: Max("timestamp"),
+    "total_tpt": lambda: Sum("tpt"),
+}
+
+SOURCES = {
+    "activity": {
+        "model": Activity,
+        "fields": {
+            "id": NUMBER,
+            "case": STRING,
+            "name": STRING,
+            "timestamp": DATE,
+            "tpt": NUMBER,
+            "case_index": STRING,
+        },
+        # Derived fields usable in group_by
+        "derived": {
+            "date": lambda: TruncDate("timestamp"),
+            "month": lambda: TruncMonth("timestamp"),
+            "year": lambda: TruncYear("timestamp"),
+        },
+    },
+    "variant": {
+        "model": Variant,
+        "fields": {
+            "id": NUMBER,
+            "activities": STRING,
+            "cases": STRING,
+            "number_cases": NUMBER,
+            "percentage": NUMBER,
+            "avg_time": NUMBER,
+        },
+        "derived": {},
+    },
+    "case": {
+        "model": Activity,
+        "fields": {
+            "case": STRING,
+            "activity_count": NUMBER,
+            "first_timestamp": DATE,
+            "last_timestamp": DATE,
+            "throughput_seconds": NUMBER,
+            "total_tpt": NUMBER,
+        },
+        "derived": {},
+    },
+}
+
+
+def duration_seconds(end, start):
+    """Expression for the number of seconds between two datetime columns."""
+    duration = ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+    if connection.vendor == "postgresql":
+        return Extract(duration, "epoch")
+    # Other backends store durations as microseconds
+    return Cast(duration, FloatField()) / 1e6
+
+
+class QueryValidationError(ValueError):
+    """Raised when a query does not match the DSL."""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a query runs longer than the time limit."""
+
+
+def query_shape(query):
+    """
+    Return the cache key of a query: its canonical JSON without filter values and limit.
+    """
+    if not isinstance(query, dict):
+        raise QueryValidationError("The query must be a JSON object.")
+    filters = query.get("filters", [])
+    if not isinstance(filters, list) or not all(isinstance(f, dict) for f in filters):
+        raise QueryValidationError("filters must be a list of objects.")
+    shape = {key: value for key, value in query.items() if key not in ("filters", "limit")}
+    shape["filters"] = [
+        {key: value for key, value in f.items() if key != "value"} for f in filters
+    ]
+    return json.dumps(shape, sort_keys=True)
+
+
+class CompiledQuery:
+    """
+    A validated query plan. `build` binds filter values and returns a queryset
+    (plus, for aggregates without group_by, the arguments of `aggregate`).
+    """
+
+    def __init__(self, shape):
+        self.source = shape.get("source")
+        if self.source not in SOURCES:
+            raise QueryValidationError(
+                f"source must be one of {sorted(SOURCES)}, got {self.source!r}."
+            )
+        unknown = set(shape) - {"source", "filters", "group_by", "aggregates", "order_by", "select"}
+        if unknown:
+            raise QueryValidationError(f"Unknown query keys: {sorted(unknown)}.")
+        self.fields = SOURCES[self.source]["fields"]
+        self.derived = SOURCES[self.source]["derived"]
+
+        self.filters = [self._compile_filter(f) for f in shape["filters"]]
+        self.group_by = self._list(shape, "group_by")
+        for field in self.group_by:
+            if field not in self.fields and field not in self.derived:
+                raise QueryValidationError(f"Cannot group by unknown field {field!r}.")
+        if self.group_by and self.source == "case":
+            raise QueryValidationError("group_by is not supported for the case source.")
+
+        self.aggregates = []
+        for a in self._list(shape, "aggregates", dict):
+            self.aggregates.append(self._compile_aggregate(a))
+        if self.group_by and not self.aggregates:
+            raise QueryValidationError("group_by requires at least one aggregate.")
+        self.select = self._list(shape, "select")
+        for field in self.select:
+            if field not in self.fields:
+                raise QueryValidationError(f"Cannot select unknown field {field!r}.")
+        if self.select and self.aggregates:
+            raise QueryValidationError("select cannot be combined with aggregates.")
+
+        output = set(self.group_by) | {alias for alias, _ in self.aggregates}
+        if not self.aggregates:
+            output = set(self.select or self.fields)
+        self.order_by = self._list(shape, "order_by")
+        for field in self.order_by:
+            if field.lstrip("-") not in output:
+                raise QueryValidationError(f"Cannot order by {field!r}: not in the result.")
+        # Aggregates without group_by reduce the whole source to one row
+        self.is_total = bool(self.aggregates) and not self.group_by
+
+    @staticmethod
+    def _list(shape, key, item_type=str):
+        value = shape.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(item, item_type) for item in value):
+            raise QueryValidationError(f"{key} must be a list of {item_type.__name__} items.")
+        return value
+
+    def _compile_filter(self, f):
+        field, op = f.get("field"), f.get("op", "eq")
+        if not isinstance(field, str) or field not in self.fields:
+            raise QueryValidationError(f"Cannot filter on unknown field {field!r}.")
+        if not isinstance(op, str) or op not in OPERATORS:
+            raise QueryValidationError(f"Unknown operator {op!r}.")
+        if op == "contains" and self.fields[field] != STRING:
+            raise QueryValidationError(f"contains only applies to text fields, not {field!r}.")
+        return field, op, self.fields[field]
+
+    def _compile_aggregate(self, a):
+        fn, field = a.get("fn"), a.get("field")
+        if not isinstance(fn, str) or fn not in AGGREGATES:
+            raise QueryValidationError(f"Unknown aggregate function {fn!r}.")
+        if field is None and fn != "count":
+            raise QueryValidationError(f"{fn} requires a field.")
+        if field is not None and (not isinstance(field, str) or field not in self.fields):
+            raise QueryValidationError(f"Cannot aggregate unknown field {field!r}.")
+        if fn in ("sum", "avg") and field is not None and self.fields[field] != NUMBER:
+            raise QueryValidationError(f"{fn} requires a numeric field, not {field!r}.")
+        alias = a.get("as") or (f"{fn}_{field}" if field else fn)
+        if not isinstance(alias, str) or not alias.isidentifier():
+            raise QueryValidationError(f"Invalid aggregate alias {alias!r}.")
+        # The alias becomes an annotation: it cannot shadow a column or another output name
+        model = SOURCES[self.source]["model"]
+        taken = (
+            set(self.fields) | set(self.derived) | set(self.group_by)
+            | {name for f in model._meta.concrete_fields for name in (f.name, f.attname)}
+            | {name for name, _ in self.aggregates}
+        )
+        if alias in taken:
+            raise QueryValidationError(f"Aggregate alias {alias!r} is already used by a field or another aggregate.")
+        return alias, (fn, field)
+
+    def _value(self, field_type, value):
+        if field_type == DATE:
+            try:
+                parsed = parse_datetime(value) or parse_date(value) if isinstance(value, str) else None
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise QueryValidationError(f"Invalid date {value!r}; use ISO 8601.")
+            if not isinstance(parsed, datetime):
+                parsed = datetime(parsed.year, parsed.month, parsed.day)
+            if settings.USE_TZ and timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            return parsed
+        if field_type == NUMBER and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise QueryValidationError(f"Expected a number, got {value!r}.")
+        if field_type == STRING and not isinstance(value, str):
+            raise QueryValidationError(f"Expected a string, got {value!r}.")
+        return value
+
+    def _filter_q(self, field, op, field_type, value):
+        if op == "isnull":
+            if not isinstance(value, bool):
+                raise QueryValidationError("isnull expects true or false.")
+        elif op in ("in", "between"):
+            if not isinstance(value, list) or (op == "between" and len(value) != 2):
+                raise QueryValidationError(f"{op} expects a list of values.")
+            value = [self._value(field_type, v) for v in value]
+        else:
+            value = self._value(field_type, value)
+        q = Q(**{f"{field}__{OPERATORS[op]}": value})
+        return ~q if op == "ne" else q
+
+    def _base(self):
+        if self.source == "activity":
+            return Activity.objects.all()
+        if self.source == "variant":
+            return Variant.objects.all()
+        summary = {name: build() for name, build in CASE_SUMMARY_ANNOTATIONS.items()}
+        queryset = Activity.objects.values("case").order_by().annotate(**summary)
+        return queryset.annotate(
+            throughput_seconds=duration_seconds("last_timestamp", "first_timestamp")
+        )
+
+    def build(self, values):
+        """
+        Bind filter values and build the query.
+
+        Args:
+            values (list): One value per filter, in order.
+
+        Returns:
+            QuerySet | dict: A queryset of result rows, or the arguments of
+            `aggregate` applied to the returned queryset for total aggregates.
+        """
+        queryset = self._base()
+        for (field, op, field_type), value in zip(self.filters, values):
+            queryset = queryset.filter(self._filter_q(field, op, field_type, value))
+        count_target = "case" if self.source == "case" else "pk"
+        aggregates = {
+            alias: AGGREGATES[fn](field or count_target)
+            for alias, (fn, field) in self.aggregates
+        }
+        if self.is_total:
+            return queryset, aggregates
+        if self.group_by:
+            derived = {name: self.derived[name]() for name in self.group_by if name in self.derived}
+            queryset = queryset.annotate(**derived).values(*self.group_by).order_by()
+            queryset = queryset.annotate(**aggregates)
+        else:
+            queryset = queryset.values(*(self.select or self.fields))
+        if self.order_by:
+            queryset = queryset.order_by(*self.order_by)
+        return queryset, None
+
+
+@lru_cache(maxsize=256)
+def compile_shape(shape):
+    """Compile (and cache) the plan of a query shape."""
+    return CompiledQuery(json.loads(shape))
+
+
+class time_limit:
+    """
+    Context manager aborting the queries run inside it after `seconds`.
+
+    Uses a progress handler on SQLite and `statement_timeout` on PostgreSQL.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __enter__(self):
+        connection.ensure_connection()
+        if connection.vendor == "sqlite":
+            deadline = time.monotonic() + self.seconds
+            connection.connection.set_progress_handler(
+                lambda: int(time.monotonic() > deadline), 10000
+            )
+        elif connection.vendor == "postgresql":
+            self.atomic = transaction.atomic()
+            self.atomic.__enter__()
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [int(self.seconds * 1000)])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if connection.vendor == "sqlite":
+            connection.connection.set_progress_handler(None, 0)
+        elif connection.vendor == "postgresql":
+            self.atomic.__exit__(exc_type, exc, tb)
+        message = str(exc).lower()
+        if exc is not None and ("interrupt" in message or "statement timeout" in message):
+            raise QueryTimeoutError(f"The query exceeded the time limit of {self.seconds}s.") from exc
+        return False
+
+
+def execute_query(query):
+    """
+    Validate, compile and run a DSL query.
+
+    Args:
+        query (dict): The decoded JSON query.
+
+    Returns:
+        dict: The result rows, whether they were truncated by the row limit and
+        whether the plan came from the cache.
+
+    Raises:
+        QueryValidationError: If the query is invalid.
+        QueryTimeoutError: If the query exceeds the time limit.
+    """
+    shape = query_shape(query)
+    hits = compile_shape.cache_info().hits
+    plan = compile_shape(shape)
+    cached = compile_shape.cache_info().hits > hits
+
+    limit = query.get("limit", DEFAULT_LIMIT)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise QueryValidationError("limit must be a positive integer.")
+    limit = min(limit, MAX_ROWS)
+
+    queryset, aggregates = plan.build([f.get("value") for f in query.get("filters", [])])
+    with time_limit(TIMEOUT_SECONDS):
+        if aggregates is not None:
+            rows = [queryset.aggregate(**aggregates)]
+        else:
+            # Fetch one extra row to report truncation without a COUNT query
+            rows = list(queryset[: limit + 1])
+    truncated = len(rows) > limit
+    return {"rows": rows[:limit], "truncated": truncated, "plan_cached": cached}
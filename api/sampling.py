@@ -0,0 +1,86 @@
+"""
+Case-level sampling helpers for the approximate query mode.
+
+Every activity stores the `sample_rank` of its case: a deterministic value in
+[0, 1) derived from a hash of the case id. Filtering on `sample_rank < rate`
+therefore keeps whole cases, gives the same sample on every run and makes the
+samples nested (the 1% sample is contained in the 10% sample).
+"""
+import hashlib
+import math
+
+# Sample rates the dashboard offers; any rate in (0, 1] is accepted
+SAMPLE_RATES = (0.01, 0.1)
+
+# z-score used for the reported confidence intervals (95%)
+Z_95 = 1.96
+
+
+def sample_rank(case_id, seed=0):
+    """
+    Return the deterministic sample rank of a case, uniformly distributed in [0, 1).
+
+    Args:
+        case_id: The case id (converted to str before hashing).
+        seed (int): Seed to draw an independent family of samples.
+    """
+    digest = hashlib.blake2b(
+        str(case_id).encode("utf-8"), digest_size=8, key=str(seed).encode("utf-8")
+    ).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def parse_sample(params):
+    """
+    Parse the `sample` query parameter.
+
+    Args:
+        params (QueryDict): The request query parameters.
+
+    Returns:
+        float: The sample rate, or None if the parameter is missing.
+
+    Raises:
+        ValueError: If the rate is not a number in (0, 1].
+    """
+    sample = params.get("sample")
+    if sample is None:
+        return None
+    try:
+        rate = float(sample)
+    except ValueError:
+        raise ValueError("sample must be a number between 0 and 1.")
+    if not 0 < rate <= 1:
+        raise ValueError("sample must be a number between 0 and 1.")
+    return rate
+
+
+def scale_count(count, rate, sum_of_squares=None):
+    """
+    Scale a count measured on a case sample to the full data.
+
+    Cases are kept independently with probability `rate`, so the estimate is
+    `count / rate`. Without `sum_of_squares` the count is assumed to be a count
+    of cases; for counts of activities pass the sum of the squared number of
+    activities per sampled case, since whole cases are sampled.
+
+    Args:
+        count (int): The count measured on the sample.
+        rate (float): The sample rate.
+        sum_of_squares (float): Sum of squared per-case counts (optional).
+
+    Returns:
+        dict: The sample rate, the scaled estimate, its standard error and a
+        95% confidence interval.
+    """
+    if sum_of_squares is None:
+        sum_of_squares = count
+    std_error = math.sqrt(sum_of_squares * (1 - rate)) / rate
+    estimate = count / rate
+    return {
+        "rate": rate,
+        "sampled": count,
+        "estimate": estimate,
+        "std_error": std_error,
+        "ci95": [max(count, estimate - Z_95 * std_error), estimate + Z_95 * std_error],
+    }
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import  Activity, Variant
+from .models import  Activity, Variant, Job
 
 
 
@@ -13,12 +13,12 @@ class ActivitySerializer(serializers.ModelSerializer):
 
     Meta:
         model (Activity): The model to be serialized.
-        fields (list): The fields of the model to be serialized.
+        exclude (list): Internal fields of the model that are not serialized.
     """
 
     class Meta:
         model = Activity
-        fields = '__all__'
+        exclude = ['sample_rank']
 
 class VariantSerializer(serializers.ModelSerializer):
     """
@@ -36,3 +36,14 @@ class VariantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Variant
         fields = '__all__'
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Job model: the state and progress of a background job.
+    The result is left out; it is fetched from the job result endpoint.
+    """
+
+    class Meta:
+        model = Job
+        exclude = ['result']
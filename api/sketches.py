@@ -0,0 +1,219 @@
+"""
+Mergeable summary sketches used to serve distribution statistics without
+scanning raw activities.
+
+QuantileSketch is a DDSketch-style sketch: values are mapped to logarithmic
+buckets so that every quantile it returns is within ``relative_accuracy`` of
+the exact value, and two sketches built with the same accuracy can be merged
+by adding their bucket counts.
+
+HyperLogLog estimates the number of distinct values it has seen with a
+relative standard error of ``1.04 / sqrt(2 ** precision)``; merging two
+sketches is an element-wise max of their registers.
+"""
+import hashlib
+import json
+import math
+
+
+class QuantileSketch:
+    """
+    Relative-error quantile sketch for non-negative durations (in seconds).
+
+    Attributes:
+        relative_accuracy (float): Maximum relative error of returned quantiles.
+        bins (dict): Bucket index -> number of values in the bucket.
+        zero_count (int): Number of values too small to be indexed (<= 0).
+        count (int): Total number of values added.
+        min (float): Smallest value added.
+        max (float): Largest value added.
+        sum (float): Sum of all values added.
+    """
+
+    MIN_INDEXABLE_VALUE = 1e-3
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        """
+        Add a value to the sketch.
+
+        Args:
+            value (float): The value to add. Negative values are clamped to 0.
+            weight (int): How many times the value is added.
+        """
+        value = max(float(value), 0.0)
+        if value <= self.MIN_INDEXABLE_VALUE:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one in place.
+
+        Args:
+            other (QuantileSketch): A sketch built with the same relative accuracy.
+
+        Returns:
+            QuantileSketch: This sketch, to allow chaining.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, bin_count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + bin_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Return the approximate value at quantile ``q`` (0 <= q <= 1).
+
+        Returns None if the sketch is empty.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Clamp to the observed range so p0/p100 are exact
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "bins": {str(index): bin_count for index, bin_count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "sum": self.sum,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.bins = {int(index): bin_count for index, bin_count in data["bins"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.sum = data["sum"]
+        return sketch
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch.
+
+    Attributes:
+        precision (int): Number of bits used to pick a register (4-16).
+        registers (bytearray): One byte per register holding the maximum rank seen.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("registers do not match the precision")
+
+    @staticmethod
+    def hash(value):
+        """Stable 64-bit hash of a value (independent of PYTHONHASHSEED)."""
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, value):
+        """Add a value to the sketch."""
+        hashed = self.hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one in place.
+
+        Args:
+            other (HyperLogLog): A sketch with the same precision.
+
+        Returns:
+            HyperLogLog: This sketch, to allow chaining.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def count(self):
+        """Return the estimated number of distinct values added."""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(precision=data[0], registers=data[1:])
@@ -0,0 +1,271 @@
+"""
+SQLite tuning and reloads that do not block the dashboard.
+
+Every SQLite connection is initialized with settings.SQLITE_PRAGMAS: WAL
+journal, so readers never wait for a writer and a writer never waits for
+readers; `synchronous=NORMAL`, which is safe with WAL; a memory-mapped file
+(`mmap_size`); a larger page cache (`cache_size`); and temporary tables in
+memory.
+
+With SQLiteRouter installed, reads made while serving a GET, HEAD or OPTIONS
+request go through the `readonly` alias. That alias opens the same file with
+`mode=ro`, so a request can never write to the database or hold a write lock.
+ReadOnlyDatabaseMiddleware (api.middleware) marks those requests.
+
+Reloads write to a shadow copy instead of the live file (shadow_database).
+The data models (INGEST_MODELS) are routed to the copy while the other tables,
+such as the job queue, stay on the live file. When the reload succeeds, the
+rows of those other tables are copied over, the copy is checkpointed, and
+`<database>.current` is atomically replaced to point to it. The file of a
+database in WAL mode must not be replaced while it is open, so each reload
+gets a new file name (`db-<timestamp>.sqlite3`). Processes switch to the new
+file when they next check the pointer (refresh_connections), at the start of
+a request or a job. Until then they keep reading the previous file.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+READONLY_ALIAS = 'readonly'
+SHADOW_ALIAS = 'shadow'
+
+# Models written by reloads (create_data, ingest and rollups jobs)
+INGEST_MODELS = ('api.Activity', 'api.Variant', 'api.DurationSketch', 'api.CardinalitySketch')
+
+# Database files kept on disk, including the live one; older reloads are removed
+KEEP_FILES = 2
+
+_readonly_request = ContextVar('sqlite_readonly_request', default=False)
+_ingest_alias = ContextVar('sqlite_ingest_alias', default=None)
+
+_lock = threading.Lock()
+_pointer_mtime = None
+
+
+def base_database():
+    """The configured SQLite file (settings.SQLITE_DATABASE), or None when SQLite is not used."""
+    path = getattr(settings, 'SQLITE_DATABASE', None)
+    if path is None or not settings.DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        return None
+    return Path(path)
+
+
+def pointer_file(base):
+    return base.with_name(f'{base.name}.current')
+
+
+def live_database(base):
+    """The file `<base>.current` points to, or `base` itself before the first reload."""
+    try:
+        with open(pointer_file(base), encoding='utf-8') as f:
+            return base.with_name(json.load(f)['database'])
+    except FileNotFoundError:
+        return base
+
+
+def readonly_name(path):
+    return f'{Path(path).resolve().as_uri()}?mode=ro'
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    # The file the connection opened, compared by refresh_connections after a reload
+    connection.sqlite_name = str(connection.settings_dict['NAME'])
+    readonly = connection.alias == READONLY_ALIAS
+    # On the sqlite3 connection itself, not counted as queries of the request
+    raw_connection = connection.connection
+    for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        if readonly and pragma == 'journal_mode':
+            # Stored in the file by the writers; a read-only connection cannot set it
+            continue
+        raw_connection.execute(f'PRAGMA {pragma} = {value}')
+    if readonly:
+        raw_connection.execute('PRAGMA query_only = ON')
+
+
+def use_live_database():
+    """
+    Point the `default` and `readonly` aliases to the live database file.
+
+    Returns:
+        bool: True if the live file changed since the last call.
+    """
+    global _pointer_mtime
+    base = base_database()
+    if base is None:
+        return False
+    try:
+        mtime = os.stat(pointer_file(base)).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime == _pointer_mtime:
+        return False
+    with _lock:
+        live = live_database(base)
+        # The settings dicts are shared by the connections of every thread
+        connections.settings['default']['NAME'] = live
+        if READONLY_ALIAS in connections.settings:
+            connections.settings[READONLY_ALIAS]['NAME'] = readonly_name(live)
+        _pointer_mtime = mtime
+    return True
+
+
+def refresh_connections():
+    """Close this thread's connections that still read a database file replaced by a reload."""
+    if base_database() is None:
+        return
+    use_live_database()
+    for alias in ('default', READONLY_ALIAS):
+        if alias not in connections.settings:
+            continue
+        connection = connections[alias]
+        stale = getattr(connection, 'sqlite_name', None) != str(connection.settings_dict['NAME'])
+        if stale and connection.connection is not None and not connection.in_atomic_block:
+            connection.close()
+
+
+@contextmanager
+def readonly_reads():
+    """Send the reads made in the block to the read-only connection."""
+    token = _readonly_request.set(True)
+    try:
+        yield
+    finally:
+        _readonly_request.reset(token)
+
+
+class SQLiteRouter:
+    """
+    Routes request reads to the `readonly` alias and, inside shadow_database(),
+    the INGEST_MODELS to the shadow copy.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _ingest_alias.get()
+        if alias and model._meta.label in INGEST_MODELS:
+            return alias
+        if _readonly_request.get():
+            return READONLY_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        alias = _ingest_alias.get()
+        if alias and model._meta.label in INGEST_MODELS:
+            return alias
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in (READONLY_ALIAS, SHADOW_ALIAS):
+            return False
+        return None
+
+
+def _remove_database(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        try:
+            os.remove(f'{path}{suffix}')
+        except FileNotFoundError:
+            pass
+
+
+def _copy_live_tables(shadow, live):
+    """Copy the tables that reloads do not write (jobs, auth, sessions) from the live file."""
+    ingest = {apps.get_model(label)._meta.db_table for label in INGEST_MODELS}
+    tables = [
+        model._meta.db_table for model in apps.get_models(include_auto_created=True)
+        if model._meta.db_table not in ingest and model._meta.managed and not model._meta.proxy
+    ]
+    quote = shadow.ops.quote_name
+    with shadow.cursor() as cursor:
+        cursor.execute('ATTACH DATABASE %s AS live', [readonly_name(live)])
+        try:
+            cursor.execute("SELECT name FROM live.sqlite_master WHERE type = 'table'")
+            existing = {row[0] for row in cursor.fetchall()}
+            tables = [table for table in dict.fromkeys(tables) if table in existing]
+            # The rows reference each other while the tables are replaced one by one
+            with shadow.constraint_checks_disabled(), transaction.atomic(using=SHADOW_ALIAS):
+                for table in tables:
+                    cursor.execute(f'DELETE FROM main.{quote(table)}')
+                    cursor.execute(f'INSERT INTO main.{quote(table)} SELECT * FROM live.{quote(table)}')
+                shadow.check_constraints(table_names=tables)
+        finally:
+            cursor.execute('DETACH DATABASE live')
+
+
+def _publish(base, shadow_path, previous):
+    pointer = pointer_file(base)
+    tmp = pointer.with_name(f'{pointer.name}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'database': shadow_path.name, 'created': time.time()}, f)
+    os.replace(tmp, pointer)
+    refresh_connections()
+
+    files = sorted(base.parent.glob(f'{base.stem}-*{base.suffix}'))
+    for old in files[:-KEEP_FILES]:
+        if old not in (shadow_path, previous):
+            # Processes that still read an old file keep their open handle until they refresh
+            _remove_database(old)
+
+
+@contextmanager
+def shadow_database():
+    """
+    Run a reload against a copy of the live SQLite database and swap it in on success.
+
+    Inside the block the INGEST_MODELS are read and written on the copy (also
+    through `transaction.atomic(using=router.db_for_write(model))`), while
+    requests keep reading the live file. If the block raises, the copy is
+    deleted and the live database is unchanged. Without SQLite (or without a
+    `shadow` alias) the block runs on the database directly.
+
+    Yields:
+        pathlib.Path: The shadow file, or None when the reload writes in place.
+    """
+    base = base_database()
+    if base is None or SHADOW_ALIAS not in connections.settings or _ingest_alias.get():
+        yield None
+        return
+
+    refresh_connections()
+    live = live_database(base)
+    shadow_path = base.with_name(f"{base.stem}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}{base.suffix}")
+    source = sqlite3.connect(readonly_name(live), uri=True)
+    target = sqlite3.connect(shadow_path)
+    try:
+        # Consistent snapshot, including the pages still in the live WAL
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+    shadow = connections[SHADOW_ALIAS]
+    shadow.close()
+    shadow.settings_dict['NAME'] = shadow_path
+    token = _ingest_alias.set(SHADOW_ALIAS)
+    try:
+        yield shadow_path
+        _copy_live_tables(shadow, live)
+        with shadow.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    except BaseException:
+        shadow.close()
+        _remove_database(shadow_path)
+        raise
+    finally:
+        _ingest_alias.reset(token)
+    shadow.close()
+    _publish(base, shadow_path, live)
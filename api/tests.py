@@ -0,0 +1,78 @@
+import csv
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.management.columnar import TIMESTAMP_FORMAT
+from api.models import Activity
+
+
+class CreateDataCaseIndexTests(TestCase):
+    """create_data on a database that already holds activities (--month reload, appended file)."""
+
+    # (case_id, timestamp): case 1 spans January and February
+    ACTIVITIES = [
+        ('1', datetime(2024, 1, 10, 9)),
+        ('1', datetime(2024, 1, 20, 9)),
+        ('1', datetime(2024, 2, 5, 9)),
+        ('2', datetime(2024, 1, 15, 9)),
+        ('2', datetime(2024, 1, 16, 9)),
+        ('3', datetime(2024, 2, 1, 9)),
+        ('3', datetime(2024, 2, 3, 9)),
+    ]
+
+    def write_csv(self, activities):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['name', 'timestamp', 'case_id'])
+            for case_id, timestamp in activities:
+                writer.writerow([f'Step {timestamp.day}', timestamp.strftime(TIMESTAMP_FORMAT).upper(), case_id])
+        return path
+
+    def renumber(self, case_indexes):
+        """Give the stored cases other indexes, as a load in another process may have."""
+        for case_id, index in case_indexes.items():
+            Activity.objects.filter(case=case_id).update(case_index=str(index))
+
+    def case_indexes(self):
+        pairs = list(Activity.objects.values_list('case', 'case_index').distinct())
+        self.assertEqual(len(pairs), len(dict(pairs)), 'a case has several indexes')
+        return dict(pairs)
+
+    def expected_tpt(self, activities):
+        tpt = {}
+        for (case_id, timestamp), (next_case_id, next_timestamp) in zip(activities, activities[1:] + [(None, None)]):
+            tpt[case_id, timestamp] = (next_timestamp - timestamp).total_seconds() if next_case_id == case_id else 0.0
+        return tpt
+
+    def stored_tpt(self):
+        return {
+            (case_id, timezone.make_naive(timestamp, dt_timezone.utc)): tpt
+            for case_id, timestamp, tpt in Activity.objects.values_list('case', 'timestamp', 'tpt')
+        }
+
+    def test_reload_month_from_month_only_file(self):
+        call_command('create_data', file=self.write_csv(self.ACTIVITIES), stdout=StringIO())
+        self.renumber({'1': 7, '2': 3, '3': 5})
+
+        january = [activity for activity in self.ACTIVITIES if activity[1].month == 1]
+        call_command('create_data', file=self.write_csv(january), month='2024-01', stdout=StringIO())
+
+        self.assertEqual(self.case_indexes(), {'1': '7', '2': '3', '3': '5'})
+        self.assertEqual(self.stored_tpt(), self.expected_tpt(self.ACTIVITIES))
+
+    def test_append_file_indexes_new_cases_after_stored_ones(self):
+        call_command('create_data', file=self.write_csv(self.ACTIVITIES[:5]), stdout=StringIO())
+        self.renumber({'1': 2, '2': 1})
+
+        call_command('create_data', file=self.write_csv(self.ACTIVITIES[5:]), stdout=StringIO())
+
+        self.assertEqual(self.case_indexes(), {'1': '2', '2': '1', '3': '3'})
+        self.assertEqual(self.stored_tpt(), self.expected_tpt(self.ACTIVITIES))
@@ -11,6 +11,10 @@ from .views.views import (
    ORMQueryExecutor,
    CaseExplorer,
    CaseActivityTimeline,
+   ActivityExport,
+   ThroughputPercentiles,
+   CaseCount,
+   BatchQuery,
    SystemOverviewKPIs,
    ActivitySystemDistribution,
    ActivityCountSystem,
@@ -24,6 +28,19 @@ from .views.views import (
    SystemViewDistribution,
    AutomationRatePerYear,
    BottlenecksTAT,
+   EventStoreVariants,
+   EventStoreDFG,
+   EventStoreBottlenecks,
+   EventStoreKPIs,
+   JobList,
+   JobDetail,
+   JobResult,
+   JobCancel,
+)
+from .views.async_views import (
+   async_activity_list,
+   async_case_explorer,
+   async_variant_list,
 )
 
 """
@@ -72,6 +89,39 @@ urlpatterns = [
 
    path('case/', CaseActivityTimeline.as_view(), name='case-list'),
 
+   path('activity/export/', ActivityExport.as_view(), name='activity-export'),
+
+   path('throughput-percentiles/', ThroughputPercentiles.as_view(), name='throughput-percentiles'),
+
+   path('case-count/', CaseCount.as_view(), name='case-count'),
+
+   path('batch/', BatchQuery.as_view(), name='batch'),
+
+   # Event store endpoints (memory-mapped arrays, see api.eventstore)
+   path('event-store/variants/', EventStoreVariants.as_view(), name='event-store-variants'),
+
+   path('event-store/dfg/', EventStoreDFG.as_view(), name='event-store-dfg'),
+
+   path('event-store/bottlenecks/', EventStoreBottlenecks.as_view(), name='event-store-bottlenecks'),
+
+   path('event-store/kpis/', EventStoreKPIs.as_view(), name='event-store-kpis'),
+
+   # Background jobs (run by `manage.py run_jobs`)
+   path('jobs/', JobList.as_view(), name='job-list'),
+
+   path('jobs/<int:job_id>/', JobDetail.as_view(), name='job-detail'),
+
+   path('jobs/<int:job_id>/result/', JobResult.as_view(), name='job-result'),
+
+   path('jobs/<int:job_id>/cancel/', JobCancel.as_view(), name='job-cancel'),
+
+   # Async versions of the heavy endpoints, run on a bounded thread pool (serve over ASGI)
+   path('async/activity/', async_activity_list, name='async-activity-list'),
+
+   path('async/variant/', async_variant_list, name='async-variant-list'),
+
+   path('async/case-explorer/', async_case_explorer, name='async-case-explorer'),
+
    # System Overview Endpoints
    path('system-overview/kpis', SystemOverviewKPIs.as_view(), name='system-overview-kpis'),
 
@@ -0,0 +1,158 @@
+"""
+Async versions of the long-running analytics endpoints.
+
+A synchronous CaseExplorer call holds a server thread until it finishes, even
+after the client gave up, and nothing bounds how many run at once. The views
+here are coroutines, served over ASGI (ofi_dashboard_backend.asgi), that hand the
+existing synchronous view to a bounded thread pool and await it, so heavy calls
+share a fixed number of threads while the event loop keeps serving the cheap
+endpoints.
+
+Each call runs under a time limit (504 when exceeded) and is cancelled when the
+client disconnects. Threads cannot be killed, so cancellation is cooperative: a
+call still waiting in the pool queue is skipped, and a running SQLite query is
+aborted through a progress handler (PostgreSQL queries are cancelled on the server).
+When the pool queue is full, new calls get 503 instead of waiting.
+
+Under WSGI the views still work (each request runs its own event loop), with the
+time limit but without disconnect detection.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from ..models import Activity
+from ..sqlite import refresh_connections
+from .views import ActivityList, CaseExplorer, VariantList
+
+# Calls per outcome since the process started: completed, timeout, cancelled, rejected, skipped
+POOL_STATS = Counter()
+
+_pool = ThreadPoolExecutor(max_workers=settings.ANALYTICS_THREADS, thread_name_prefix='analytics')
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class AnalyticsCall:
+    """State shared between an awaiting view and the pool thread running it."""
+
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = threading.Event()
+        self.raw_connection = None
+
+    def should_stop(self):
+        return self.cancelled.is_set() or time.monotonic() > self.deadline
+
+    def cancel(self):
+        self.cancelled.set()
+        raw_connection = self.raw_connection
+        if raw_connection is not None and hasattr(raw_connection, 'cancel'):
+            # psycopg: ask the server to cancel the running statement
+            try:
+                raw_connection.cancel()
+            except Exception:
+                pass
+
+
+def _release(future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _run(call, view, request):
+    """Run a synchronous view in a pool thread, aborting its queries once the call stops."""
+    if call.should_stop():
+        POOL_STATS['skipped'] += 1
+        return None
+    close_old_connections()
+    refresh_connections()
+    # The read-only SQLite connection when the request context routes reads to it
+    connection = connections[router.db_for_read(Activity) or DEFAULT_DB_ALIAS]
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        connection.connection.set_progress_handler(lambda: int(call.should_stop()), 10000)
+    else:
+        call.raw_connection = connection.connection
+    try:
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        call.raw_connection = None
+        if connection.vendor == 'sqlite' and connection.connection is not None:
+            connection.connection.set_progress_handler(None, 0)
+        close_old_connections()
+
+
+async def run_in_pool(view, request, timeout=None):
+    """
+    Await a synchronous view run on the analytics thread pool.
+
+    Args:
+        view (callable): The synchronous view (e.g. `CaseExplorer.as_view()`).
+        request (HttpRequest): The request, passed to the view unchanged.
+        timeout (float): Seconds before the call is abandoned (default settings.ANALYTICS_TIMEOUT).
+
+    Returns:
+        HttpResponse: The view's response, 503 if the pool queue is full or 504 on timeout.
+    """
+    global _pending
+    timeout = timeout or settings.ANALYTICS_TIMEOUT
+    with _pending_lock:
+        if _pending >= settings.ANALYTICS_THREADS + settings.ANALYTICS_MAX_QUEUED:
+            POOL_STATS['rejected'] += 1
+            return JsonResponse({'error': 'Too many analytics requests in progress, retry later.'}, status=503)
+        _pending += 1
+
+    call = AnalyticsCall(timeout)
+    # Run with the request's context (the database routing of api.sqlite)
+    future = _pool.submit(contextvars.copy_context().run, _run, call, view, request)
+    # Also called when a queued call is cancelled before it starts
+    future.add_done_callback(_release)
+    try:
+        response = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        call.cancel()
+        POOL_STATS['timeout'] += 1
+        return JsonResponse({'error': f'The request exceeded the time limit of {timeout:g}s.'}, status=504)
+    except asyncio.CancelledError:
+        # The client disconnected
+        call.cancel()
+        POOL_STATS['cancelled'] += 1
+        raise
+    POOL_STATS['completed'] += 1
+    return response
+
+
+_case_explorer = CaseExplorer.as_view()
+_variant_list = VariantList.as_view()
+_activity_list = ActivityList.as_view()
+
+
+@require_GET
+async def async_case_explorer(request):
+    """CaseExplorer (same parameters and response) run on the analytics thread pool."""
+    return await run_in_pool(_case_explorer, request)
+
+
+@require_GET
+async def async_variant_list(request):
+    """VariantList (same parameters and response) run on the analytics thread pool."""
+    return await run_in_pool(_variant_list, request)
+
+
+@require_GET
+async def async_activity_list(request):
+    """ActivityList (same parameters and response) run on the analytics thread pool."""
+    return await run_in_pool(_activity_list, request)
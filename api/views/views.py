@@ -1,20 +1,218 @@
 
-from ..models import Activity, Variant
+from ..models import Activity, Variant, DurationSketch, CardinalitySketch, Job
+from ..jobs import submit_job, cancel_job
+from ..sketches import QuantileSketch, HyperLogLog
+from ..constants import SKETCH_SCOPE_CHOICES, SKETCH_SCOPE_CASE, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+from ..sampling import parse_sample, scale_count
+from ..query_dsl import execute_query, QueryValidationError, QueryTimeoutError
+from .. import eventstore, metrics
 from ..serializers import (
     ActivitySerializer,
     VariantSerializer,
+    JobSerializer,
 )
 from rest_framework.pagination import PageNumberPagination
+from collections import defaultdict
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from django.db.models import Count
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
+import csv
 import json
+import time
 from pathlib import Path
+from django.http import HttpRequest, HttpResponse, QueryDict, StreamingHttpResponse
+from django.urls import NoReverseMatch, resolve, reverse
 
 
 PAGINATION_SIZE = PageNumberPagination.page_size
 
+# Rows fetched per round trip by the streaming export
+EXPORT_CHUNK_SIZE = 2000
+
+
+def parse_approx(request):
+    """
+    Parse the opt-in `approx` query parameter.
+
+    Returns:
+        bool: True for "true", False for "false" or a missing parameter.
+
+    Raises:
+        ValueError: If the parameter has any other value.
+    """
+    approx = request.query_params.get("approx", "false").lower()
+    if approx not in ("true", "false"):
+        raise ValueError("approx must be 'true' or 'false'.")
+    return approx == "true"
+
+
+def estimate_distinct_cases(names=None, start_date=None, end_date=None):
+    """
+    Estimate the number of distinct cases by merging the monthly HyperLogLog sketches.
+
+    Args:
+        names (list[str]): Activity names to restrict the count to (optional).
+        start_date (date): Start of the range, rounded down to its month (optional).
+        end_date (date): End of the range, rounded down to its month (optional).
+
+    Returns:
+        HyperLogLog: The merged sketch (empty if no bucket matches).
+    """
+    sketches = CardinalitySketch.objects.filter(key__in=names) if names else CardinalitySketch.objects.filter(key='')
+    if start_date:
+        sketches = sketches.filter(bucket__gte=start_date.replace(day=1))
+    if end_date:
+        sketches = sketches.filter(bucket__lte=end_date)
+    merged = HyperLogLog()
+    for sketch in sketches.values_list('sketch', flat=True):
+        merged.merge(HyperLogLog.from_bytes(sketch))
+    return merged
+
+def filter_activities(activities, params):
+    """
+    Apply the shared dashboard filters to a queryset of activities.
+
+    Args:
+        activities (QuerySet): The activities to filter.
+        params (QueryDict): The query parameters:
+            - case (list[str]): List of case IDs to filter activities.
+            - name (list[str]): List of names to filter activities.
+            - case_index (str): Case index to filter activities.
+            - var (list[str]): List of variant IDs to filter activities.
+            - start_date (str): Start date (YYYY-MM-DD) to filter activities.
+            - end_date (str): End date (YYYY-MM-DD) to filter activities.
+            - sample (float): Sample rate in (0, 1] to keep only a case-consistent sample.
+
+    Returns:
+        tuple: The filtered queryset and the sample rate (None if not sampled).
+
+    Raises:
+        ValueError: If the date format or the sample rate is invalid.
+    """
+    case_ids = params.getlist("case")
+    names = params.getlist("name")
+    case_index = params.get("case_index")
+    variant_ids = params.getlist("var")
+    start_date = params.get("start_date")
+    end_date = params.get("end_date")
+    sample = parse_sample(params)
+
+    # Validate date format
+    try:
+        if start_date:
+            start_date = datetime.strptime(start_date, "%Y-%m-%d")
+        if end_date:
+            end_date = datetime.strptime(end_date, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    if sample:
+        activities = activities.filter(sample_rank__lt=sample)
+    if case_index:
+        activities = activities.filter(case_index=case_index)
+    if case_ids:
+        activities = activities.filter(case__in=case_ids)
+    if names:
+        activities = activities.filter(name__in=names)
+    # Note: The type, branch, ramo, brocker, state, client and creator filters are not
+    # applied because 'case' is a CharField, not a foreign key. If you need these
+    # filters, you'll need to add these fields to the Activity model
+    if variant_ids:
+        variants = Variant.objects.filter(id__in=variant_ids)
+
+        if variants:
+            case_ids = set()
+            for variant in variants:
+                case_ids.update(
+                    {
+                        case_id.strip().replace("'", "")
+                        for case_id in variant.cases[1:-1].split(",")
+                    }
+                )
+
+            activities = activities.filter(case__in=case_ids)
+    if start_date:
+        activities = activities.filter(timestamp__gte=start_date)
+    if end_date:
+        activities = activities.filter(timestamp__lte=end_date)
+    return activities, sample
+
+
+def case_summaries(events):
+    """
+    Summarise cases in a single pass over their activities.
+
+    Args:
+        events (iterable): (case, name, timestamp) tuples ordered by case and timestamp.
+
+    Yields:
+        dict: For each case, its id, number of activities, throughput time and
+        the name and timestamp of its first and last activities.
+    """
+    current = None
+    for case_id, name, timestamp in events:
+        if current is None or case_id != current['case']:
+            if current is not None:
+                yield current
+            current = {
+                'case': case_id,
+                'activity_count': 0,
+                'throughput_time_seconds': 0.0,
+                'first_activity': {'name': name, 'timestamp': timestamp},
+                'last_activity': None,
+            }
+        current['activity_count'] += 1
+        current['last_activity'] = {'name': name, 'timestamp': timestamp}
+        current['throughput_time_seconds'] = (
+            timestamp - current['first_activity']['timestamp']
+        ).total_seconds()
+    if current is not None:
+        yield current
+
+
+def sampled_variants(rate, activities_param=()):
+    """
+    Compute the variants of the cases in a case-consistent sample.
+
+    Args:
+        rate (float): The sample rate.
+        activities_param (list): Keep only variants containing each of these names (case-insensitive).
+
+    Returns:
+        list: For each variant, ordered by percentage: its activities, the number
+        of cases scaled to the full data, its share of the sampled cases, the
+        mean throughput time of its sampled cases and the scaled estimate.
+    """
+    events = (
+        Activity.objects.filter(sample_rank__lt=rate)
+        .order_by('case', 'timestamp').values_list('case', 'name', 'timestamp')
+    )
+    durations = defaultdict(list)
+    for _, rows in groupby(events.iterator(chunk_size=10000), key=itemgetter(0)):
+        rows = list(rows)
+        durations[tuple(name for _, name, _ in rows)].append((rows[-1][2] - rows[0][2]).total_seconds())
+    cases = sum(len(times) for times in durations.values())
+    results = []
+    for key, times in durations.items():
+        activities = str(key)
+        if any(param.lower() not in activities.lower() for param in activities_param):
+            continue
+        estimate = scale_count(len(times), rate)
+        results.append({
+            'activities': activities,
+            'number_cases': round(estimate['estimate']),
+            'percentage': len(times) / cases * 100,
+            'avg_time': sum(times) / len(times),
+            'sample': estimate,
+        })
+    results.sort(key=lambda variant: -variant['percentage'])
+    return results
+
+
 # Custom view for listing Activity objects with optional filtering and pagination
 class ActivityList(APIView):
     """
@@ -40,6 +238,8 @@ class ActivityList(APIView):
                 - var (list[str]): List of variant IDs to filter activities.
                 - start_date (str): Start date (YYYY-MM-DD) to filter activities.
                 - end_date (str): End date (YYYY-MM-DD) to filter activities.
+                - sample (float): Sample rate in (0, 1] to list only a case-consistent
+                  sample; the response then includes the scaled total count.
                 Response: A paginated response containing the filtered list of activities
                 or an error message in case of failure.
             Raises:
@@ -61,73 +261,13 @@ class ActivityList(APIView):
             Response: The paginated list of activities.
         """
         try:
-            case_ids = request.query_params.getlist("case")
-            names = request.query_params.getlist("name")
-            case_index = request.query_params.get("case_index")
             page_size = request.query_params.get("page_size", PAGINATION_SIZE)
-            type = request.query_params.get("type")
-            branch = request.query_params.get("branch")
-            ramo = request.query_params.get("ramo")
-            brocker = request.query_params.get("brocker")
-            state = request.query_params.get("state")
-            client = request.query_params.get("client")
-            creator = request.query_params.get("creator")
-            variant_ids = request.query_params.getlist("var")
-            start_date = request.query_params.get("start_date")
-            end_date = request.query_params.get("end_date")
-
-            # Validate date format
             try:
-                if start_date:
-                    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-                if end_date:
-                    end_date = datetime.strptime(end_date, "%Y-%m-%d")
-            except ValueError:
-                return Response(
-                    {"error": "Invalid date format. Use YYYY-MM-DD."}, status=400
+                activities, sample = filter_activities(
+                    Activity.objects.all(), request.query_params
                 )
-
-            activities = Activity.objects.all()
-            if case_index:
-                activities = activities.filter(case_index=case_index)
-            if case_ids:
-                activities = activities.filter(case__in=case_ids)
-            if names:
-                activities = activities.filter(name__in=names)
-            # Note: The following filters are commented out because 'case' is a CharField, not a foreign key
-            # If you need these filters, you'll need to add these fields to the Activity model
-            # if type:
-            #     activities = activities.filter(case__type=type)
-            # if branch:
-            #     activities = activities.filter(case__branch=branch)
-            # if ramo:
-            #     activities = activities.filter(case__ramo=ramo)
-            # if brocker:
-            #     activities = activities.filter(case__brocker=brocker)
-            # if state:
-            #     activities = activities.filter(case__state=state)
-            # if client:
-            #     activities = activities.filter(case__client=client)
-            # if creator:
-            #     activities = activities.filter(case__creator=creator)
-            if variant_ids:
-                variants = Variant.objects.filter(id__in=variant_ids)
-
-                if variants:
-                    case_ids = set()
-                    for variant in variants:
-                        case_ids.update(
-                            {
-                                case_id.strip().replace("'", "")
-                                for case_id in variant.cases[1:-1].split(",")
-                            }
-                        )
-
-                    activities = activities.filter(case__in=case_ids)
-            if start_date:
-                activities = activities.filter(timestamp__gte=start_date)
-            if end_date:
-                activities = activities.filter(timestamp__lte=end_date)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
 
             activities = activities.order_by("timestamp")
 
@@ -135,7 +275,14 @@ class ActivityList(APIView):
             paginator.page_size = page_size
             paginated_activities = paginator.paginate_queryset(activities, request)
             serializer = ActivitySerializer(paginated_activities, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            response = paginator.get_paginated_response(serializer.data)
+            if sample:
+                per_case = activities.order_by().values("case").annotate(n=Count("id"))
+                sum_of_squares = sum(row["n"] ** 2 for row in per_case)
+                response.data["sample"] = scale_count(
+                    paginator.page.paginator.count, sample, sum_of_squares
+                )
+            return response
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
@@ -150,6 +297,9 @@ class DistinctActivityData(APIView):
         """
         Handle GET request to list all distinct activity names and case IDs.
 
+        With `approx=true` the case IDs are not listed; the case attribute carries a
+        `count` estimated from the HyperLogLog sketches instead of a DISTINCT scan.
+
         Args:
             request: The HTTP request object.
             format: The format of the response.
@@ -157,17 +307,30 @@ class DistinctActivityData(APIView):
         Returns:
             Response: The list of distinct activity names and case IDs.
         """
+        try:
+            approx = parse_approx(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
         try:
             distinct_names = list(
                 Activity.objects.values_list("name", flat=True).distinct()
             )
-            distinct_cases = list(
-                Activity.objects.values_list("case", flat=True).distinct()
-            )
-            
+            if approx:
+                case_attribute = {
+                    "name": "case",
+                    "type": "number",
+                    "distincts": [],
+                    "count": estimate_distinct_cases().count(),
+                    "approx": True,
+                }
+            else:
+                distinct_cases = list(
+                    Activity.objects.values_list("case", flat=True).distinct()
+                )
+                case_attribute = {"name": "case", "type": "number", "distincts": distinct_cases}
 
             attributes = [
-                {"name": "case", "type": "number", "distincts": distinct_cases},
+                case_attribute,
                 {"name": "timestamp", "type": "date", "distincts": []},
                 {"name": "name", "type": "str", "distincts": distinct_names},
                
@@ -195,6 +358,8 @@ class VariantList(APIView):
     Query Parameters:
         - activities: A list of activity names to filter the variants (optional).
         - page_size: The number of items per page for pagination (optional, default is 100,000).
+        - sample: Sample rate in (0, 1] to compute the variants of a case-consistent sample
+          instead of reading the stored ones; case counts are scaled, with their error bounds.
         - A paginated response containing the serialized list of variants, ordered by percentage in descending order.
 
     API view to retrieve a list of all distinct activity names and case IDs.
@@ -215,6 +380,16 @@ class VariantList(APIView):
         page_size = request.query_params.get(
             "page_size", PAGINATION_SIZE
         )  # Default page size is 10 if not provided
+        try:
+            sample = parse_sample(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        paginator = PageNumberPagination()
+        paginator.page_size = page_size
+        if sample:
+            results = sampled_variants(sample, activities_param)
+            return paginator.get_paginated_response(paginator.paginate_queryset(results, request))
+
         variants = Variant.objects.all()
         if activities_param:
             for param in activities_param:
@@ -222,20 +397,38 @@ class VariantList(APIView):
 
         variants = variants.order_by("-percentage")
 
-        paginator = PageNumberPagination()
-        paginator.page_size = page_size
         paginated_variants = paginator.paginate_queryset(variants, request)
         serializer = VariantSerializer(paginated_variants, many=True)
         return paginator.get_paginated_response(serializer.data)
 
 
-# APIView to execute ORM queries via POST request
+# APIView to execute ad-hoc queries via POST request
 class ORMQueryExecutor(APIView):
     """
-    Receives a Django ORM query as a string via POST and executes it.
-    Request body: { "query": "Activity.objects.filter(name='Test')" }
-    Returns: Queryset results or error message.
+    Receives a JSON query (see api.query_dsl) via POST, validates it, compiles it
+    into a single ORM query and executes it with row and time limits.
+    Request body: {
+        "source": "activity",
+        "filters": [{"field": "name", "op": "in", "value": ["CREATE"]}],
+        "group_by": ["month"],
+        "aggregates": [{"fn": "count", "as": "activities"}],
+        "order_by": ["month"],
+        "limit": 100
+    }
+    Returns: The result rows, whether they were truncated by the row limit and
+    whether the compiled plan was served from the cache, or an error message.
+    GET returns the mock dashboard data.
     """
+    def post(self, request):
+        try:
+            return Response(execute_query(request.data))
+        except QueryValidationError as e:
+            return Response({'error': str(e)}, status=400)
+        except QueryTimeoutError as e:
+            return Response({'error': str(e)}, status=408)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+
     def get(self, request):
         import json
         from pathlib import Path
@@ -254,35 +447,57 @@ class CaseExplorer(APIView):
     - throughput time (difference between first and last activity timestamps)
     - name and timestamp of first activity
     - name and timestamp of last activity
+    GET parameters: the shared activity filters (case, name, case_index, var,
+    start_date, end_date) and sample (float, optional) to explore only a
+    case-consistent sample; the list is then returned under "results" next to
+    the scaled case count.
     """
     def get(self, request):
         try:
-            cases = Activity.objects.values_list('case', flat=True).distinct()
-            result = []
-            for case_id in cases:
-                activities = Activity.objects.filter(case=case_id).order_by('timestamp')
-                if not activities.exists():
-                    continue
-                first = activities.first()
-                last = activities.last()
-                throughput = (last.timestamp - first.timestamp).total_seconds() if first and last else None
-                result.append({
-                    'case': case_id,
-                    'activity_count': activities.count(),
-                    'throughput_time_seconds': throughput,
-                    'first_activity': {
-                        'name': first.name,
-                        'timestamp': first.timestamp,
-                    },
-                    'last_activity': {
-                        'name': last.name,
-                        'timestamp': last.timestamp,
-                    }
-                })
+            activities, sample = filter_activities(Activity.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        try:
+            events = activities.order_by('case', 'timestamp').values_list('case', 'name', 'timestamp')
+            result = list(case_summaries(events.iterator(chunk_size=10000)))
+            if sample:
+                return Response({'sample': scale_count(len(result), sample), 'results': result})
             return Response(result)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
+class Echo:
+    """File-like object whose write returns the value, for streaming csv.writer rows."""
+    def write(self, value):
+        return value
+
+
+class ActivityExport(APIView):
+    """
+    Streams the filtered activities as CSV (case_id, timestamp, name, tpt), ordered
+    by case and timestamp, without materializing them: rows are fetched in chunks,
+    through a server-side cursor on PostgreSQL.
+    GET parameters: the shared activity filters (case, name, case_index, var,
+    start_date, end_date, sample).
+    """
+    def get(self, request):
+        try:
+            activities, _ = filter_activities(Activity.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        rows = activities.order_by('case', 'timestamp').values_list('case', 'timestamp', 'name', 'tpt')
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield writer.writerow(['case_id', 'timestamp', 'name', 'tpt'])
+            for case_id, timestamp, name, tpt in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                yield writer.writerow([case_id, timestamp.isoformat(), name, tpt])
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="activities.csv"'
+        return response
+
+
 class CaseActivityTimeline(APIView):
     """
     Returns a list of activities for a given case id, with timestamp and time since first activity.
@@ -306,6 +521,459 @@ class CaseActivityTimeline(APIView):
             })
         return Response(result)
 
+class CaseCount(APIView):
+    """
+    Returns the number of distinct cases matching a filter.
+    GET parameters:
+        - name (list[str]): Only count cases with at least one of these activities.
+        - start_date (str): Start date (YYYY-MM-DD) to filter activities.
+        - end_date (str): End date (YYYY-MM-DD) to filter activities.
+        - approx (str): "true" to estimate the count from the monthly HyperLogLog
+          sketches in constant time (dates are rounded to whole months), "false"
+          (default) for an exact DISTINCT count.
+        - sample (float): Sample rate in (0, 1] to count on a case-consistent sample
+          and scale the result (ignored when approx=true).
+    Response: The count, whether it is approximate and its relative standard error.
+    """
+    def get(self, request):
+        names = request.query_params.getlist('name')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        try:
+            approx = parse_approx(request)
+            sample = parse_sample(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        try:
+            if start_date:
+                start_date = datetime.strptime(start_date, "%Y-%m-%d")
+            if end_date:
+                end_date = datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+
+        if approx:
+            sketch = estimate_distinct_cases(
+                names,
+                start_date.date() if start_date else None,
+                end_date.date() if end_date else None,
+            )
+            return Response({
+                'cases': sketch.count(),
+                'approx': True,
+                'relative_error': sketch.relative_error,
+            })
+
+        activities = Activity.objects.all()
+        if names:
+            activities = activities.filter(name__in=names)
+        if start_date:
+            activities = activities.filter(timestamp__gte=start_date)
+        if end_date:
+            activities = activities.filter(timestamp__lte=end_date)
+        if sample:
+            estimate = scale_count(
+                activities.filter(sample_rank__lt=sample).values('case').distinct().count(),
+                sample,
+            )
+            return Response({
+                'cases': round(estimate['estimate']),
+                'approx': True,
+                'relative_error': estimate['std_error'] / estimate['estimate'] if estimate['estimate'] else 0,
+                'sample': estimate,
+            })
+        return Response({
+            'cases': activities.values('case').distinct().count(),
+            'approx': False,
+            'relative_error': 0,
+        })
+
+class ThroughputPercentiles(APIView):
+    """
+    Returns percentiles of throughput or waiting times served from the precomputed
+    monthly DurationSketch rows, so no raw activity is sorted at request time.
+    GET parameters:
+        - scope (str): 'case' (default), 'variant' or 'activity'.
+        - key (list[str]): Variant ids or activity names to restrict the result to.
+        - q (list[float]): Percentiles to return (default: 50, 90, 99).
+        - start_date (str): Start date (YYYY-MM-DD), rounded down to its month.
+        - end_date (str): End date (YYYY-MM-DD), rounded down to its month.
+    Response: The merged percentiles for the whole filter and, for the variant and
+    activity scopes, the percentiles of each key.
+    """
+    def get(self, request):
+        scope = request.query_params.get('scope', SKETCH_SCOPE_CASE)
+        keys = request.query_params.getlist('key')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        if scope not in dict(SKETCH_SCOPE_CHOICES):
+            return Response({'error': f'Invalid scope: {scope}.'}, status=400)
+        try:
+            percentiles = [float(q) for q in request.query_params.getlist('q')] or [50, 90, 99]
+            if any(not 0 <= q <= 100 for q in percentiles):
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'Percentiles must be numbers between 0 and 100.'}, status=400)
+        try:
+            if start_date:
+                start_date = datetime.strptime(start_date, "%Y-%m-%d").date().replace(day=1)
+            if end_date:
+                end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+
+        rows = DurationSketch.objects.filter(scope=scope)
+        if keys:
+            rows = rows.filter(key__in=keys)
+        if start_date:
+            rows = rows.filter(bucket__gte=start_date)
+        if end_date:
+            rows = rows.filter(bucket__lte=end_date)
+
+        total = None
+        per_key = {}
+        for key, sketch in rows.values_list('key', 'sketch'):
+            sketch = QuantileSketch.from_json(sketch)
+            if key in per_key:
+                per_key[key].merge(sketch)
+            else:
+                per_key[key] = sketch
+        for sketch in per_key.values():
+            total = QuantileSketch.from_dict(sketch.to_dict()) if total is None else total.merge(sketch)
+
+        def summarize(sketch):
+            if sketch is None:
+                return {'count': 0, 'mean_seconds': None, 'percentiles': {}}
+            return {
+                'count': sketch.count,
+                'mean_seconds': sketch.mean,
+                'percentiles': {
+                    f'p{q:g}': sketch.quantile(q / 100) for q in percentiles
+                },
+            }
+
+        result = {'scope': scope, **summarize(total)}
+        if scope != SKETCH_SCOPE_CASE:
+            result['keys'] = {key: summarize(sketch) for key, sketch in per_key.items()}
+        return Response(result)
+
+class BatchContext:
+    """
+    The shared state of one batch request: the filtered activities are built once
+    and, when a widget needs them, materialized once for every widget.
+    """
+    def __init__(self, filters):
+        self.filters = filters
+        self.activities, self.sample = filter_activities(Activity.objects.all(), filters)
+        self._events = None
+        self.base_time_ms = 0.0
+
+    @property
+    def events(self):
+        if self._events is None:
+            started = time.perf_counter()
+            self._events = list(
+                self.activities.order_by('case', 'timestamp').values_list('case', 'name', 'timestamp')
+            )
+            self.base_time_ms = (time.perf_counter() - started) * 1000
+        return self._events
+
+
+def case_explorer_widget(context):
+    result = list(case_summaries(context.events))
+    if context.sample:
+        return {'sample': scale_count(len(result), context.sample), 'results': result}
+    return result
+
+
+def case_count_widget(context):
+    cases = context.activities.values('case').distinct().count()
+    if context.sample:
+        estimate = scale_count(cases, context.sample)
+        return {
+            'cases': round(estimate['estimate']),
+            'approx': True,
+            'relative_error': estimate['std_error'] / estimate['estimate'] if estimate['estimate'] else 0,
+            'sample': estimate,
+        }
+    return {'cases': cases, 'approx': False, 'relative_error': 0}
+
+
+# Widgets computed from the shared filtered activities instead of a separate query
+BATCH_WIDGETS = {
+    'case-explorer': case_explorer_widget,
+    'case-count': case_count_widget,
+}
+
+# Synchronous GET endpoints that can be dispatched in-process as batch widgets
+DISPATCHED_WIDGETS = (
+    'activity-list', 'variant-list', 'metadata-list', 'case-explorer', 'case-list', 'case-count',
+    'throughput-percentiles', 'event-store-variants', 'event-store-dfg', 'event-store-bottlenecks',
+    'event-store-kpis', 'system-overview-kpis', 'activity-system-distribution', 'activity-count-system',
+    'activity-trend', 'activities-performed-over-year', 'activities-per-year', 'avg-automation-rate',
+    'activity-automation-metrics', 'user-tat-metrics', 'system-triggered-vs-manual',
+    'system-view-distribution', 'automation-rate-per-year', 'bottlenecks-tat',
+)
+
+MAX_BATCH_WIDGETS = 50
+
+
+class BatchQuery(APIView):
+    """
+    Computes several dashboard widgets in one request.
+    Request body: {
+        "filters": {"start_date": "2024-01-01", "name": ["CREATE"], "sample": 0.1},
+        "widgets": [
+            {"id": "cases", "widget": "case-explorer"},
+            {"id": "p90", "widget": "throughput-percentiles", "params": {"q": 90}}
+        ]
+    }
+    `widget` is the URL name of a synchronous GET endpoint of this API
+    (DISPATCHED_WIDGETS). Widgets without their own params that can be computed
+    from the filtered activities share them (case-explorer scans them once,
+    case-count counts their distinct cases); the others are dispatched
+    in-process with the shared filters merged with their params, skipping the
+    middleware stack. A failing widget returns its own error entry.
+    Returns: The status, data and time of each widget keyed by id, the time spent
+    building the shared base set and the total time.
+    """
+    def post(self, request):
+        started = time.perf_counter()
+        widgets = request.data.get('widgets') if isinstance(request.data, dict) else None
+        filters = request.data.get('filters', {}) if isinstance(request.data, dict) else None
+        if not isinstance(widgets, list) or not isinstance(filters, dict):
+            return Response({'error': 'The body must contain a widgets list and a filters object.'}, status=400)
+        if len(widgets) > MAX_BATCH_WIDGETS:
+            return Response({'error': f'At most {MAX_BATCH_WIDGETS} widgets per batch.'}, status=400)
+        try:
+            context = BatchContext(self.query_dict(filters))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        results = {}
+        for index, widget in enumerate(widgets):
+            widget_started = time.perf_counter()
+            if not isinstance(widget, dict):
+                widget = {}
+            widget_id = str(widget.get('id', index))
+            status, data = self.run_widget(request, context, filters, widget)
+            results[widget_id] = {
+                'status': status,
+                'data': data,
+                'time_ms': (time.perf_counter() - widget_started) * 1000,
+            }
+        return Response({
+            'results': results,
+            'base_time_ms': context.base_time_ms,
+            'total_time_ms': (time.perf_counter() - started) * 1000,
+        })
+
+    @staticmethod
+    def query_dict(params):
+        query = QueryDict(mutable=True)
+        for key, value in params.items():
+            if value is None:
+                continue
+            query.setlist(key, [str(v) for v in value] if isinstance(value, list) else [str(value)])
+        return query
+
+    def run_widget(self, request, context, filters, widget):
+        name = widget.get('widget')
+        if not isinstance(name, str):
+            return 400, {'error': 'widget must be the URL name of an endpoint.'}
+        params = widget.get('params') or {}
+        if not isinstance(params, dict):
+            return 400, {'error': 'params must be an object.'}
+        if name in BATCH_WIDGETS and not params:
+            try:
+                return 200, BATCH_WIDGETS[name](context)
+            except Exception as e:
+                return 500, {'error': str(e)}
+        try:
+            path = reverse(name)
+        except NoReverseMatch:
+            return 404, {'error': f'Unknown widget {name!r}.'}
+        if name not in DISPATCHED_WIDGETS:
+            return 400, {'error': f'Widget {name!r} cannot be batched.'}
+
+        inner = HttpRequest()
+        inner.method = 'GET'
+        inner.path = inner.path_info = path
+        inner.META = request._request.META.copy()
+        inner.GET = self.query_dict({**filters, **params})
+        inner.META['QUERY_STRING'] = inner.GET.urlencode()
+        if hasattr(request._request, 'user'):
+            inner.user = request._request.user
+        match = resolve(path)
+        try:
+            response = match.func(inner, *match.args, **match.kwargs)
+        except Exception as e:
+            return 500, {'error': str(e)}
+        return response.status_code, getattr(response, 'data', None)
+
+
+class EventStoreView(APIView):
+    """
+    Base view for the analytics computed on the memory-mapped event store
+    (api.eventstore) instead of the database. Subclasses implement `compute`.
+    Returns 503 if the event store has not been built.
+    """
+    def compute(self, store, request):
+        raise NotImplementedError
+
+    def get(self, request):
+        try:
+            store = eventstore.load_event_store()
+        except eventstore.EventStoreUnavailable as e:
+            return Response({'error': str(e)}, status=503)
+        started = time.perf_counter()
+        try:
+            data = self.compute(store, request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({
+            'build': store.meta['build'],
+            'time_ms': (time.perf_counter() - started) * 1000,
+            'results': data,
+        })
+
+
+class EventStoreVariants(EventStoreView):
+    """
+    Variants computed from the event store, most frequent first.
+    GET parameters: limit (int, optional) and cases ('false' to leave out the case lists).
+    """
+    def compute(self, store, request):
+        limit = parse_limit(request)
+        result = eventstore.variants(store)[:limit]
+        if request.query_params.get('cases', 'true').lower() == 'false':
+            # The variants are cached on the store, so copy them instead of deleting keys
+            result = [{key: value for key, value in variant.items() if key != 'cases'} for variant in result]
+        return result
+
+
+class EventStoreDFG(EventStoreView):
+    """
+    Directly-follows graph computed from the event store: activity frequencies and
+    the frequency and mean time of each transition between two activities.
+    """
+    def compute(self, store, request):
+        return eventstore.directly_follows(store)
+
+
+class EventStoreBottlenecks(EventStoreView):
+    """
+    Mean and median waiting time after each activity, computed from the event store.
+    GET parameter: limit (int, optional).
+    """
+    def compute(self, store, request):
+        return eventstore.bottlenecks(store, parse_limit(request))
+
+
+class EventStoreKPIs(EventStoreView):
+    """
+    Overview KPIs (cases, activities, activities per case, throughput time)
+    computed from the event store.
+    """
+    def compute(self, store, request):
+        return eventstore.kpis(store)
+
+
+def parse_limit(request):
+    limit = request.query_params.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be a positive integer.')
+    if limit <= 0:
+        raise ValueError('limit must be a positive integer.')
+    return limit
+
+
+class JobList(APIView):
+    """
+    Background jobs (see api.jobs), run by the `run_jobs` worker command.
+    GET: The latest jobs, newest first. Parameters: status, kind and limit (default 50).
+    POST: Queue a job. Body: {"kind": "rollups", "params": {"event_store": true}}
+    with kind one of ingest (params: file relative to api/data, replace,
+    event_store), rollups (event_store), event_store or cache_warmup (paths).
+    Returns 202 with the queued job.
+    """
+    def get(self, request):
+        jobs = Job.objects.order_by('-created_at', '-id')
+        if request.query_params.get('status'):
+            jobs = jobs.filter(status=request.query_params['status'])
+        if request.query_params.get('kind'):
+            jobs = jobs.filter(kind=request.query_params['kind'])
+        try:
+            limit = parse_limit(request) or 50
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response(JobSerializer(jobs[:limit], many=True).data)
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'The body must be a JSON object.'}, status=400)
+        try:
+            job = submit_job(request.data.get('kind'), request.data.get('params') or {})
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response(JobSerializer(job).data, status=202)
+
+
+class JobDetail(APIView):
+    """
+    The status and progress of a background job.
+    """
+    def get(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({'error': 'Job not found.'}, status=404)
+        return Response(JobSerializer(job).data)
+
+
+class JobResult(APIView):
+    """
+    The result of a background job: 200 with the result once it succeeded, 202 while
+    it is queued or running and 409 if it failed or was cancelled.
+    """
+    def get(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({'error': 'Job not found.'}, status=404)
+        if job.status == JOB_SUCCEEDED:
+            return Response({'id': job.id, 'status': job.status, 'result': job.result})
+        if job.status in (JOB_QUEUED, JOB_RUNNING):
+            return Response({'id': job.id, 'status': job.status, 'progress': job.progress}, status=202)
+        return Response({'id': job.id, 'status': job.status, 'error': job.error}, status=409)
+
+
+class JobCancel(APIView):
+    """
+    Cancel a queued or running job (a running job stops at its next progress report).
+    """
+    def post(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({'error': 'Job not found.'}, status=404)
+        if not cancel_job(job):
+            return Response({'error': f'The job already {job.status}.'}, status=409)
+        job.refresh_from_db()
+        return Response(JobSerializer(job).data)
+
+
+class Metrics(APIView):
+    """
+    Prometheus metrics of this process (api.metrics) in the text exposition format:
+    request latency per URL name, in-flight requests, SQL queries, cache hit
+    ratios, jobs and ingestion throughput per stage.
+    """
+    def get(self, request):
+        return HttpResponse(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+
+
 # --- Automation Endpoints ---
 class AvgAutomationRate(APIView):
     def get(self, request):
@@ -2,7 +2,7 @@
 """
 Script to clean CSV files by removing rows with missing data.
 Configuration is done by editing the variables in the main() function.
-Simply run: python clean_csv_data.py
+Simply run from the repository root: python clean_csv_data.py
 """
 
 import pandas as pd
@@ -10,6 +10,149 @@ import numpy as np
 from pathlib import Path
 import sys
 
+from api.management.csv_utils import DEFAULT_CHUNKSIZE, iter_csv_chunks, read_header, write_chunks
+
+
+def new_missing_report(columns):
+    """
+    Create an empty missing-data report, filled incrementally by update_missing_report.
+    
+    Args:
+        columns (list): Column names of the data
+    
+    Returns:
+        dict: The report
+    """
+    return {
+        'rows': 0,
+        'missing': pd.Series(0, index=list(columns), dtype='int64'),
+        'rows_with_missing': 0,
+        'rows_all_missing': 0,
+        'missing_per_row': pd.Series(dtype='int64'),
+    }
+
+
+def update_missing_report(report, missing_mask):
+    """
+    Add the rows of a missing-value mask (DataFrame.isnull()) to a report.
+    
+    Args:
+        report (dict): Report created by new_missing_report
+        missing_mask (pandas.DataFrame): True where a value is missing
+    """
+    missing_per_row = missing_mask.sum(axis=1)
+    report['rows'] += len(missing_mask)
+    report['missing'] += missing_mask.sum()
+    report['rows_with_missing'] += int((missing_per_row > 0).sum())
+    report['rows_all_missing'] += int((missing_per_row == missing_mask.shape[1]).sum())
+    report['missing_per_row'] = report['missing_per_row'].add(missing_per_row.value_counts(), fill_value=0).astype('int64')
+
+
+def print_missing_report(report, title, totals=True):
+    """
+    Print the missing values per column of a report.
+    
+    Args:
+        report (dict): Report created by new_missing_report
+        title (str): Heading of the report
+        totals (bool): Also print the total and per-row counts
+    """
+    total_rows = report['rows']
+    print(title)
+    for col, missing_count in report['missing'].items():
+        missing_pct = (missing_count / total_rows) * 100 if total_rows else 0
+        print(f"  {col}: {missing_count} missing ({missing_pct:.2f}%)")
+    
+    if totals:
+        print(f"\nTotal missing values: {report['missing'].sum()}")
+        
+        # Count rows with any missing data
+        rows_missing_pct = (report['rows_with_missing'] / total_rows) * 100 if total_rows else 0
+        print(f"Rows with any missing data: {report['rows_with_missing']} ({rows_missing_pct:.2f}%)")
+        
+        # Count rows with all missing data
+        rows_all_missing_pct = (report['rows_all_missing'] / total_rows) * 100 if total_rows else 0
+        print(f"Rows with all missing data: {report['rows_all_missing']} ({rows_all_missing_pct:.2f}%)")
+
+
+def rows_to_keep(missing_mask, how='any', subset=None):
+    """
+    Rows that DataFrame.dropna(how=how, subset=subset) would keep, from a missing-value mask.
+    """
+    if subset:
+        missing_mask = missing_mask[subset]
+    if how == 'any':
+        return ~missing_mask.any(axis=1)
+    if how == 'all':
+        return ~missing_mask.all(axis=1)
+    raise ValueError(f"invalid how option: {how}")
+
+
+def clean_csv_data_streaming(input_file, output_file, how='any', subset=None, chunksize=DEFAULT_CHUNKSIZE, verbose=True):
+    """
+    Clean a CSV file by removing rows with missing data, chunk by chunk.
+    
+    Each chunk is checked for missing values once: the same mask feeds the
+    before-cleaning report, selects the rows to keep and feeds the
+    after-cleaning report, so the file is read once and memory stays at one chunk.
+    Values are written back exactly as they appear in the file.
+    
+    Args:
+        input_file (str): Path to the input CSV file
+        output_file (str): Path to the output cleaned CSV file
+        how (str): 'any' or 'all', as in clean_csv_data
+        subset (list): List of column names to check for missing data (optional)
+        chunksize (int): Rows per chunk
+        verbose (bool): Print the missing data reports
+    
+    Returns:
+        dict: 'before' and 'after' missing-data reports (see new_missing_report)
+    """
+    
+    input_path = Path(input_file)
+    
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file does not exist: {input_file}")
+    
+    columns = read_header(input_file)
+    if subset:
+        unknown = [col for col in subset if col not in columns]
+        if unknown:
+            raise ValueError(f"Subset columns not found in the CSV file: {unknown}")
+    
+    before = new_missing_report(columns)
+    after = new_missing_report(columns)
+    
+    def chunks():
+        # Text values, but with the usual pandas missing-value markers
+        for chunk in iter_csv_chunks(input_file, chunksize=chunksize, keep_default_na=True):
+            missing_mask = chunk.isnull()
+            keep = rows_to_keep(missing_mask, how, subset)
+            update_missing_report(before, missing_mask)
+            update_missing_report(after, missing_mask[keep])
+            yield chunk[keep]
+    
+    if verbose:
+        print(f"Cleaning CSV file: {input_file} (how='{how}', subset={subset})")
+    write_chunks(chunks(), output_file)
+    
+    if verbose:
+        print(f"Columns: {columns}")
+        print("-" * 50)
+        print_missing_report(before, "Missing data analysis BEFORE cleaning:")
+        print("-" * 50)
+        rows_removed = before['rows'] - after['rows']
+        removal_pct = (rows_removed / before['rows']) * 100 if before['rows'] else 0
+        print(f"\nCleaning results:")
+        print(f"  Original rows: {before['rows']}")
+        print(f"  Cleaned rows: {after['rows']}")
+        print(f"  Rows removed: {rows_removed} ({removal_pct:.2f}%)")
+        if after['rows'] > 0:
+            print_missing_report(after, "\nMissing data analysis AFTER cleaning:", totals=False)
+        print(f"\nSaved cleaned CSV to: {output_file}")
+    
+    return {'before': before, 'after': after}
+
 
 def clean_csv_data(input_file, output_file=None, how='any', subset=None, verbose=True):
     """
@@ -49,29 +192,14 @@ def clean_csv_data(input_file, output_file=None, how='any', subset=None, verbose
         print(f"Columns: {list(df.columns)}")
         print("-" * 50)
     
+    # Compute the missing-value mask once for the reports and the cleaning
+    missing_mask = df.isnull()
+    
     # Analyze missing data before cleaning
     if verbose:
-        print("Missing data analysis BEFORE cleaning:")
-        missing_stats = df.isnull().sum()
-        total_rows = len(df)
-        
-        for col in df.columns:
-            missing_count = missing_stats[col]
-            missing_pct = (missing_count / total_rows) * 100
-            print(f"  {col}: {missing_count} missing ({missing_pct:.2f}%)")
-        
-        total_missing = df.isnull().sum().sum()
-        print(f"\nTotal missing values: {total_missing}")
-        
-        # Count rows with any missing data
-        rows_with_missing = df.isnull().any(axis=1).sum()
-        rows_missing_pct = (rows_with_missing / total_rows) * 100
-        print(f"Rows with any missing data: {rows_with_missing} ({rows_missing_pct:.2f}%)")
-        
-        # Count rows with all missing data
-        rows_all_missing = df.isnull().all(axis=1).sum()
-        rows_all_missing_pct = (rows_all_missing / total_rows) * 100
-        print(f"Rows with all missing data: {rows_all_missing} ({rows_all_missing_pct:.2f}%)")
+        before = new_missing_report(df.columns)
+        update_missing_report(before, missing_mask)
+        print_missing_report(before, "Missing data analysis BEFORE cleaning:")
         print("-" * 50)
     
     # Clean the data by removing rows with missing values
@@ -81,16 +209,16 @@ def clean_csv_data(input_file, output_file=None, how='any', subset=None, verbose
         # Check only specific columns
         if verbose:
             print(f"Checking for missing data in columns: {subset}")
-        cleaned_df = df.dropna(subset=subset, how=how)
     else:
         # Check all columns
         if verbose:
             print(f"Checking for missing data in all columns (how='{how}')")
-        cleaned_df = df.dropna(how=how)
+    keep = rows_to_keep(missing_mask, how, subset)
+    cleaned_df = df[keep]
     
     cleaned_row_count = len(cleaned_df)
     rows_removed = original_row_count - cleaned_row_count
-    removal_pct = (rows_removed / original_row_count) * 100
+    removal_pct = (rows_removed / original_row_count) * 100 if original_row_count else 0
     
     if verbose:
         print(f"\nCleaning results:")
@@ -99,12 +227,9 @@ def clean_csv_data(input_file, output_file=None, how='any', subset=None, verbose
         print(f"  Rows removed: {rows_removed} ({removal_pct:.2f}%)")
         
         if cleaned_row_count > 0:
-            print(f"\nMissing data analysis AFTER cleaning:")
-            missing_stats_after = cleaned_df.isnull().sum()
-            for col in cleaned_df.columns:
-                missing_count = missing_stats_after[col]
-                missing_pct = (missing_count / cleaned_row_count) * 100
-                print(f"  {col}: {missing_count} missing ({missing_pct:.2f}%)")
+            after = new_missing_report(df.columns)
+            update_missing_report(after, missing_mask[keep])
+            print_missing_report(after, "\nMissing data analysis AFTER cleaning:", totals=False)
     
     # Save cleaned data if output file is provided
     if output_file:
@@ -214,6 +339,9 @@ def main():
     # Set to True to run detailed missing data pattern analysis
     RUN_ANALYSIS = False
     
+    # Rows read per chunk
+    CHUNKSIZE = DEFAULT_CHUNKSIZE
+    
     # ==============================
     # END CONFIGURATION
     # ==============================
@@ -227,29 +355,29 @@ def main():
         print(f"  Verbose output: {VERBOSE}")
         print("=" * 50)
         
-        # Load and analyze the original data first
-        if RUN_ANALYSIS:
-            df_original = pd.read_csv(INPUT_FILE)
-            analyze_missing_data_patterns(df_original, verbose=VERBOSE)
-        
-        # Clean the CSV file
-        cleaned_df = clean_csv_data(
+        # Clean the CSV file chunk by chunk, collecting the reports on the way
+        reports = clean_csv_data_streaming(
             INPUT_FILE,
             OUTPUT_FILE,
             how=HOW_TO_CLEAN,
             subset=SUBSET_COLUMNS,
+            chunksize=CHUNKSIZE,
             verbose=VERBOSE
         )
         
+        # Missing data patterns of the original data, from the same pass
+        if RUN_ANALYSIS:
+            before = reports['before']
+            print(f"\nMissing Data Patterns:")
+            for missing_count, row_count in before['missing_per_row'].sort_index().items():
+                if missing_count > 0:
+                    pct = (row_count / before['rows']) * 100
+                    print(f"  Rows with {missing_count} missing values: {row_count} ({pct:.2f}%)")
+        
         print(f"\n✅ Successfully cleaned CSV file!")
         print(f"Input: {INPUT_FILE}")
         print(f"Output: {OUTPUT_FILE}")
-        print(f"Final row count: {len(cleaned_df):,}")
-        
-        # Show a sample of the cleaned data
-        if VERBOSE and len(cleaned_df) > 0:
-            print(f"\nSample of cleaned data:")
-            print(cleaned_df.head())
+        print(f"Final row count: {reports['after']['rows']:,}")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
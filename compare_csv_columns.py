@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Script to compare the columns of the CSV files in a folder without loading them.
+Reads only the header and a small sample of each file to cluster the files by
+schema, report alias candidates (e.g. 'CASE ID' vs 'CASE_ID'), infer the column
+types and write a column-mapping file that the filter and merge scripts accept.
+
+Configuration is done by editing the variables in the main() function.
+Simply run from the repository root: python compare_csv_columns.py
+"""
+
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from difflib import SequenceMatcher
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+from api.management.csv_utils import normalize_column_name, read_header
+
+# Timestamp formats found in the exports
+TIMESTAMP_FORMATS = ['%d-%b-%y %I.%M.%S.%f %p', '%d/%m/%Y %H:%M:%S']
+
+# Distinct sample values checked per column when inferring its type
+MAX_DISTINCT_VALUES = 200
+
+# Minimum similarity of two normalized column names to report them as alias candidates
+SIMILARITY_THRESHOLD = 0.9
+
+
+INTEGER_PATTERN = re.compile(r'-?\d+(\.0+)?')
+
+
+def _is_float(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_timestamp(value, timestamp_format):
+    try:
+        datetime.strptime(value, timestamp_format)
+        return True
+    except ValueError:
+        return False
+
+
+def infer_column_type(values):
+    """
+    Infer the type of a column from a sample of its values read as text.
+
+    Args:
+        values (iterable): Sample values (empty string for missing)
+
+    Returns:
+        str: 'empty', 'integer', 'float', 'timestamp' or 'string'
+    """
+    # Each distinct value only needs to be checked once
+    distinct = list(islice({value.strip() for value in values} - {''}, MAX_DISTINCT_VALUES))
+    if not distinct:
+        return 'empty'
+    if all(INTEGER_PATTERN.fullmatch(value) for value in distinct):
+        # '13000157.0' is an integer that went through a float column
+        return 'integer'
+    if all(_is_float(value) for value in distinct):
+        return 'float'
+    if all(value[0].isdigit() for value in distinct):
+        for timestamp_format in TIMESTAMP_FORMATS:
+            if all(_is_timestamp(value, timestamp_format) for value in distinct):
+                return 'timestamp'
+    return 'string'
+
+
+def inspect_csv(file_path, sample_rows=200):
+    """
+    Inspect a CSV file from its header and its first rows.
+
+    Args:
+        file_path (str): Path to the CSV file
+        sample_rows (int): Number of rows read to infer the types
+
+    Returns:
+        dict: File name, columns, per-column type and missing fraction in the
+        sample, and the error message if the file could not be read
+    """
+    file_path = Path(file_path)
+    info = {'file': file_path.name, 'columns': [], 'types': {}, 'missing': {}, 'error': None}
+    try:
+        info['columns'] = read_header(file_path)
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = list(islice(reader, sample_rows))
+    except Exception as e:
+        info['error'] = str(e)
+        return info
+    for position, col in enumerate(info['columns']):
+        values = [row[position] if position < len(row) else '' for row in rows]
+        info['types'][col] = infer_column_type(values)
+        info['missing'][col] = sum(not value.strip() for value in values) / len(values) if values else 0.0
+    return info
+
+
+def cluster_by_schema(inspections):
+    """
+    Group files whose columns are the same once aliases are normalized.
+
+    Args:
+        inspections (list): Results of inspect_csv
+
+    Returns:
+        list: Clusters as dicts with the normalized 'columns', the 'files' and
+        whether the files use the exact same names ('exact'), largest first
+    """
+    clusters = {}
+    for info in inspections:
+        if info['error']:
+            continue
+        key = tuple(sorted(normalize_column_name(col) for col in info['columns']))
+        cluster = clusters.setdefault(key, {'columns': list(key), 'files': [], 'headers': set()})
+        cluster['files'].append(info['file'])
+        cluster['headers'].add(tuple(info['columns']))
+    result = []
+    for cluster in clusters.values():
+        result.append({
+            'columns': cluster['columns'],
+            'files': cluster['files'],
+            'exact': len(cluster['headers']) == 1,
+        })
+    return sorted(result, key=lambda cluster: -len(cluster['files']))
+
+
+def find_alias_candidates(inspections, threshold=SIMILARITY_THRESHOLD):
+    """
+    Find column names that probably mean the same column in different files.
+
+    Names that normalize to the same name ('CASE ID', 'CASE_ID') are aliases;
+    names whose normalized forms are very similar are candidates as long as
+    they never appear together in one file (two columns of one file are
+    different columns).
+
+    Args:
+        inspections (list): Results of inspect_csv
+        threshold (float): Minimum similarity ratio of fuzzy candidates
+
+    Returns:
+        list: Dicts with the 'canonical' name, its 'aliases', the 'files' using
+        each spelling, the 'similarity' and whether the match is 'exact'
+    """
+    spellings = {}
+    together = set()
+    for info in inspections:
+        normalized = [normalize_column_name(col) for col in info['columns']]
+        for col, name in zip(info['columns'], normalized):
+            spellings.setdefault(name, {}).setdefault(col, []).append(info['file'])
+        together.update((a, b) for a in normalized for b in normalized if a != b)
+
+    candidates = []
+    for name, raw in spellings.items():
+        if len(raw) > 1:
+            candidates.append({
+                'canonical': name,
+                'aliases': sorted(col for col in raw if col != name),
+                'files': raw,
+                'similarity': 1.0,
+                'exact': True,
+            })
+    names = sorted(spellings)
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            if (first, second) in together:
+                continue
+            similarity = SequenceMatcher(None, first, second).ratio()
+            if similarity >= threshold:
+                # The spelling used by more files is the canonical one
+                canonical, alias = sorted(
+                    (first, second), key=lambda name: -sum(len(files) for files in spellings[name].values())
+                )
+                candidates.append({
+                    'canonical': canonical,
+                    'aliases': sorted(spellings[alias]),
+                    'files': {**spellings[canonical], **spellings[alias]},
+                    'similarity': round(similarity, 3),
+                    'exact': False,
+                })
+    return candidates
+
+
+def build_column_mapping(inspections, candidates, include_fuzzy=False):
+    """
+    Build the column mapping (file column -> canonical name) for load_column_mapping.
+
+    Args:
+        inspections (list): Results of inspect_csv
+        candidates (list): Results of find_alias_candidates
+        include_fuzzy (bool): Also map the fuzzy candidates (review them first)
+
+    Returns:
+        dict: 'columns' (the mapping), 'types' (canonical name -> inferred types)
+        and 'files' (file name -> columns) for reference
+    """
+    mapping = {}
+    for candidate in candidates:
+        if candidate['exact'] or include_fuzzy:
+            for alias in candidate['aliases']:
+                mapping[alias] = candidate['canonical']
+    types = {}
+    for info in inspections:
+        for col, col_type in info['types'].items():
+            canonical = mapping.get(col, normalize_column_name(col))
+            types.setdefault(canonical, set()).add(col_type)
+    return {
+        'columns': mapping,
+        'types': {name: sorted(col_types) for name, col_types in sorted(types.items())},
+        'files': {info['file']: info['columns'] for info in inspections if not info['error']},
+    }
+
+
+def compare_csv_columns(folder_path, pattern="*.csv", sample_rows=200, mapping_file=None, verbose=True):
+    """
+    Compare the schemas of the CSV files in a folder.
+
+    Args:
+        folder_path (str): Path to the folder containing CSV files
+        pattern (str): Pattern of the files to compare
+        sample_rows (int): Rows read per file to infer the types
+        mapping_file (str): Path of the column-mapping JSON to write (optional)
+        verbose (bool): Print the report
+
+    Returns:
+        dict: 'inspections', 'clusters', 'candidates' and 'mapping'
+    """
+    folder = Path(folder_path)
+    if not folder.is_dir():
+        raise FileNotFoundError(f"Folder does not exist: {folder_path}")
+    csv_files = sorted(folder.glob(pattern))
+    if not csv_files:
+        raise ValueError(f"No CSV files found in {folder_path} with pattern {pattern}")
+
+    inspections = [inspect_csv(csv_file, sample_rows) for csv_file in csv_files]
+    clusters = cluster_by_schema(inspections)
+    candidates = find_alias_candidates(inspections)
+    mapping = build_column_mapping(inspections, candidates)
+
+    if mapping_file:
+        Path(mapping_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(mapping_file, 'w', encoding='utf-8') as f:
+            json.dump(mapping, f, indent=2, ensure_ascii=False)
+
+    if verbose:
+        print(f"Inspected {len(csv_files)} CSV files in {folder_path}")
+        for info in inspections:
+            if info['error']:
+                print(f"  ❌ {info['file']}: {info['error']}")
+
+        print(f"\nSchema clusters: {len(clusters)}")
+        for i, cluster in enumerate(clusters, 1):
+            exact = "same names" if cluster['exact'] else "aliased names"
+            print(f"  {i}. {len(cluster['columns'])} columns, {len(cluster['files'])} files ({exact})")
+            for file_name in cluster['files']:
+                print(f"     - {file_name}")
+        if len(clusters) > 1:
+            base = set(clusters[0]['columns'])
+            for i, cluster in enumerate(clusters[1:], 2):
+                print(f"  Cluster {i} vs 1: missing {sorted(base - set(cluster['columns']))}, "
+                      f"extra {sorted(set(cluster['columns']) - base)}")
+
+        print(f"\nAlias candidates:")
+        if not candidates:
+            print("  (none)")
+        for candidate in candidates:
+            kind = "alias" if candidate['exact'] else f"similar ({candidate['similarity']:.2f})"
+            print(f"  {candidate['canonical']} <- {candidate['aliases']} [{kind}]")
+
+        print(f"\nInferred types:")
+        for name, col_types in mapping['types'].items():
+            flag = "  ⚠️ differs between files" if len(set(col_types) - {'empty'}) > 1 else ""
+            print(f"  {name}: {', '.join(col_types)}{flag}")
+
+        if mapping_file:
+            print(f"\nColumn mapping saved to: {mapping_file}")
+
+    return {'inspections': inspections, 'clusters': clusters, 'candidates': candidates, 'mapping': mapping}
+
+
+def main():
+    """Main function to run the script."""
+
+    # ==============================
+    # CONFIGURATION - Edit these values as needed
+    # ==============================
+
+    # Folder containing the CSV files to compare
+    INPUT_FOLDER = "api/data/updated_data"
+
+    # File pattern to match
+    FILE_PATTERN = "*.csv"
+
+    # Rows read per file to infer the column types
+    SAMPLE_ROWS = 200
+
+    # Column mapping for merge_all_csvs / filter_columns_simple / run_pipeline (None to skip)
+    MAPPING_FILE = "api/data/updated_data/column_mapping.json"
+
+    # ==============================
+    # END CONFIGURATION
+    # ==============================
+
+    try:
+        start_time = time.time()
+        compare_csv_columns(INPUT_FOLDER, FILE_PATTERN, SAMPLE_ROWS, MAPPING_FILE)
+        print(f"\n✅ Compared in {(time.time() - start_time) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Gunicorn configuration for serving the API in production (used by the Dockerfile):
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be changed from the environment:
+    GUNICORN_BIND            Address to listen on (default 0.0.0.0:5001)
+    GUNICORN_WORKERS         Worker processes (default WEB_CONCURRENCY, else 2 x CPUs + 1, at most 8)
+    GUNICORN_THREADS         Threads per worker (default 4; the gthread worker is used when > 1)
+    GUNICORN_WORKER_CLASS    Worker class, e.g. uvicorn.workers.UvicornWorker to serve
+                             ofi_dashboard_backend.asgi (needs `pip install uvicorn`)
+    GUNICORN_APP             Application to serve (default the WSGI app, or the ASGI app for uvicorn workers)
+    GUNICORN_PRELOAD         1 to load the app before forking so the workers share its memory (default 1)
+    GUNICORN_MAX_REQUESTS    Requests after which a worker is recycled (default 1000, 0 disables it)
+    GUNICORN_MAX_REQUESTS_JITTER  Random extra requests so the workers do not restart together (default 100)
+    GUNICORN_TIMEOUT         Seconds before a silent worker is killed and restarted (default 120)
+    GUNICORN_KEEPALIVE       Seconds to keep idle client connections open (default 5)
+    GUNICORN_LOG_LEVEL       Log level (default info)
+"""
+import multiprocessing
+import os
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+
+workers = env_int('GUNICORN_WORKERS', env_int('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = env_int('GUNICORN_THREADS', 4)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+
+if 'uvicorn' in worker_class:
+    wsgi_app = os.getenv('GUNICORN_APP', 'ofi_dashboard_backend.asgi:application')
+else:
+    wsgi_app = os.getenv('GUNICORN_APP', 'ofi_dashboard_backend.wsgi:application')
+
+# Import Django and the views once in the master; the forked workers share those pages
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Recycle workers periodically so memory growth of long-running workers is bounded
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Map the event store in the master (if built) so the workers inherit the mapping."""
+    if not preload_app:
+        return
+    try:
+        from api.eventstore import EventStoreUnavailable, load_event_store
+        store = load_event_store()
+        server.log.info("Event store %s mapped (%d events)", store.meta['build'], store.num_events)
+    except EventStoreUnavailable:
+        pass
+
+
+def post_fork(server, worker):
+    """Connections opened in the master must not be shared with the workers."""
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
@@ -47,7 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ReadOnlyDatabaseMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware", #NEW
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,24 +87,74 @@ load_dotenv()
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.getenv("DB_NAME"),
-#         'USER': os.getenv("DB_USER"),
-#         'PASSWORD': os.getenv("DB_PASSWORD"),
-#         'HOST': os.getenv("DB_HOST", "localhost"),
-#         'PORT': os.getenv("DB_PORT", "5432"),
-#     }
-# }
-
-
-DATABASES = {
-     'default': {
-         'ENGINE': 'django.db.backends.sqlite3',
-         'NAME': BASE_DIR / 'db.sqlite3',
-     }
- }
+# DB_ENGINE=postgresql switches to PostgreSQL (psycopg 3), configured from the environment:
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE: seconds a connection is kept open and reused between requests (default 60)
+#   DB_POOL=1: use a psycopg connection pool per process instead (DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+#   DB_DISABLE_SERVER_SIDE_CURSORS=1: needed behind PgBouncer in transaction pooling mode;
+#       otherwise QuerySet.iterator() streams through a server-side cursor
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DB_NAME"),
+            'USER': os.getenv("DB_USER"),
+            'PASSWORD': os.getenv("DB_PASSWORD"),
+            'HOST': os.getenv("DB_HOST", "localhost"),
+            'PORT': os.getenv("DB_PORT", "5432"),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv('DB_POOL') == '1':
+        # Pooled connections are returned to the pool after each request; Django
+        # requires persistent connections to be off when the pool is used
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': 10,
+        }
+else:
+    # SQLite (api.sqlite): GET requests read through the `readonly` alias, which opens
+    # the same file with mode=ro; reloads write to the `shadow` alias, a copy of the
+    # file that is swapped in when they finish. Both follow SQLITE_DATABASE.current.
+    SQLITE_DATABASE = BASE_DIR / 'db.sqlite3'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_DATABASE,
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        },
+        'readonly': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'{SQLITE_DATABASE.as_uri()}?mode=ro',
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'TEST': {'MIRROR': 'default'},
+        },
+        'shadow': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # Set to the copy being written by api.sqlite.shadow_database
+            'NAME': BASE_DIR / 'db.shadow.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['api.sqlite.SQLiteRouter']
+
+# PRAGMAs run on every new SQLite connection (api.sqlite.configure_connection)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    # Negative: size in KiB instead of pages
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', str(64 * 1024))),
+    'temp_store': 'MEMORY',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+}
 
 
 
@@ -154,11 +207,47 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5000,  
 }
 
+# Folder of the memory-mapped event store (api.eventstore), built by `manage.py build_event_store`
+EVENT_STORE_DIR = BASE_DIR / 'api' / 'data' / 'event_store'
+
+# Thread pool of the async analytics views (api.views.async_views)
+ANALYTICS_THREADS = int(os.getenv('ANALYTICS_THREADS', '4'))
+ANALYTICS_MAX_QUEUED = int(os.getenv('ANALYTICS_MAX_QUEUED', '16'))
+ANALYTICS_TIMEOUT = float(os.getenv('ANALYTICS_TIMEOUT', '30'))
+
+# Per-request instrumentation (api.middleware.PerformanceMiddleware)
+#   PERF_SLOW_REQUEST_MS: log requests slower than this with their slowest queries (0: off)
+#   PERF_N_PLUS_ONE_THRESHOLD: log requests running one statement this many times (0: off)
+#   PERF_TRACEMALLOC=1: also measure the peak Python allocation (slows every request down)
+PERF_SLOW_REQUEST_MS = float(os.getenv('PERF_SLOW_REQUEST_MS', '0'))
+PERF_N_PLUS_ONE_THRESHOLD = int(os.getenv('PERF_N_PLUS_ONE_THRESHOLD', '10'))
+PERF_TRACEMALLOC = os.getenv('PERF_TRACEMALLOC') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 import os
 
 # Example env variable: DJANGO_USE_HTTPS=1
 USE_HTTPS = os.getenv('DJANGO_USE_HTTPS') == '1'
 SECURE_SSL_REDIRECT = True
+# Prometheus scrapes /metrics over plain HTTP inside the network
+SECURE_REDIRECT_EXEMPT = [r'^metrics$']
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 if USE_HTTPS:
     SECURE_SSL_REDIRECT = True
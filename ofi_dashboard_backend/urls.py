@@ -1,6 +1,10 @@
 
 from django.urls import path, include
 
+from api.views.views import Metrics
+
 urlpatterns = [
     path('v1/', include('api.urls')),
+    # Prometheus scrape endpoint (api.metrics)
+    path('metrics', Metrics.as_view(), name='metrics'),
 ]
\ No newline at end of file